@@ -143,6 +143,29 @@ def plot_simulated_data(start_date: dt = None, end_date: dt = None):
     plt.show()
 
 
+def plot_fitted_simulation(
+    country: str, start_date: dt = None, end_date: dt = None, save_file_name: str = None
+):
+    # fit the doubling time schedule of a simulation to the reported data of a country
+    from covid_fit import fit_simulation
+
+    dc = CDataTimeSeriesCollection([country])
+    fit = fit_simulation(
+        dc.data_collection[0], start_date=start_date, end_date=end_date
+    )
+    dc.add_data_time_series_to_collection(CDataTimeSeries(**fit.config))
+    dc_view = CDataTimeSeriesCollectionView(dc)
+    fig = dc_view.plot_country_comparison(
+        country,
+        fit.config["country"],
+        show_plot=False,
+        from_date=start_date,
+        to_date=end_date,
+    )
+    _save_figure(fig, save_file_name)
+    plt.show()
+
+
 def plot_doubling_time_collection(countries, save_file_name=None):
     dc = CDataTimeSeriesCollection(country_list=countries)
     dc_view = CDataTimeSeriesCollectionView(dc)
@@ -0,0 +1,357 @@
+"""
+Frame writers for the animations of the view-classes. Frames are rendered by blitting:
+the static parts of a figure are drawn once, for every frame only the animated artists
+are redrawn on top of the saved background and the pixel buffer is handed to the
+writer. GIF files are written with Pillow, MP4 files by piping the frames into a local
+ffmpeg.
+"""
+import os
+import shutil
+import subprocess
+import numpy as np
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.transforms import Bbox
+from logzero import logger
+
+# number of colors of the GIF palette, charts use few colors
+GIF_COLORS = 64
+
+
+def _ffmpeg_path():
+    path = matplotlib.rcParams.get("animation.ffmpeg_path", "ffmpeg")
+    return shutil.which(path)
+
+
+class CGifWriter:
+    """
+    Collects frames and writes them as looping GIF file when closed.
+    ...
+    Attributes
+    ----------
+    fname : str
+        URL of the GIF file
+    fps : float
+        frames per second
+
+    Methods
+    -------
+    set_palette(frame)
+        takes the colors of the GIF palette from an RGBA frame showing all artists
+    write(frame)
+        adds an RGBA frame (numpy array of shape (height, width, 4))
+    close()
+        writes the file
+    abort()
+        drops the collected frames without writing the file
+    """
+
+    def __init__(self, fname: str, fps: float):
+        """
+        Parameters
+        ----------
+        fname : str
+            URL of the GIF file
+        fps : float
+            frames per second
+        """
+        from PIL import Image
+
+        self._image = Image
+        self.fname = fname
+        self.fps = fps
+        self._frames = []
+        self._palette = None
+
+    def _to_image(self, frame: np.ndarray):
+        return self._image.fromarray(np.ascontiguousarray(frame[..., :3]))
+
+    def set_palette(self, frame: np.ndarray):
+        self._palette = self._to_image(frame).quantize(colors=GIF_COLORS, method=2)
+
+    def write(self, frame: np.ndarray):
+        # mapping onto one shared palette is much cheaper than quantizing every frame
+        # and lets Pillow write the frames without comparing their palettes, paletted
+        # frames also use a quarter of the memory of RGBA frames
+        if self._palette is None:
+            self.set_palette(frame)
+        self._frames.append(self._to_image(frame).quantize(palette=self._palette, dither=0))
+
+    def close(self):
+        if not self._frames:
+            return
+        self._frames[0].save(
+            self.fname,
+            save_all=True,
+            append_images=self._frames[1:],
+            duration=int(round(1000 / self.fps)),
+            loop=0,
+            optimize=False,
+        )
+        self._frames = []
+
+    def abort(self):
+        self._frames = []
+
+
+class CFFMpegWriter:
+    """
+    Streams frames as raw video into a local ffmpeg process, which encodes them as
+    H.264 MP4 file.
+    ...
+    Attributes
+    ----------
+    fname : str
+        URL of the MP4 file
+    fps : float
+        frames per second
+
+    Methods
+    -------
+    set_palette(frame)
+        does nothing, MP4 files have no palette
+    write(frame)
+        adds an RGBA frame (numpy array of shape (height, width, 4))
+    close()
+        finishes the file
+    abort()
+        stops ffmpeg and removes the unfinished file
+    """
+
+    def __init__(self, fname: str, fps: float):
+        """
+        Parameters
+        ----------
+        fname : str
+            URL of the MP4 file
+        fps : float
+            frames per second
+        """
+        self.fname = fname
+        self.fps = fps
+        self._proc = None
+
+    def _start(self, width: int, height: int):
+        cmd = [
+            _ffmpeg_path(),
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgba",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",
+            # H.264 needs even frame sizes
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-vcodec",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            self.fname,
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def set_palette(self, frame: np.ndarray):
+        pass
+
+    def write(self, frame: np.ndarray):
+        if self._proc is None:
+            self._start(frame.shape[1], frame.shape[0])
+        self._proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to write {self.fname}")
+        self._proc = None
+
+    def abort(self):
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        self._proc.kill()
+        self._proc.wait()
+        self._proc = None
+        if os.path.exists(self.fname):
+            os.remove(self.fname)
+
+
+class CTextSprites:
+    """
+    Texts rendered once into pixel sprites, which are moved around by blitting. Text
+    rendering is the most expensive part of a frame, labels that only change their
+    position are copied instead of being rendered again.
+    ...
+    Attributes
+    ----------
+    texts : list of matplotlib text objects
+        texts to render, they keep the position they were rendered at
+    offsets : numpy array of floats
+        vertical shift of every sprite in pixels (upwards) from its rendered position
+    visible : numpy array of booleans
+        controls which sprites are drawn
+    max_height : float
+        height of a sprite in pixels at most, centered on the anchor of its text. The
+        sprites are opaque, rows of texts closer than their height would erase each
+        other, None keeps the whole text
+
+    Methods
+    -------
+    render(canvas, background)
+        renders every text on its own into a sprite
+    draw(canvas)
+        draws the visible sprites at their shifted positions
+    set_animated(animated)
+        excludes the texts from (or includes them in) the normal drawing of the figure
+    """
+
+    def __init__(self, texts: list, max_height: float = None):
+        """
+        Parameter
+        ---------
+        texts : list of matplotlib text objects
+            texts to render into sprites
+        max_height : float, optional
+            height of a sprite in pixels at most, e.g. the distance of the rows the
+            texts are moved between (default is None, the height of the text)
+        """
+        self.texts = list(texts)
+        self.offsets = np.zeros(len(self.texts))
+        self.visible = np.ones(len(self.texts), dtype=bool)
+        self.max_height = max_height
+        self._regions = []
+
+    def render(self, canvas, background):
+        self._regions = []
+        for text in self.texts:
+            canvas.restore_region(background)
+            canvas.figure.draw_artist(text)
+            bbox = text.get_window_extent().padded(2)
+            if self.max_height is not None:
+                # half a pixel less on both sides, the region is rounded to pixels
+                y = text.get_transform().transform(text.get_position())[1]
+                half = self.max_height / 2 - 0.5
+                bbox = Bbox.from_extents(
+                    bbox.x0, max(bbox.y0, y - half), bbox.x1, min(bbox.y1, y + half)
+                )
+            self._regions.append(canvas.copy_from_bbox(bbox))
+        canvas.restore_region(background)
+
+    def draw(self, canvas):
+        # region extents count pixels from the top, offsets upwards
+        for region, offset, visible in zip(self._regions, self.offsets, self.visible):
+            if not visible:
+                continue
+            x1, y1, _, _ = region.get_extents()
+            canvas.restore_region(region, xy=(x1, y1 - int(round(offset))))
+
+    def set_animated(self, animated: bool):
+        for text in self.texts:
+            text.set_animated(animated)
+
+
+def get_frame_writer(fname: str, fps: float):
+    """Returns the writer for the file type given by the extension of fname
+
+    Parameters
+    ----------
+    fname : str
+        URL of the animation file, *.gif or *.mp4
+    fps : float
+        frames per second
+    Returns
+    -------
+    writer : CGifWriter or CFFMpegWriter object, None if the file type is not supported
+    """
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == ".gif":
+        return CGifWriter(fname, fps)
+    if ext == ".mp4":
+        if _ffmpeg_path() is None:
+            logger.warning("ffmpeg not found, unable to write MP4, use *.gif instead")
+            return None
+        return CFFMpegWriter(fname, fps)
+    logger.warning(f"Unsupported animation file type {ext}, use *.gif or *.mp4")
+    return None
+
+
+def write_blitted_frames(
+    fig, artists: list, update_frame, n_frames: int, writer, sprites: CTextSprites = None
+):
+    """Renders the frames of an animation by blitting and passes them to a writer.
+    Everything except the animated artists is drawn only once.
+
+    Parameters
+    ----------
+    fig : matplotlib figure object
+        figure to animate, rendered offscreen with Agg
+    artists : list of matplotlib artists
+        artists changed by update_frame, they are excluded from the background
+    update_frame : callable
+        update_frame(ix) sets the artists to the state of frame ix
+    n_frames : int
+        number of frames
+    writer : CGifWriter or CFFMpegWriter object
+        receives the frames, closed at the end, aborted if rendering a frame fails
+    sprites : CTextSprites object, optional
+        texts moved by update_frame via sprites.offsets and sprites.visible, drawn
+        below the artists (default is None)
+    Returns
+    -------
+    written : boolean, False if there were no frames to write
+    """
+    canvas = fig.canvas
+    if not isinstance(canvas, FigureCanvasAgg):
+        canvas = FigureCanvasAgg(fig)
+    if n_frames == 0:
+        logger.warning("No frames to write")
+        writer.abort()
+        return False
+    try:
+        # the last frame usually shows all colors of the animation
+        update_frame(n_frames - 1)
+        canvas.draw()
+        writer.set_palette(np.asarray(canvas.buffer_rgba()))
+        for artist in artists:
+            artist.set_animated(True)
+        if sprites is not None:
+            sprites.set_animated(True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+        if sprites is not None:
+            sprites.render(canvas, background)
+        for ix in range(n_frames):
+            update_frame(ix)
+            canvas.restore_region(background)
+            if sprites is not None:
+                sprites.draw(canvas)
+            for artist in artists:
+                fig.draw_artist(artist)
+            writer.write(np.asarray(canvas.buffer_rgba()))
+    except BaseException:
+        # never leave an ffmpeg process or a partial file behind
+        writer.abort()
+        raise
+    finally:
+        for artist in artists:
+            artist.set_animated(False)
+        if sprites is not None:
+            sprites.set_animated(False)
+    writer.close()
+    return True
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,462 @@
+"""
+Benchmarks of the load, compute, simulate and render paths on synthetic data. CSSE
+shaped files are generated offline at a configurable scale, every stage is timed for a
+single country and for the collection of all countries, peak memory is traced with
+tracemalloc. Results are written as JSON and can be compared between runs.
+
+Usage
+-----
+    python covid_bench.py run --scale small --out base.json
+    python covid_bench.py run --rows 10000 --days 3000 --no-render --out large.json
+    python covid_bench.py compare base.json new.json
+    python covid_bench.py generate --rows 280 --days 1000 --out-dir ./synthetic
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from datetime import datetime as dt
+from datetime import timedelta as tdelta
+from logzero import logger
+import covid_cache
+from covid_store import CFnames, CDataStore
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+
+# (rows, days) of the predefined scales, small is about the size of the CSSE files
+SCALES = {"small": (280, 1000), "medium": (2000, 2000), "large": (10000, 3000)}
+# rows generated at once
+GENERATE_BLOCK_ROWS = 256
+FIRST_DAY = dt(2020, 1, 22)
+# every n-th country is split into provinces, every n-th name needs quoting
+PROVINCE_EVERY = 25
+QUOTED_EVERY = 50
+
+
+def _country_rows(n_rows: int) -> list:
+    """(province, country) of n_rows rows, rows of a country are consecutive"""
+    rows = []
+    ix = 0
+    while len(rows) < n_rows:
+        name = f"Country {ix:05d}"
+        if ix % QUOTED_EVERY == QUOTED_EVERY - 1:
+            name += ", North"
+        if ix % PROVINCE_EVERY == PROVINCE_EVERY - 1:
+            rows.extend((f"Province {j}", name) for j in range(4))
+        else:
+            rows.append(("", name))
+        ix += 1
+    return rows[:n_rows]
+
+
+def _csv_field(text: str) -> str:
+    return f'"{text}"' if "," in text else text
+
+
+def generate_csse_files(
+    out_dir: str, n_rows: int = 280, n_days: int = 1000, seed: int = 0
+) -> CFnames:
+    """Writes synthetic confirmed, deaths and recovered files in the CSSE format
+    (Province/State, Country/Region, Lat, Long and one column per day). The cumulative
+    numbers start at zero and grow with randomly changing rates.
+
+    Parameters
+    ----------
+    out_dir : str
+        directory to write the files to
+    n_rows : int, optional
+        rows per file (default is 280)
+    n_days : int, optional
+        date columns per file (default is 1000)
+    seed : int, optional
+        seed of the random numbers (default is 0)
+    Returns
+    -------
+    fname : namedTuple fnames
+        URLs of the written files
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    fname = CFnames(
+        *(
+            os.path.join(out_dir, f"time_series_covid19_{field}_global.csv")
+            for field in CFnames._fields
+        )
+    )
+    days = [FIRST_DAY + tdelta(days=ix) for ix in range(n_days)]
+    header = "Province/State,Country/Region,Lat,Long," + ",".join(
+        f"{day.month}/{day.day}/{day:%y}" for day in days
+    )
+    rows = _country_rows(n_rows)
+    rng = np.random.default_rng(seed)
+    files = {field: open(getattr(fname, field), "wt") for field in CFnames._fields}
+    try:
+        for fh in files.values():
+            fh.write(header + "\n")
+        for ix in range(0, n_rows, GENERATE_BLOCK_ROWS):
+            block = rows[ix : ix + GENERATE_BLOCK_ROWS]
+            n = len(block)
+            start = rng.integers(0, n_days // 3 + 1, size=(n, 1))
+            rate = rng.gamma(2.0, 20.0, size=(n, n_days)) * (np.arange(n_days) >= start)
+            confirmed = np.cumsum(rng.poisson(rate), axis=1)
+            lag = 14
+            recovered = np.zeros_like(confirmed)
+            recovered[:, lag:] = (confirmed[:, :-lag] * 0.9).astype(confirmed.dtype)
+            deaths = (confirmed * 0.03).astype(confirmed.dtype)
+            lat = rng.uniform(-60, 70, n)
+            lon = rng.uniform(-180, 180, n)
+            prefixes = [
+                f"{_csv_field(p)},{_csv_field(c)},{la:.4f},{lo:.4f},"
+                for (p, c), la, lo in zip(block, lat, lon)
+            ]
+            for field, values in (
+                ("confirmed", confirmed),
+                ("deaths", deaths),
+                ("recovered", recovered),
+            ):
+                files[field].write(
+                    "".join(
+                        prefix + ",".join(map(str, row)) + "\n"
+                        for prefix, row in zip(prefixes, values.tolist())
+                    )
+                )
+    finally:
+        for fh in files.values():
+            fh.close()
+    return fname
+
+
+def _drop_caches(fname: CFnames):
+    for f in fname:
+        shutil.rmtree(covid_cache._cache_dir(f), ignore_errors=True)
+
+
+def time_stage(func, setup=None, repeat: int = 3, track_memory: bool = True) -> dict:
+    """Times func(setup()) repeat times, setup is not timed. Peak memory is traced in an
+    extra run, tracemalloc would slow down the timed runs.
+
+    Parameters
+    ----------
+    func : callable
+        stage to time, called with the result of setup (None without setup)
+    setup : callable, optional
+        prepares the input of every run (default is None)
+    repeat : int, optional
+        number of timed runs (default is 3)
+    track_memory : boolean, optional
+        controls if the peak memory of func is traced (default is True)
+    Returns
+    -------
+    result : dict
+        seconds of every run, their minimum and median and the peak memory in bytes
+    """
+    seconds = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        t_start = time.perf_counter()
+        func(arg)
+        seconds.append(time.perf_counter() - t_start)
+    peak_bytes = None
+    if track_memory:
+        arg = setup() if setup is not None else None
+        tracemalloc.start()
+        try:
+            func(arg)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "seconds_min": min(seconds),
+        "seconds_median": float(np.median(seconds)),
+        "peak_bytes": peak_bytes,
+    }
+
+
+def _load_store(fname: CFnames, use_cache: bool) -> CDataStore:
+    store = CDataStore(fname, use_cache=use_cache)
+    for field in CFnames._fields:
+        store.get_table(field)
+    return store
+
+
+def _touch_fields(ds: CDataTimeSeries):
+    for field in ("n_confirmed", "n_deaths", "n_recovered", "n_still_infected"):
+        getattr(ds, field)
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_benchmarks(
+    fname: CFnames,
+    repeat: int = 3,
+    track_memory: bool = True,
+    render: bool = True,
+    n_sim_runs: int = 100,
+    n_render_countries: int = 9,
+) -> dict:
+    """Times all stages on the files of fname
+
+    Parameters
+    ----------
+    fname : namedTuple fnames
+        URLs of the CSSE files, e.g. generated by generate_csse_files
+    repeat : int, optional
+        timed runs per stage, the parsing stages run once (default is 3)
+    track_memory : boolean, optional
+        controls if the peak memory of every stage is traced (default is True)
+    render : boolean, optional
+        controls if the rendering stages run, they import matplotlib (default is True)
+    n_sim_runs : int, optional
+        parameter sets of the batch simulation (default is 100)
+    n_render_countries : int, optional
+        countries of the collection figure (default is 9)
+    Returns
+    -------
+    stages : dict
+        maps the stage names to the results of time_stage
+    """
+    stages = {}
+
+    def stage(name, func, setup=None, n_repeat=repeat):
+        logger.info(f"Running {name}")
+        stages[name] = time_stage(func, setup, n_repeat, track_memory)
+        logger.info(f"{name}: {stages[name]['seconds_min']:.4f} s")
+
+    stage("parse_csv", lambda _: _load_store(fname, False), n_repeat=1)
+    stage(
+        "parse_and_write_cache",
+        lambda _: _load_store(fname, True),
+        setup=lambda: _drop_caches(fname),
+        n_repeat=1,
+    )
+    stage("load_cache", lambda _: _load_store(fname, True))
+
+    store = _load_store(fname, True)
+    countries = store.country_list
+    country = countries[len(countries) // 2]
+    day = store.days[-1]
+    interval = (store.days[0], day)
+
+    stage(
+        "series_single",
+        lambda _: _touch_fields(CDataTimeSeries(country=country, data_store=store)),
+    )
+    stage(
+        "doubling_time_single",
+        lambda ds: ds._calc_doubling_time_over_interval(*interval, 7),
+        setup=lambda: CDataTimeSeries(country=country, data_store=store),
+    )
+
+    def new_collection():
+        return CDataTimeSeriesCollection(countries, data_store=store)
+
+    stage("collection_load", lambda _: new_collection().metrics.matrix("confirmed"))
+    stage(
+        "doubling_time_collection",
+        lambda collection: collection._calc_doubling_time_matrix(7),
+        setup=new_collection,
+    )
+    stage(
+        "rank_collection",
+        lambda collection: collection.rank(date=day, average_interval_days=7),
+        setup=new_collection,
+    )
+
+    schedule = {
+        (store.days[0] + tdelta(days=ix * 30)).strftime("%Y-%m-%d"): 2.0 + ix
+        for ix in range(max(len(store.days) // 30, 1))
+    }
+    stage(
+        "simulate_single",
+        lambda _: CDataTimeSeries(
+            country="Simulation",
+            sim_data=True,
+            doubling_time_dict=schedule,
+            data_store=store,
+        ),
+    )
+    stage(
+        "simulate_batch",
+        lambda _: CDataTimeSeriesCollection.from_simulations(
+            [f"Simulation {ix}" for ix in range(n_sim_runs)],
+            [schedule] * n_sim_runs,
+            mortality=np.linspace(0.01, 0.05, n_sim_runs),
+            data_store=store,
+        ),
+    )
+
+    if render:
+        # imported here, matplotlib is not needed for the other stages
+        from covid_render import CRenderJob, render_png
+
+        for kind, names in (
+            ("time_series", [country]),
+            ("doubling_time", [country]),
+            ("collection_subplots", countries[:n_render_countries]),
+        ):
+            job = CRenderJob(kind, names, None, None, None)
+            stage(f"render_{kind}", lambda _, job=job: render_png(job, data_store=store))
+    return stages
+
+
+def environment() -> dict:
+    """Versions and machine the benchmarks ran on"""
+    env = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+    if "matplotlib" in sys.modules:
+        env["matplotlib"] = sys.modules["matplotlib"].__version__
+    return env
+
+
+def compare_results(base: dict, new: dict, tolerance: float = 0.1) -> list:
+    """Compares the minimum times of two benchmark results
+
+    Parameters
+    ----------
+    base : dict
+        results of the reference run
+    new : dict
+        results of the run to check
+    tolerance : float, optional
+        relative slow down still accepted (default is 0.1)
+    Returns
+    -------
+    rows : list of tuples
+        (stage, base seconds, new seconds, ratio, regressed) of the stages of both runs
+    """
+    rows = []
+    for name, res in new["stages"].items():
+        if name not in base["stages"]:
+            continue
+        t_base = base["stages"][name]["seconds_min"]
+        t_new = res["seconds_min"]
+        ratio = t_new / t_base if t_base > 0 else float("inf")
+        rows.append((name, t_base, t_new, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def _cmd_generate(args) -> int:
+    fname = generate_csse_files(args.out_dir, args.rows, args.days, args.seed)
+    for f in fname:
+        print(f)
+    return 0
+
+
+def _cmd_run(args) -> int:
+    n_rows, n_days = SCALES[args.scale]
+    n_rows = args.rows or n_rows
+    n_days = args.days or n_days
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="covid_bench_")
+    try:
+        t_start = time.perf_counter()
+        fname = generate_csse_files(data_dir, n_rows, n_days, args.seed)
+        logger.info(
+            f"Generated {n_rows} rows x {n_days} days in "
+            f"{time.perf_counter() - t_start:.1f} s"
+        )
+        stages = run_benchmarks(
+            fname,
+            repeat=args.repeat,
+            track_memory=not args.no_memory,
+            render=not args.no_render,
+        )
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    results = {
+        "config": {
+            "rows": n_rows,
+            "days": n_days,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "date": dt.now().isoformat(timespec="seconds"),
+        },
+        "environment": environment(),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "stages": stages,
+    }
+    if args.out:
+        with open(args.out, "wt") as fh:
+            json.dump(results, fh, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    return 0
+
+
+def _cmd_compare(args) -> int:
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+    rows = compare_results(base, new, args.tolerance)
+    print(f"{'stage':<28}{'base [s]':>12}{'new [s]':>12}{'ratio':>8}")
+    for name, t_base, t_new, ratio, regressed in rows:
+        flag = "  slower" if regressed else ""
+        print(f"{name:<28}{t_base:>12.4f}{t_new:>12.4f}{ratio:>8.2f}{flag}")
+    return 1 if args.fail_on_regression and any(row[4] for row in rows) else 0
+
+
+def main(argv=None) -> int:
+    description, _, usage = __doc__.strip().partition("\n\n")
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=usage,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("run", help="generate data and time all stages")
+    cmd.add_argument("--scale", choices=SCALES, default="small")
+    cmd.add_argument("--rows", type=int, default=None, help="overrides --scale")
+    cmd.add_argument("--days", type=int, default=None, help="overrides --scale")
+    cmd.add_argument("--seed", type=int, default=0)
+    cmd.add_argument("--repeat", type=int, default=3)
+    cmd.add_argument("--no-memory", action="store_true", help="skip tracing memory")
+    cmd.add_argument("--no-render", action="store_true", help="skip the figures")
+    cmd.add_argument(
+        "--data-dir", default=None, help="keep the generated files in this directory"
+    )
+    cmd.add_argument("--out", default=None, help="JSON results, default is stdout")
+    cmd.set_defaults(func=_cmd_run)
+
+    cmd = commands.add_parser("compare", help="compare the results of two runs")
+    cmd.add_argument("base")
+    cmd.add_argument("new")
+    cmd.add_argument("--tolerance", type=float, default=0.1)
+    cmd.add_argument(
+        "--fail-on-regression", action="store_true", help="exit with 1 if slower"
+    )
+    cmd.set_defaults(func=_cmd_compare)
+
+    cmd = commands.add_parser("generate", help="only write the synthetic files")
+    cmd.add_argument("--rows", type=int, default=SCALES["small"][0])
+    cmd.add_argument("--days", type=int, default=SCALES["small"][1])
+    cmd.add_argument("--seed", type=int, default=0)
+    cmd.add_argument("--out-dir", required=True)
+    cmd.set_defaults(func=_cmd_generate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
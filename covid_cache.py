@@ -0,0 +1,211 @@
+"""
+Binary cache of the parsed CSSE time series files. The cache of a file lives in a
+directory next to it and holds the data matrix as .npy file, which is opened memory
+mapped, so a cold start only touches the pages it actually needs.
+"""
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from logzero import logger
+from covid_calendar import CCalendar
+from covid_profile import profiled
+
+CACHE_DIR_SUFFIX = ".cache"
+CACHE_VERSION = 4
+# files modified less than this before their fingerprint was taken are verified by hash,
+# the file system timestamp resolution cannot tell two writes in that window apart
+RACY_INTERVAL_NS = 2 * 10 ** 9
+
+
+def _cache_dir(fname: str) -> str:
+    return fname + CACHE_DIR_SUFFIX
+
+
+def _file_hash(fname: str) -> str:
+    sha = hashlib.sha1()
+    with open(fname, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+@profiled
+def file_fingerprint(fname: str, with_hash: bool = True) -> dict:
+    """Returns size, modification time and (optionally) sha1 hash of a file
+
+    Parameters
+    ----------
+    fname : str
+        URL of the file
+    with_hash : boolean, optional
+        controls if the sha1 hash of the file content is computed (default is True)
+    """
+    st = os.stat(fname)
+    fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "taken_ns": time.time_ns()}
+    if with_hash:
+        fp["sha1"] = _file_hash(fname)
+    return fp
+
+
+def _read_meta(fname: str):
+    try:
+        with open(os.path.join(_cache_dir(fname), "meta.json"), "rt") as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    return meta
+
+
+def _save_array(c_dir: str, name: str, arr: np.ndarray):
+    # never truncate an existing file in place, it may still be memory mapped
+    tmp_name = os.path.join(c_dir, name + ".tmp.npy")
+    np.save(tmp_name, arr)
+    os.replace(tmp_name, os.path.join(c_dir, name + ".npy"))
+
+
+def _write_meta(fname: str, meta: dict):
+    c_dir = _cache_dir(fname)
+    tmp_name = os.path.join(c_dir, "meta.json.tmp")
+    with open(tmp_name, "wt") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_name, os.path.join(c_dir, "meta.json"))
+
+
+def compare_fingerprint(fname: str, fingerprint: dict) -> str:
+    """Compares a file with a previously taken fingerprint. Size and modification time
+    are compared first, the sha1 hash is only computed if they differ.
+
+    Parameters
+    ----------
+    fname : str
+        URL of the file
+    fingerprint : dict
+        fingerprint as returned by file_fingerprint
+    Returns
+    -------
+    state : str
+        'same' if the file is unchanged, 'touched' if only the modification time changed
+        or a fingerprint taken right after a write can be trusted now (fingerprint is
+        updated in place, store it again), 'changed' otherwise
+    """
+    if not fingerprint:
+        return "changed"
+    fp = file_fingerprint(fname, with_hash=False)
+    if fp["size"] != fingerprint["size"]:
+        return "changed"
+    racy = fingerprint["taken_ns"] - fingerprint["mtime_ns"] < RACY_INTERVAL_NS
+    if fp["mtime_ns"] == fingerprint["mtime_ns"] and not racy:
+        return "same"
+    if _file_hash(fname) != fingerprint["sha1"]:
+        return "changed"
+    if fp["mtime_ns"] == fingerprint["mtime_ns"] and racy:
+        if fp["taken_ns"] - fp["mtime_ns"] < RACY_INTERVAL_NS:
+            return "same"
+        # old enough now, later comparisons skip the hash
+        fingerprint["taken_ns"] = fp["taken_ns"]
+        return "touched"
+    fingerprint["mtime_ns"] = fp["mtime_ns"]
+    fingerprint["taken_ns"] = fp["taken_ns"]
+    return "touched"
+
+
+@profiled
+def load_table(table) -> bool:
+    """Fills a CDataTable object from the cache of its file. The cache is loaded even if
+    the file changed in the meantime, table.fingerprint tells the state it belongs to.
+
+    Parameters
+    ----------
+    table : CDataTable object
+        table to fill, table.fname selects the cache
+    Returns
+    -------
+    success : boolean, False if no cache is available
+    """
+    meta = _read_meta(table.fname)
+    if meta is None:
+        return False
+    c_dir = _cache_dir(table.fname)
+    try:
+        data = np.load(os.path.join(c_dir, "data.npy"), mmap_mode="r")
+        numbers = {
+            name: np.load(os.path.join(c_dir, name + ".npy"))
+            for name in table.NUMBER_COLUMNS
+        }
+        row_crc = np.load(os.path.join(c_dir, "row_crc.npy"))
+        days = np.load(os.path.join(c_dir, "days.npy"))
+        texts = {name: meta["columns"][name] for name in table.TEXT_COLUMNS}
+    except (OSError, ValueError, KeyError):
+        logger.warning(f"Unable to read cache of {table.fname}, parsing file")
+        return False
+    table.data = data
+    for name, values in numbers.items():
+        setattr(table, name, values)
+    for name, values in texts.items():
+        setattr(table, name, values)
+    table.row_crc = row_crc
+    table.calendar = CCalendar(days)
+    table.meta_header = meta["meta_header"]
+    table.fingerprint = meta["fingerprint"]
+    return True
+
+
+def save_fingerprint(table):
+    """Updates only the stored fingerprint of a cache, used when the file was touched
+    but its content did not change
+
+    Parameters
+    ----------
+    table : CDataTable object
+        table whose fingerprint is stored
+    """
+    meta = _read_meta(table.fname)
+    if meta is None:
+        return
+    meta["fingerprint"] = table.fingerprint
+    try:
+        _write_meta(table.fname, meta)
+    except OSError as err:
+        logger.warning(f"Unable to write cache of {table.fname}: {err}")
+
+
+@profiled
+def save_table(table):
+    """Writes the content of a CDataTable object to the cache of its file. Failures
+    (e.g. a read-only data directory) are logged and otherwise ignored.
+
+    Parameters
+    ----------
+    table : CDataTable object
+        parsed table to store
+    """
+    c_dir = _cache_dir(table.fname)
+    try:
+        os.makedirs(c_dir, exist_ok=True)
+        # invalidate first, the meta file is written last and marks a complete cache
+        if os.path.exists(os.path.join(c_dir, "meta.json")):
+            os.remove(os.path.join(c_dir, "meta.json"))
+        _save_array(c_dir, "data", np.ascontiguousarray(table.data))
+        for name in table.NUMBER_COLUMNS:
+            _save_array(c_dir, name, getattr(table, name))
+        _save_array(c_dir, "row_crc", table.row_crc)
+        _save_array(c_dir, "days", table.calendar.as_datetime64())
+        _write_meta(
+            table.fname,
+            {
+                "version": CACHE_VERSION,
+                "fingerprint": table.fingerprint,
+                "meta_header": table.meta_header,
+                "columns": {name: getattr(table, name) for name in table.TEXT_COLUMNS},
+            },
+        )
+    except OSError as err:
+        logger.warning(f"Unable to write cache of {table.fname}: {err}")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,164 @@
+"""
+Time axis of the doc-view model based approach. Days are stored as integer day numbers
+(days since 1970-01-01), so looking up the index of a date is plain arithmetic.
+"""
+import numpy as np
+from datetime import datetime as dt
+from datetime import date as ddate
+
+SECONDS_PER_DAY = 86400
+
+
+class CCalendar:
+    """
+    Class representing the days of a time series.
+    ...
+    Attributes
+    ----------
+    day_numbers : numpy array of int64
+        days since 1970-01-01 of every data point, ascending
+    contiguous : boolean
+        True if there is exactly one data point per day without gaps, index lookups
+        are arithmetic then, otherwise they are a binary search
+    days : tuple of datetime objects
+        the days as datetime objects, created on first access and shared by all users
+        of the calendar
+
+    Methods
+    -------
+    index_of(self, date)
+        index of the first day not earlier than date, None if date is after the last day
+    lookback_indices(self, n_days:int)
+        for every day the index of the first day not earlier than n_days before it
+    extended_to(self, date)
+        returns a calendar extended by single days up to date, shared by all callers
+    """
+
+    def __init__(self, days=()):
+        """
+        Parameter
+        ---------
+        days : iterable of datetime objects or numpy datetime64 array, optional
+            days of the data points in ascending order (default is ())
+        """
+        self.day_numbers = np.asarray(
+            np.asarray(days, dtype="datetime64[D]"), dtype=np.int64
+        )
+        self.contiguous = bool(np.all(np.diff(self.day_numbers) == 1))
+        self._days = None
+        self._extensions = {}
+
+    def __len__(self):
+        return len(self.day_numbers)
+
+    def __eq__(self, other):
+        if not isinstance(other, CCalendar):
+            return NotImplemented
+        return np.array_equal(self.day_numbers, other.day_numbers)
+
+    def starts_with(self, other) -> bool:
+        """Checks if the first days of this calendar are the days of other"""
+        return len(other) <= len(self) and np.array_equal(
+            self.day_numbers[: len(other)], other.day_numbers
+        )
+
+    @property
+    def days(self):
+        """the days as tuple of datetime objects, created once and shared"""
+        if self._days is None:
+            self._days = tuple(
+                self.as_datetime64().astype("datetime64[s]").astype(object)
+            )
+        return self._days
+
+    def as_datetime64(self):
+        """Returns the days as numpy datetime64[D] array"""
+        return self.day_numbers.astype("datetime64[D]")
+
+    def index_of(self, date):
+        """Index of the first day not earlier than date
+
+        Parameters
+        ----------
+        date : datetime, date, numpy datetime64 or '%Y-%m-%d' formatted str
+            date to look up
+        Returns
+        -------
+        index : int, None if date is after the last day or the calendar is empty
+        """
+        if len(self) == 0:
+            return None
+        day_number = self.to_day_number(date)
+        if self.contiguous:
+            ix = max(int(np.ceil(day_number - self.day_numbers[0])), 0)
+        else:
+            ix = int(np.searchsorted(self.day_numbers, day_number, side="left"))
+        if ix >= len(self):
+            return None
+        return ix
+
+    def lookback_indices(self, n_days: int):
+        """Returns for every day the index of the first day not earlier than n_days
+        before it, 0 at the start of the calendar
+
+        Parameters
+        ----------
+        n_days : int
+            number of days to look back
+        """
+        if self.contiguous:
+            return np.maximum(np.arange(len(self)) - int(np.floor(n_days)), 0)
+        return np.searchsorted(self.day_numbers, self.day_numbers - n_days, side="left")
+
+    def extended_to(self, date):
+        """Returns a calendar with single days appended up to date (inclusive). The
+        extended calendar is created once per date and shared, e.g. by all simulations
+        extrapolated to the same date
+
+        Parameters
+        ----------
+        date : datetime, date, numpy datetime64 or '%Y-%m-%d' formatted str
+            last day of the new calendar
+        """
+        last = int(np.ceil(self.to_day_number(date)))
+        if len(self) == 0 or last <= self.day_numbers[-1]:
+            return self
+        cal = self._extensions.get(last)
+        if cal is None:
+            cal = CCalendar()
+            cal.day_numbers = np.r_[
+                self.day_numbers, np.arange(self.day_numbers[-1] + 1, last + 1)
+            ]
+            cal.contiguous = self.contiguous
+            self._extensions[last] = cal
+        return cal
+
+    @staticmethod
+    def to_datetime64(date) -> np.datetime64:
+        """Converts a date into numpy datetime64[s]
+
+        Parameters
+        ----------
+        date : datetime, date, numpy datetime64 or '%Y-%m-%d' formatted str
+            date to convert
+        """
+        if isinstance(date, str):
+            date = dt.strptime(date, "%Y-%m-%d")
+        elif isinstance(date, ddate) and not isinstance(date, dt):
+            date = dt(date.year, date.month, date.day)
+        return np.datetime64(date, "s")
+
+    @staticmethod
+    def to_day_number(date) -> float:
+        """Converts a date into (fractional) days since 1970-01-01
+
+        Parameters
+        ----------
+        date : datetime, date, numpy datetime64 or '%Y-%m-%d' formatted str
+            date to convert
+        """
+        return CCalendar.to_datetime64(date).astype(np.int64) / SECONDS_PER_DAY
+
+
+if __name__ == "__main__":
+    pass
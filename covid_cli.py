@@ -0,0 +1,417 @@
+"""
+Command line interface of the covid19 analysis. Only the render command imports
+matplotlib, the numeric commands start fast and write plain CSV or JSON to stdout, so
+they can be used from cron jobs and shell pipelines.
+
+Usage
+-----
+    python covid_cli.py load --update
+    python covid_cli.py metrics --countries Germany Italy --date 2020-05-01
+    python covid_cli.py rank --top 10 --average-interval-days 7
+    python covid_cli.py --us county rank --metric incidence --top 10
+    python covid_cli.py simulate --doubling-time 2020-02-01=3 --doubling-time 2020-04-01=20
+    python covid_cli.py export --out all_countries.parquet --metrics daily_new
+    python covid_cli.py render --countries Germany Italy --out-dir ./report
+    python covid_cli.py serve --port 8050
+    python covid_cli.py --profile --profile-json report.json export --out all.csv
+"""
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+import numpy as np
+import logzero
+from datetime import datetime as dt
+from logzero import logger
+from covid_store import CUSFnames, US_LEVELS, get_data_store
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_metrics import METRICS
+import covid_profile
+
+SERIES_COLUMNS = ("confirmed", "deaths", "recovered", "still_infected")
+
+
+def _parse_date(date_str: str) -> dt:
+    return dt.strptime(date_str, "%Y-%m-%d")
+
+
+def _parse_schedule_entry(entry: str):
+    date_str, _, days = entry.partition("=")
+    _parse_date(date_str)
+    return date_str, float(days)
+
+
+def _json_value(value):
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _write_rows(header, rows, fmt: str = "csv", out=None):
+    """Writes rows as CSV or as JSON list of objects"""
+    out = out if out is not None else sys.stdout
+    if fmt == "json":
+        json.dump(
+            [{k: _json_value(v) for k, v in zip(header, row)} for row in rows],
+            out,
+            indent=1,
+        )
+        out.write("\n")
+        return
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(header)
+    writer.writerows(rows)
+
+
+def _series_columns(ds: CDataTimeSeries):
+    return [
+        np.ravel(getattr(ds, "n_" + column)).astype(float) for column in SERIES_COLUMNS
+    ]
+
+
+def _date_index(ds: CDataTimeSeries, date: dt) -> int:
+    if date is None:
+        return len(ds.calendar) - 1
+    ix = ds.calendar.index_of(date)
+    if ix is None:
+        raise SystemExit(f"No data for {date:%Y-%m-%d}, last day is {ds.days[-1]:%Y-%m-%d}")
+    return ix
+
+
+def _data_sets(collection: CDataTimeSeriesCollection):
+    """Yields index and data set of all data sets with data, unknown countries are
+    skipped with a warning"""
+    for ix, ds in enumerate(collection.data_collection):
+        if len(np.ravel(ds.n_confirmed)) == 0:
+            logger.warning(f"No data available for {ds.country}")
+            continue
+        yield ix, ds
+
+
+def _data_store(args):
+    """Store of the global files, or of the US files if --us is given"""
+    if args.us:
+        return get_data_store(CUSFnames())
+    return get_data_store()
+
+
+def _load_collection(args) -> CDataTimeSeriesCollection:
+    store = _data_store(args)
+    if args.countries:
+        countries = args.countries
+    elif args.us:
+        countries = store.get_location_list(args.us)
+    else:
+        countries = store.country_list
+    # countries failing to load are logged by the collection
+    return CDataTimeSeriesCollection(countries, data_store=store)
+
+
+def cmd_load(args) -> int:
+    store = _data_store(args)
+    if args.update:
+        changed = store.update()
+        logger.info(f"Updated fields: {', '.join(changed) or 'none'}")
+    rows = []
+    for field in store.fname._fields:
+        table = store.get_table(field)
+        rows.append(
+            (
+                field,
+                getattr(store.fname, field),
+                len(table.group_names),
+                len(table.calendar),
+                table.days[-1].strftime("%Y-%m-%d") if len(table.calendar) else "",
+            )
+        )
+    _write_rows(("field", "file", "countries", "days", "last_day"), rows, args.format)
+    return 0
+
+
+def cmd_metrics(args) -> int:
+    collection = _load_collection(args)
+    doubling_times = collection._calc_doubling_time_matrix(args.average_interval_days)
+    metrics = [
+        collection.metrics.daily_new(),
+        collection.metrics.moving_average(args.window),
+        collection.metrics.week_over_week_growth(args.window),
+    ]
+    rows = []
+    for ix, ds in _data_sets(collection):
+        ix_day = _date_index(ds, args.date)
+        rows.append(
+            [ds.country, ds.days[ix_day].strftime("%Y-%m-%d")]
+            + [column[ix_day] for column in _series_columns(ds)]
+            + [doubling_times[ix, ix_day]]
+            + [metric[ix, ix_day] for metric in metrics]
+        )
+    _write_rows(
+        ("country", "date")
+        + SERIES_COLUMNS
+        + ("doubling_time", "new_cases", "new_cases_average", "growth"),
+        rows,
+        args.format,
+    )
+    return 0
+
+
+def cmd_rank(args) -> int:
+    collection = _load_collection(args)
+    if not collection.data_collection:
+        return 1
+    if args.end_date is None:
+        _date_index(collection.data_collection[0], args.date)
+    population = None
+    if args.metric == "incidence":
+        if not args.us:
+            raise SystemExit(
+                "incidence needs population numbers, only the US files have them"
+            )
+        population = collection.data_store.get_population(collection.country_list)
+    ranking = collection.rank(
+        args.metric,
+        date=args.date,
+        end_date=args.end_date,
+        k=args.top if args.top is not None else len(collection.data_collection),
+        largest=not args.ascending,
+        finite_only=args.finite_only,
+        n_days=args.window,
+        average_interval_days=args.average_interval_days,
+        population=population,
+    )
+    rows = [
+        (rank + 1, country, value)
+        for rank, (country, value) in enumerate(ranking.items())
+    ]
+    _write_rows(("rank", "country", args.metric), rows, args.format)
+    return 0
+
+
+def cmd_simulate(args) -> int:
+    if args.fit:
+        from covid_fit import fit_simulation
+
+        fit = fit_simulation(
+            CDataTimeSeries(country=args.fit, data_store=_data_store(args)),
+            start_date=args.from_date,
+            end_date=args.to_date,
+            workers=args.workers,
+        )
+        config = {
+            key: value for key, value in fit.config.items() if key != "data_store"
+        }
+        json.dump({"config": config, "error": fit.error}, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+        return 0
+    if not args.doubling_time:
+        raise SystemExit("simulate needs --doubling-time DATE=DAYS or --fit COUNTRY")
+    ds = CDataTimeSeries(
+        country=args.name,
+        sim_data=True,
+        doubling_time_dict=dict(args.doubling_time),
+        mortality=args.mortality,
+        days_to_recovery=args.days_to_recovery,
+        extrapolate_to_date=args.to_date,
+        data_store=_data_store(args),
+    )
+    columns = _series_columns(ds)
+    rows = [
+        [ds.country, day.strftime("%Y-%m-%d")] + [column[ix] for column in columns]
+        for ix, day in enumerate(ds.days)
+    ]
+    _write_rows(("country", "date") + SERIES_COLUMNS, rows, args.format)
+    return 0
+
+
+def cmd_export(args) -> int:
+    from covid_export import export_collection
+
+    export_collection(
+        _load_collection(args),
+        args.out,
+        args.format,
+        from_date=args.from_date,
+        to_date=args.to_date,
+        average_interval_days=args.average_interval_days,
+        metrics=tuple(args.metrics),
+        n_days=args.window,
+    )
+    return 0
+
+
+def cmd_render(args, render_args) -> int:
+    # the only command that needs matplotlib
+    import covid_render
+
+    return covid_render.main(render_args)
+
+
+def cmd_serve(args, serve_args) -> int:
+    import covid_server
+
+    return covid_server.main(serve_args)
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    description, _, usage = __doc__.strip().partition("\n\n")
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=usage,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="log warnings only")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="log the time spent per stage, figures rendered by worker processes are "
+        "not included",
+    )
+    parser.add_argument(
+        "--profile-json", metavar="FILE", default=None, help="write the profile as JSON"
+    )
+    parser.add_argument(
+        "--us",
+        choices=US_LEVELS,
+        default=None,
+        metavar="LEVEL",
+        help="use the CSSE US files, --countries are then the nation 'US', states or "
+        "counties as 'Admin2, Province_State', by default all of LEVEL "
+        f"({', '.join(US_LEVELS)})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_str, countries=True, date=True, fmt=True):
+        cmd = commands.add_parser(name, help=help_str, description=help_str)
+        if countries:
+            cmd.add_argument("--countries", nargs="*", help="countries, default is all")
+        if date:
+            cmd.add_argument("--average-interval-days", type=int, default=1)
+        if fmt:
+            cmd.add_argument("--format", choices=("csv", "json"), default="csv")
+        return cmd
+
+    cmd = add_command(
+        "load", "parse the data files and build their cache", countries=False, date=False
+    )
+    cmd.add_argument("--update", action="store_true", help="reload changed files")
+    cmd.set_defaults(func=cmd_load)
+
+    cmd = add_command("metrics", "cases, doubling time and growth of countries on a date")
+    cmd.add_argument("--date", type=_parse_date, default=None, help="default is last day")
+    cmd.add_argument(
+        "--window",
+        type=int,
+        default=7,
+        help="days of the moving average and of the compared growth windows",
+    )
+    cmd.set_defaults(func=cmd_metrics)
+
+    cmd = add_command("rank", "countries ranked by a metric on a date or date range")
+    # incidence needs population numbers, which only the CSSE US files have
+    cmd.add_argument(
+        "--metric",
+        choices=METRICS,
+        default="doubling_time",
+        help="incidence (new cases per 100000 people) is available with --us only",
+    )
+    cmd.add_argument("--date", type=_parse_date, default=None, help="default is last day")
+    cmd.add_argument(
+        "--end-date",
+        type=_parse_date,
+        default=None,
+        help="rank by the mean from --date up to this date",
+    )
+    cmd.add_argument("--top", type=int, default=None)
+    cmd.add_argument("--ascending", action="store_true", help="smallest values first")
+    cmd.add_argument(
+        "--finite-only", action="store_true", help="leave out infinite values"
+    )
+    cmd.add_argument("--window", type=int, default=7, help="days of windowed metrics")
+    cmd.set_defaults(func=cmd_rank)
+
+    cmd = add_command("simulate", "simulate or fit a time series", countries=False, date=False)
+    cmd.add_argument(
+        "--doubling-time",
+        type=_parse_schedule_entry,
+        action="append",
+        metavar="DATE=DAYS",
+        help="doubling time schedule, repeat for every breakpoint",
+    )
+    cmd.add_argument("--mortality", type=float, default=0.045)
+    cmd.add_argument("--days-to-recovery", type=float, default=12.65)
+    cmd.add_argument("--name", default="Simulation")
+    cmd.add_argument("--fit", metavar="COUNTRY", help="fit the simulation to a country")
+    cmd.add_argument("--workers", type=int, default=None)
+    cmd.add_argument("--from-date", type=_parse_date, default=None)
+    cmd.add_argument("--to-date", type=_parse_date, default=None)
+    cmd.set_defaults(func=cmd_simulate)
+
+    cmd = add_command(
+        "export", "time series of countries as tidy Parquet, Feather or CSV", fmt=False
+    )
+    cmd.add_argument("--from-date", type=_parse_date, default=None)
+    cmd.add_argument("--to-date", type=_parse_date, default=None)
+    cmd.add_argument("--out", default=None, help="output file, default is CSV to stdout")
+    cmd.add_argument(
+        "--format",
+        choices=("parquet", "feather", "csv"),
+        default=None,
+        help="default is given by the extension of --out",
+    )
+    cmd.add_argument(
+        "--metrics",
+        nargs="*",
+        choices=("daily_new", "moving_average", "week_over_week_growth"),
+        default=[],
+        help="further columns",
+    )
+    cmd.add_argument("--window", type=int, default=7, help="days of windowed metrics")
+    cmd.set_defaults(func=cmd_export)
+
+    cmd = commands.add_parser(
+        "render",
+        help="render figures to files, see covid_render.py --help",
+        add_help=False,
+    )
+    cmd.set_defaults(func=cmd_render)
+
+    cmd = commands.add_parser(
+        "serve",
+        help="local HTTP query service, see covid_server.py --help",
+        add_help=False,
+    )
+    cmd.set_defaults(func=cmd_serve)
+    return parser
+
+
+def _run_command(args, extra_args) -> int:
+    if args.func in (cmd_render, cmd_serve):
+        return args.func(args, extra_args)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # output piped into a command that exits early (e.g. head)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+
+def main(argv=None) -> int:
+    parser = _create_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if args.quiet:
+        logzero.loglevel(logging.WARNING)
+    if args.func not in (cmd_render, cmd_serve) and extra_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+    if not args.profile and args.profile_json is None:
+        return _run_command(args, extra_args)
+    with covid_profile.profiling(args.profile_json, log=args.profile):
+        return _run_command(args, extra_args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,18 +4,117 @@ Doc-Classes of the doc-view model based approach.
 import numpy as np
 from datetime import datetime as dt
 from datetime import timedelta as tdelta
-from collections import namedtuple, OrderedDict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from logzero import logger
+from covid_store import CFnames, CDataStore, get_data_store
+from covid_calendar import CCalendar
+from covid_sim import simulate_time_series
+from covid_metrics import CTimeSeriesMetrics, CCollectionMetrics, top_k_indices
+from covid_memo import CResultCache
+from covid_profile import profiled
 
-CFnames = namedtuple(
-    "fnames",
-    ["confirmed", "recovered", "deaths"],
-    defaults=[
-        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv",
-        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv",
-        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv",
-    ],
-)
+
+@profiled
+def calc_doubling_times(n_confirmed, ix_back, average_interval_days: int = 1):
+    """Calculates the doubling time of the confirmed cases for every day at once
+
+    Parameters
+    ----------
+    n_confirmed : numpy array of floats
+        confirmed cases, days along the first axis (series) or the last axis (matrix of
+        shape (countries, days))
+    ix_back : numpy array of ints
+        for every day the index of the day to compare with
+        (see CDataTimeSeries._get_lookback_indices)
+    average_interval_days : int, optional
+        number of days between the compared days, the returned value is the average
+        over this time range (default is 1)
+    Returns
+    -------
+    doubling_times : numpy array of floats, same shape as n_confirmed. Like for a single
+        day a constant number of cases gives inf, no cases at all gives nan.
+    """
+    n_confirmed = np.asarray(n_confirmed, dtype=float)
+    nc1 = n_confirmed[..., ix_back]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_increase_rate = 1 + (n_confirmed / nc1 - 1) / average_interval_days
+        return np.log(2) / np.log(daily_increase_rate)
+
+
+def compact_block(arrays, dtype) -> np.ndarray:
+    """Copies series of equal length into the rows of one contiguous block
+
+    Parameters
+    ----------
+    arrays : list of numpy arrays
+        series to copy
+    dtype : numpy dtype
+        dtype of the block, integer dtypes round the values. Series with missing values
+        or values beyond the range of an integer dtype are stored as float32 instead,
+        values beyond the range of float32 (e.g. long extrapolated simulations) as
+        float64
+    Returns
+    -------
+    block : numpy array of shape (len(arrays), days)
+    """
+    dtype = np.dtype(dtype)
+    largest = max(
+        (float(np.max(np.abs(a), initial=0.0, where=np.isfinite(a))) for a in arrays),
+        default=0.0,
+    )
+    fallback = np.dtype(
+        np.float32 if largest <= float(np.finfo(np.float32).max) else np.float64
+    )
+    if np.issubdtype(dtype, np.integer):
+        if not all(np.isfinite(a).all() for a in arrays):
+            logger.warning(
+                f"Missing values can not be stored as {dtype}, using {fallback}"
+            )
+            dtype = fallback
+        elif largest > float(np.iinfo(dtype).max):
+            logger.warning(f"Values exceed the range of {dtype}, using {fallback}")
+            dtype = fallback
+        else:
+            arrays = [np.rint(a) for a in arrays]
+    elif np.issubdtype(dtype, np.floating) and largest > float(np.finfo(dtype).max):
+        logger.warning(f"Values exceed the range of {dtype}, using float64")
+        dtype = np.dtype(np.float64)
+    block = np.empty((len(arrays), len(arrays[0])), dtype=dtype)
+    for row, values in zip(block, arrays):
+        row[:] = values
+    return block
+
+
+class CLazyField:
+    """
+    Data attribute of CDataTimeSeries that is loaded or derived on first access and
+    cached afterwards (see CDataTimeSeries._load_field). Assigning a value replaces the
+    cache, assigning one of the base fields also drops the cached derived fields.
+    """
+
+    def __init__(self, derived: bool = False):
+        self.derived = derived
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.cache_name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.cache_name, None)
+        if value is None:
+            value = obj._load_field(self.name)
+            setattr(obj, self.cache_name, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.cache_name, value)
+        if not self.derived:
+            for field in type(obj)._derived_fields:
+                setattr(obj, "_" + field, None)
 
 
 class CDataTimeSeries:
@@ -27,21 +126,38 @@ class CDataTimeSeries:
     fname : namedTuple fnames
         containing the file URLs to the data files
     country : str
-        string containing the country name
+        string containing the country name, for the US files (CUSDataStore) the nation
+        'US', a state or a county as 'Admin2, Province_State'
+    province : str
+        province/state the data is taken from, None for the whole country
+    aggregate_provinces : boolean
+        controls how countries split into provinces are summed up (see __init__)
     lattitude : float
         geographic lattitude of the country
     longitude : float
         geographic longitude of the country
-    days : list of datetime objects
-        dates on which the data points where taken
-    n_confirmed : numpy array of floats
+    calendar : CCalendar object
+        dates on which the data points where taken as day numbers, shared with the data store
+    days : tuple of datetime objects
+        dates on which the data points where taken (shared with calendar), assigning
+        a sequence of dates replaces the calendar
+    n_confirmed : 1D numpy array
         total number of confirmed cases, every element represents the data of one day
-    n_recovered : numpy array of floats
+    n_recovered : 1D numpy array
         total number of recovered patients
-    n_deaths : numpy array of floats
+    n_deaths : 1D numpy array
         total number of deaths
-    n_still_infected : numpy array of floats
+    n_still_infected : 1D numpy array
         number of people who have not recovered or died, yet
+        (n_confirmed, n_recovered, n_deaths and n_still_infected are loaded or derived
+        on first access only, so unused files are never read. They always cover the
+        days of calendar, dates appended to the files meanwhile are left out)
+    dtype : numpy dtype
+        None keeps simulated data as float64, otherwise n_confirmed, n_deaths and
+        n_recovered of a simulation are rows of one contiguous block of this dtype,
+        e.g. np.float32 or np.int32 (see compact_block). Data read from the files is
+        always kept as float64 views into the data store, a compact copy would only
+        add to the memory of the store
     sim_data : boolean, optional
         data will be simulated by using the doubling_time_dict (default is False)
     sim_mortality : float, optional
@@ -51,6 +167,15 @@ class CDataTimeSeries:
     sim_extrapolate_to_date : datetime.datetime, optional
         used for simulation, if set to None only dates reported by CSSE will be taken
         into account
+    data_store : CDataStore object
+        process wide store holding the parsed CSSE files, n_confirmed, n_recovered and
+        n_deaths are read-only views into its matrices
+    metrics : CTimeSeriesMetrics object
+        daily new cases, moving averages, growth and incidence, cached per window
+        (see covid_metrics)
+    result_cache : CResultCache object
+        memoized doubling times, time ranges and metrics with hit and miss counters,
+        results of replaced data arrays are recomputed (see covid_memo)
 
     Methods
     -------
@@ -63,10 +188,45 @@ class CDataTimeSeries:
             Calculates the time interval needed to double the number of confirmed cases
             over a given time range from start_date to end_date and returns it as dict.
             Can be used as input for simulated data.
+        _calc_doubling_time_for_all_days(self, average_interval_days:int=1):
+            Calculates the doubling time for every day in self.days at once
         _get_time_range_indices(self, start_date=None, end_date=None):
             Retrieve start index and end index of a time range in self.days
+        _get_lookback_indices(self, average_interval_days:int=1):
+            Retrieve for every day the index of the day average_interval_days before
     """
 
+    n_confirmed = CLazyField()
+    n_recovered = CLazyField()
+    n_deaths = CLazyField()
+    n_still_infected = CLazyField(derived=True)
+    _derived_fields = ("n_still_infected",)
+    _base_fields = ("n_confirmed", "n_deaths", "n_recovered")
+    # no instance dict, collections and simulation batches hold thousands of series
+    __slots__ = (
+        "data_store",
+        "fname",
+        "country",
+        "province",
+        "aggregate_provinces",
+        "latitude",
+        "longitude",
+        "sim_data",
+        "sim_doubling_dict",
+        "sim_mortality",
+        "sim_days_to_recovery",
+        "sim_extrapolate_to_date",
+        "calendar",
+        "dtype",
+        "_n_confirmed",
+        "_n_recovered",
+        "_n_deaths",
+        "_n_still_infected",
+        "_metrics",
+        "_result_cache",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         country: str = "Germany",
@@ -75,6 +235,11 @@ class CDataTimeSeries:
         mortality: float = 0.045,
         days_to_recovery: float = 12.65,
         extrapolate_to_date: dt = None,
+        data_store: CDataStore = None,
+        province: str = None,
+        aggregate_provinces: bool = None,
+        sim_result: tuple = None,
+        dtype=None,
     ):
         """
         Parameter
@@ -94,9 +259,29 @@ class CDataTimeSeries:
         extrapolate_to_date : datetime.datetime, optional
             used for simulation, if set to None only dates reported by CSSE will be taken
             into account
+        data_store : CDataStore, optional
+            store to take the parsed data from (default is the process wide store of CFnames()),
+            a CUSDataStore takes the data of the US nation, a state or a county
+        province : str, optional
+            take the data of a single province/state of the country (default is None)
+        aggregate_provinces : boolean, optional
+            True sums up all rows of the country including provinces and overseas
+            territories, False only takes the country level row. None takes the country
+            level row if available and the sum of all provinces otherwise, e.g. for
+            China, Canada or Australia (default is None)
+        sim_result : tuple of numpy arrays, optional
+            precomputed (n_confirmed, n_deaths, n_recovered) of a batch simulation, see
+            CDataTimeSeriesCollection.from_simulations (default is None)
+        dtype : numpy dtype, optional
+            stores simulated data as one contiguous block of this dtype, e.g.
+            np.float32 or np.int32, data read from the files stays a view into the
+            data store (default is None, float64)
         """
-        self.fname = CFnames()
+        self.data_store = data_store if data_store is not None else get_data_store()
+        self.fname = self.data_store.fname
         self.country = country
+        self.province = province
+        self.aggregate_provinces = aggregate_provinces
         self.latitude = None
         self.longitude = None
         self.sim_data = sim_data
@@ -104,21 +289,16 @@ class CDataTimeSeries:
         self.sim_mortality = mortality
         self.sim_days_to_recovery = days_to_recovery
         self.sim_extrapolate_to_date = extrapolate_to_date
-        self.days = []
-        # load one data set to fill self.days
-        self.n_confirmed = self.__read_csv_data(self.fname.confirmed)
+        self.calendar = self.data_store.calendar
+        self.dtype = dtype
         if not self.sim_data:
-            self.n_confirmed = self.__read_csv_data(self.fname.confirmed)
-            self.n_deaths = self.__read_csv_data(self.fname.deaths)
-            self.n_recovered = self.__read_csv_data(self.fname.recovered)
+            self.__read_location()
         else:
             if self.sim_extrapolate_to_date != None:
                 self.__extend_days_to_date()
-            self.__sim_data()
-
-        self.n_still_infected = self.n_confirmed - self.n_deaths - self.n_recovered
-        self.n_still_infected[self.n_still_infected < 0] = 0
+            self.__sim_data(sim_result)
 
+    @profiled
     def _calc_doubling_time_on_date(self, date: dt, average_interval_days: int = 1):
         """Calculates the time interval needed to double the number of confirmed cases
 
@@ -131,16 +311,19 @@ class CDataTimeSeries:
             is the average value over the selected time range (defaul is 1)
 
         """
-        if date == None:
+        if date is None:
             date = self.days[-1]
+        date = CCalendar.to_datetime64(date)
         ixs, ixe = self._get_time_range_indices(
-            start_date=date - tdelta(days=average_interval_days), end_date=date
+            start_date=date - np.timedelta64(tdelta(days=average_interval_days)),
+            end_date=date,
         )
         nc2 = self.n_confirmed[ixe]
         nc1 = self.n_confirmed[ixs]
         daily_increase_rate = 1 + (nc2 / nc1 - 1) / average_interval_days
         return np.log(2) / np.log(daily_increase_rate)
 
+    @profiled
     def _calc_doubling_time_over_interval(
         self, start_date: dt = None, end_date: dt = None, average_interval_days: int = 1
     ):
@@ -161,15 +344,12 @@ class CDataTimeSeries:
         ixs, ixe = self._get_time_range_indices(
             start_date=start_date, end_date=end_date
         )
-        double_t = []
-        for day in self.days[ixs:ixe]:
-            double_t.append(
-                self._calc_doubling_time_on_date(
-                    day, average_interval_days=average_interval_days
-                )
-            )
-        return np.array(double_t)
+        # copy, the cached array of all days is read-only and shared
+        return self._calc_doubling_time_for_all_days(
+            average_interval_days=average_interval_days
+        )[ixs:ixe].copy()
 
+    @profiled
     def _get_doubling_time_dict_over_interval(
         self, start_date: dt = None, end_date: dt = None, average_interval_days: int = 1
     ):
@@ -191,20 +371,57 @@ class CDataTimeSeries:
         ixs, ixe = self._get_time_range_indices(
             start_date=start_date, end_date=end_date
         )
+        double_t = self._calc_doubling_time_over_interval(
+            start_date=start_date,
+            end_date=end_date,
+            average_interval_days=average_interval_days,
+        )
         dt_dict = {}
-        for day in self.days[ixs:ixe]:
-            double_t = self._calc_doubling_time_on_date(
-                day, average_interval_days=average_interval_days
-            )
-            if np.isinf(double_t) or np.isnan(double_t) or double_t == 0:
+        for day, d_t in zip(self.days[ixs:ixe], double_t):
+            if np.isinf(d_t) or np.isnan(d_t) or d_t == 0:
                 continue
-            dt_dict[day.strftime("%Y-%m-%d")] = self._calc_doubling_time_on_date(
-                day, average_interval_days=average_interval_days
-            )
+            dt_dict[day.strftime("%Y-%m-%d")] = d_t
         return dt_dict
 
+    @profiled
+    def _calc_doubling_time_for_all_days(self, average_interval_days: int = 1):
+        """Calculates the time interval needed to double the number of confirmed cases
+        for every day in self.days at once, see calc_doubling_times
+
+        Parameters
+        ----------
+        average_interval_days : int, optional
+            sets the number of days to look back into past from given date. Returned value
+            is the average value over the selected time range (defaul is 1)
+        Returns
+        -------
+        doubling_times : read-only numpy array of floats, memoized in self.result_cache
+        """
+        return self.result_cache.get_or_compute(
+            ("doubling_time", average_interval_days),
+            (self.n_confirmed, self.calendar),
+            lambda: calc_doubling_times(
+                self.n_confirmed,
+                self._get_lookback_indices(average_interval_days),
+                average_interval_days=average_interval_days,
+            ),
+        )
+
+    def _get_lookback_indices(self, average_interval_days: int = 1):
+        """Retrieve for every day in self.days the index of the first day not earlier
+        than average_interval_days before it (0 at the start of the series)
+
+        Parameters
+        ----------
+        average_interval_days : int, optional
+            number of days to look back (default is 1)
+        """
+        return self.calendar.lookback_indices(average_interval_days)
+
+    @profiled
     def _get_time_range_indices(self, start_date=None, end_date=None):
-        """Retrieve start index and end index of a time range in self.days
+        """Retrieve start index and end index of a time range in self.days. Dates are
+        looked up by arithmetic on the day numbers of self.calendar.
         Parameter
         ---------
         start_date : datetime object, optional
@@ -212,62 +429,74 @@ class CDataTimeSeries:
         end_date: datetime object, optional
             End date of the time range (default is None). In case of end_data=None the second index is the
             one of the last data point
+        Returns
+        -------
+        (ix_start, ix_end) : tuple of ints, memoized in self.result_cache
         """
-        days = np.array(self.days)
-        if start_date != None:
-            try:
-                ix_start = np.where(days >= start_date)[0][0]
-            except IndexError:
+        return self.result_cache.get_or_compute(
+            ("time_range", start_date, end_date),
+            (self.calendar,),
+            lambda: self.__calc_time_range_indices(start_date, end_date),
+        )
+
+    def __calc_time_range_indices(self, start_date, end_date):
+        if start_date is not None:
+            ix_start = self.calendar.index_of(start_date)
+            if ix_start is None:
                 logger.warn("Start date not found, using first date")
                 ix_start = 0
         else:
             ix_start = 0
-        if end_date != None:
-            try:
-                ix_end = np.where(days >= end_date)[0][0]
-            except IndexError:
+        if end_date is not None:
+            ix_end = self.calendar.index_of(end_date)
+            if ix_end is None:
                 logger.warn("End date not found, using last date")
-                ix_end = len(days)
+                ix_end = len(self.calendar)
         else:
-            ix_end = len(days)
+            ix_end = len(self.calendar)
         return (ix_start, ix_end)
 
+    @property
+    def days(self):
+        """dates of the data points as tuple of datetime objects"""
+        return self.calendar.days
+
+    @days.setter
+    def days(self, days):
+        self.calendar = CCalendar(days)
+
+    @property
+    def metrics(self):
+        """rolling window metrics of the time series, created on first access"""
+        if getattr(self, "_metrics", None) is None:
+            self._metrics = CTimeSeriesMetrics(self)
+        return self._metrics
+
+    @property
+    def result_cache(self):
+        """cache of the derived results of the time series, created on first access"""
+        if getattr(self, "_result_cache", None) is None:
+            self._result_cache = CResultCache()
+        return self._result_cache
+
     def __extend_days_to_date(self):
-        while True:
-            if self.days[-1] < self.sim_extrapolate_to_date:
-                self.days.append(self.days[-1] + tdelta(days=1))
-            else:
-                break
-
-    def __sim_data(self):
-        self.n_confirmed = np.zeros((len(self.days), 1))
-        self.n_recovered = np.zeros((len(self.days), 1))
-        self.n_deaths = np.zeros((len(self.days), 1))
-        self.n_confirmed[0] = 1
-        for ix in range(len(self.days) - 1):
-            day = ix + 1
-            inf_rate = self._doubling_time_to_infrate(
-                self.__get_doubling_time_from_dict(self.days[day])
-            )
-            self.n_confirmed[day] = (self.n_confirmed[day - 1]) * inf_rate
-            if day >= self.sim_days_to_recovery:
-                d_to_recv = int(np.round(self.sim_days_to_recovery))
-                self.n_deaths[day] = (
-                    self.n_confirmed[day - d_to_recv] * self.sim_mortality
+        self.calendar = self.calendar.extended_to(self.sim_extrapolate_to_date)
+
+    @profiled
+    def __sim_data(self, sim_result=None):
+        if sim_result is None:
+            sim_result = [
+                n[0]
+                for n in simulate_time_series(
+                    self.calendar.day_numbers,
+                    self.sim_doubling_dict,
+                    mortality=self.sim_mortality,
+                    days_to_recovery=self.sim_days_to_recovery,
                 )
-                self.n_recovered[day] = self.n_confirmed[day - d_to_recv] * (
-                    1 - self.sim_mortality
-                )
-
-    def __get_doubling_time_from_dict(self, day):
-        dict_days = [
-            dt.strptime(d_str, "%Y-%m-%d") for d_str in self.sim_doubling_dict.keys()
-        ]
-        # print(dict_days)
-        for d_day in dict_days:
-            if day <= d_day:
-                return self.sim_doubling_dict[d_day.strftime("%Y-%m-%d")]
-        return self.sim_doubling_dict[list(self.sim_doubling_dict.keys())[-1]]
+            ]
+        if self.dtype is not None:
+            sim_result = compact_block(sim_result, self.dtype)
+        self.n_confirmed, self.n_deaths, self.n_recovered = sim_result
 
     @staticmethod
     def _infrate_to_doubling_time(infrate):
@@ -277,40 +506,51 @@ class CDataTimeSeries:
     def _doubling_time_to_infrate(doubling_time):
         return np.exp(np.log(2) / doubling_time)
 
-    def __read_csv_data(self, fname):
-        try:
-            with open(fname, "rt") as fh:
-                csv_data = fh.readlines()
-        except:
-            raise NotADirectoryError(
-                f"File {fname} not found. Make sure the 'COVID-19' directory is in the same root directory as the 'covid19_analysis' directory"
+    def _load_field(self, name: str):
+        """Loads or derives the data of a CLazyField attribute on first access"""
+        if name == "n_still_infected":
+            n_still_infected = self.n_confirmed - self.n_deaths - self.n_recovered
+            n_still_infected[n_still_infected < 0] = 0
+            return n_still_infected
+        # views into the data store, independent of self.dtype
+        return self.__read_csv_data(name[len("n_") :])
+
+    @profiled
+    def __read_csv_data(self, field):
+        values = self.data_store.get_country_data(
+            self.country,
+            field,
+            province=self.province,
+            aggregate=self.aggregate_provinces,
+        )
+        return self.__pin_to_calendar(field, values)
+
+    def __pin_to_calendar(self, field, values):
+        """Cuts a lazily loaded series to self.calendar. Files that were updated since
+        the series was created (pull_csse_data.sh, CDataStore.update) only appended
+        dates, the known days are taken from them. Raises ValueError if the file does
+        not start with the days of self.calendar anymore."""
+        n_days = len(self.calendar)
+        if len(values) == n_days or len(values) == 0:
+            return values
+        if field in self.fname._fields:
+            calendar = self.data_store.get_table(field).calendar
+        else:
+            calendar = self.data_store.calendar
+        if len(values) > n_days and calendar.starts_with(self.calendar):
+            return values[:n_days]
+        raise ValueError(
+            f"{field} data of {self.country} has {len(values)} days, expected the "
+            f"{n_days} days the series was created with, the file "
+            f"{getattr(self.fname, field, self.fname.confirmed)} changed in between. "
+            "Create the series again to get the current data"
+        )
+
+    def __read_location(self):
+        if len(self.__read_csv_data("confirmed")) > 0:
+            self.latitude, self.longitude = self.data_store.get_country_location(
+                self.country, province=self.province
             )
-        if self.days == []:
-            self.__parse_csv_data_header_for_dates(csv_data[0])
-        return self.__parse_csv_data(csv_data[1:])
-
-    def __parse_csv_data(self, data):
-        n_data = []
-        for d in data:
-            n_strs = d.split(",")
-            n_strs=[str(n_str).strip() for n_str in n_strs]
-            if n_strs[1] == self.country and n_strs[0] == "":
-                self.latitude = float(n_strs[2])
-                self.longitude = float(n_strs[3])
-                for n_str in n_strs[4:]:
-                    n_data.append(float(n_str))
-                break
-        return np.array(n_data)
-
-    def __parse_csv_data_header_for_dates(self, hdata):
-        d = hdata.split(",")
-        for day_str in d[4:]:
-            # print(day_str)
-            try:
-                day_time = dt.strptime(day_str, "%m/%d/%y")
-            except:
-                day_time = dt.strptime(day_str[:-1], "%m/%d/%y")
-            self.days.append(day_time)
 
 
 class CDataTimeSeriesCollection:
@@ -323,48 +563,459 @@ class CDataTimeSeriesCollection:
         list of strings containing the country names
     data_collection : list of CDataTimeSeries objects
         Times series objects of the countries defined in country_list.
+    data_store : CDataStore object
+        store the data sets are loaded from
+    workers : int
+        default number of threads used to load data sets, None loads them one after another
+    dtype : numpy dtype
+        passed on to the data sets loaded by name, see CDataTimeSeries
+    failed_countries : dict
+        maps the names of countries that could not be loaded to the raised exception
+    metrics : CCollectionMetrics object
+        daily new cases, moving averages, growth and incidence of all countries as
+        (countries, days) matrices, cached per window (see covid_metrics)
+    result_cache : CResultCache object
+        memoized metric matrices of the collection with hit and miss counters
 
     Methods
     -------
     _collect_data_for_selected_countries(self)
         loads the data for the selected countries
     _get_data_from_country_name(self, c_name:str)
-        returns the CDataTimeSeriesObject from the collection where country = c_name
-    add_data_time_series_to_collection(self, ds:CDataTimeSeries)
-        append a data set to the collection
+        returns the CDataTimeSeriesObject from the collection where country = c_name,
+        looked up in a dict index
+    add_data_time_series_to_collection(self, ds, workers:int=None)
+        append a data set, a country or lists of them to the collection
+    _calc_doubling_time_matrix(self, average_interval_days:int=1)
+        doubling times of all countries and days as (countries, days) matrix
+    rank(self, metric='doubling_time', date=None, end_date=None, k=10, largest=True, ...)
+        top (or bottom) k countries by a metric on a date or averaged over a date range
+    from_simulations(cls, country_names, doubling_time_dicts, ...)
+        creates a collection of simulated data sets, all simulated in one batch
     """
 
-    def __init__(self, country_list):
+    def __init__(
+        self,
+        country_list,
+        workers: int = None,
+        data_store: CDataStore = None,
+        dtype=None,
+    ):
+        """
+        Parameter
+        ---------
+        country_list : list of str
+            names of the countries to load
+        workers : int, optional
+            number of threads loading the countries in parallel, None loads them one
+            after another (default is None)
+        data_store : CDataStore, optional
+            store to take the data from (default is the process wide store)
+        dtype : numpy dtype, optional
+            passed on to the loaded data sets, see CDataTimeSeries (default is None)
+        """
         self.country_list = list(country_list)
         self.data_collection = []
+        self.data_store = data_store if data_store is not None else get_data_store()
+        self.workers = workers
+        self.dtype = dtype
+        self.failed_countries = {}
+        self._index = {}
         self._collect_data_for_selected_countries()
 
+    def __len__(self):
+        return len(self.country_list)
+
+    def __contains__(self, c_name: str):
+        return c_name in self._index
+
+    def __iter__(self):
+        """iterates over the country names, data sets are not touched"""
+        return iter(list(self.country_list))
+
+    def __getitem__(self, c_name: str):
+        ds = self._get_data_from_country_name(c_name)
+        if ds is None:
+            raise KeyError(c_name)
+        return ds
+
+    @property
+    def metrics(self):
+        """rolling window metrics of all countries, created on first access"""
+        if getattr(self, "_metrics", None) is None:
+            self._metrics = CCollectionMetrics(self)
+        return self._metrics
+
+    @property
+    def result_cache(self):
+        """cache of the derived results of the collection, created on first access"""
+        if getattr(self, "_result_cache", None) is None:
+            self._result_cache = CResultCache()
+        return self._result_cache
+
+    @classmethod
+    @profiled
+    def from_simulations(
+        cls,
+        country_names,
+        doubling_time_dicts,
+        mortality=0.045,
+        days_to_recovery=12.65,
+        extrapolate_to_date: dt = None,
+        data_store: CDataStore = None,
+        dtype=None,
+    ):
+        """Creates a collection of simulated data sets. All parameter sets are
+        simulated at once as one 2D batch.
+
+        Parameters
+        ----------
+        country_names : list of str
+            names of the simulated data sets
+        doubling_time_dicts : list of dicts
+            doubling time schedule of every data set (see CDataTimeSeries)
+        mortality : float or sequence of floats, optional
+            one value for all or one value per data set (default is 0.045)
+        days_to_recovery : float or sequence of floats, optional
+            one value for all or one value per data set (default is 12.65)
+        extrapolate_to_date : datetime.datetime, optional
+            if set to None only dates reported by CSSE will be taken into account
+        data_store : CDataStore, optional
+            store to take the calendar from (default is the process wide store)
+        dtype : numpy dtype, optional
+            dtype of the data sets, see CDataTimeSeries (default is None, float64 rows
+            of the batch)
+        Returns
+        -------
+        collection : CDataTimeSeriesCollection object
+        """
+        if len(country_names) != len(doubling_time_dicts):
+            raise ValueError("One doubling time dict per country name is needed")
+        if data_store is None:
+            data_store = get_data_store()
+        calendar = data_store.calendar
+        if extrapolate_to_date is not None:
+            calendar = calendar.extended_to(extrapolate_to_date)
+        n_confirmed, n_deaths, n_recovered = simulate_time_series(
+            calendar.day_numbers,
+            doubling_time_dicts,
+            mortality=mortality,
+            days_to_recovery=days_to_recovery,
+        )
+        n_runs = len(country_names)
+        mortality = np.broadcast_to(mortality, (n_runs,))
+        days_to_recovery = np.broadcast_to(days_to_recovery, (n_runs,))
+        collection = cls([], data_store=data_store, dtype=dtype)
+        for ix, name in enumerate(country_names):
+            collection.add_data_time_series_to_collection(
+                CDataTimeSeries(
+                    country=name,
+                    sim_data=True,
+                    doubling_time_dict=doubling_time_dicts[ix],
+                    mortality=float(mortality[ix]),
+                    days_to_recovery=float(days_to_recovery[ix]),
+                    extrapolate_to_date=extrapolate_to_date,
+                    data_store=data_store,
+                    sim_result=(n_confirmed[ix], n_deaths[ix], n_recovered[ix]),
+                    dtype=dtype,
+                )
+            )
+        return collection
+
     def _collect_data_for_selected_countries(self):
-        for country in self.country_list:
-            self.data_collection.append(CDataTimeSeries(country=country))
+        country_list = self.country_list
+        self.country_list = []
+        self.add_data_time_series_to_collection(country_list, workers=self.workers)
+
+    @profiled
+    def _load_data_time_series(self, items: list, workers: int = None) -> list:
+        """Loads the data sets of a list of country names (CDataTimeSeries objects are
+        taken as they are) with a bounded number of threads. Results keep the order of
+        items, data sets that fail to load (including unknown countries without data) are
+        None and recorded in failed_countries.
+        """
+        n_items = len(items)
+        log_every = max(n_items // 10, 1)
+        log_progress = logger.info if workers else logger.debug
+        n_done = [0]
+        lock = threading.Lock()
+
+        def load(item):
+            if isinstance(item, CDataTimeSeries):
+                return item
+            try:
+                ds = CDataTimeSeries(
+                    country=item, data_store=self.data_store, dtype=self.dtype
+                )
+                if len(ds.n_confirmed) == 0:
+                    raise LookupError(
+                        f"No data for {item} in {self.data_store.fname.confirmed}"
+                    )
+            except Exception as err:
+                logger.warning(f"Unable to load {item}: {err}")
+                self.failed_countries[item] = err
+                ds = None
+            with lock:
+                n_done[0] += 1
+                if n_done[0] % log_every == 0 or n_done[0] == n_items:
+                    log_progress(f"Loaded {n_done[0]}/{n_items} data sets")
+            return ds
+
+        if workers is None or workers < 2 or n_items < 2:
+            return [load(item) for item in items]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(load, items))
 
     def _get_data_from_country_name(self, c_name: str):
-        for ds in self.data_collection:
-            if ds.country == c_name:
-                return ds
-        return None
+        ix = self._index.get(c_name)
+        if ix is None:
+            return None
+        return self.data_collection[ix]
 
-    def add_data_time_series_to_collection(self, ds: CDataTimeSeries):
-        self.country_list.append(ds.country)
-        self.data_collection.append(ds)
+    def add_data_time_series_to_collection(self, ds, workers: int = None):
+        """Appends data sets to the collection
+
+        Parameters
+        ----------
+        ds : CDataTimeSeries, str or list of them
+            data set(s) to append, country names are loaded from the data store
+        workers : int, optional
+            number of threads loading the country names in parallel (default is None,
+            one after another)
+        """
+        items = ds if isinstance(ds, (list, tuple)) else [ds]
+        for item in self._load_data_time_series(list(items), workers=workers):
+            if item is None:
+                continue
+            self._index.setdefault(item.country, len(self.country_list))
+            self.country_list.append(item.country)
+            self.data_collection.append(item)
+
+    @profiled
+    def _calc_doubling_time_matrix(self, average_interval_days: int = 1):
+        """Calculates the doubling times of all countries of the collection for every
+        day at once. The days are the ones of the first data set, longer series are cut,
+        shorter or empty ones are padded with nan.
+
+        Parameters
+        ----------
+        average_interval_days : int, optional
+            sets the number of days to look back into past from given date. Returned value
+            is the average value over the selected time range (defaul is 1)
+        Returns
+        -------
+        doubling_times : numpy array of floats, shape (len(data_collection), days)
+        """
+        if not self.data_collection:
+            return np.zeros((0, 0))
+        ref = self.data_collection[0]
+        n_days = len(ref.calendar)
+        n_confirmed = np.full((len(self.data_collection), n_days), np.nan)
+        for ix, ds in enumerate(self.data_collection):
+            n_c = np.ravel(ds.n_confirmed)[:n_days]
+            n_confirmed[ix, : len(n_c)] = n_c
+        return calc_doubling_times(
+            n_confirmed,
+            ref._get_lookback_indices(average_interval_days),
+            average_interval_days=average_interval_days,
+        )
+
+    @profiled
+    def rank(
+        self,
+        metric: str = "doubling_time",
+        date: dt = None,
+        end_date: dt = None,
+        k: int = 10,
+        largest: bool = True,
+        finite_only: bool = False,
+        **metric_kwargs,
+    ) -> OrderedDict:
+        """Ranks the countries of the collection by a metric. The metric matrix of all
+        countries and days is computed once and cached (see CCollectionMetrics), a query
+        only partially sorts one column of it.
+
+        Parameters
+        ----------
+        metric : str, optional
+            one of covid_metrics.METRICS (default is 'doubling_time')
+        date : datetime object, optional
+            date of the ranking, first date of the range if end_date is given (default
+            is None, the last day)
+        end_date : datetime object, optional
+            ranks by the mean of the metric from date up to (excluding) end_date, nan
+            values are left out of the mean (default is None, rank a single date)
+        k : int, optional
+            number of countries returned (default is 10)
+        largest : boolean, optional
+            controls if the countries with the largest or the smallest values are
+            returned (default is True)
+        finite_only : boolean, optional
+            controls if countries with +inf or -inf values are left out, countries with
+            nan values are always left out (default is False)
+        metric_kwargs : optional
+            passed on to CCollectionMetrics.metric_matrix (field, n_days,
+            average_interval_days, population)
+        Returns
+        -------
+        ranking : OrderedDict
+            country names mapped to their values, best first
+        """
+        if not self.data_collection:
+            return OrderedDict()
+        matrix = self.metrics.metric_matrix(metric, **metric_kwargs)
+        ref = self.data_collection[0]
+        if end_date is None:
+            ix_day = len(ref.calendar) - 1 if date is None else ref.calendar.index_of(date)
+            if ix_day is None:
+                logger.warning("Date not found, using last date")
+                ix_day = len(ref.calendar) - 1
+            values = matrix[:, ix_day]
+        else:
+            ixs, ixe = ref._get_time_range_indices(start_date=date, end_date=end_date)
+            window = matrix[:, ixs:ixe]
+            counts = np.sum(~np.isnan(window), axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.nansum(window, axis=1) / counts
+            values[counts == 0] = np.nan
+        return OrderedDict(
+            (self.data_collection[ix].country, values[ix])
+            for ix in top_k_indices(values, k, largest=largest, finite_only=finite_only)
+        )
 
     def _get_actual_doubling_time_for_date(
         self, date=None, average_interval_days=1
     ) -> OrderedDict:
-        dt_dict = dict()
+        dt_dict_sorted = self.rank(
+            "doubling_time",
+            date=date,
+            k=len(self.data_collection),
+            average_interval_days=average_interval_days,
+        )
+        # countries without doubling time at the end
         for ds in self.data_collection:
-            dt_dict[ds.country] = ds._calc_doubling_time_on_date(
-                date=date, average_interval_days=1
-            )
-        sorted_dt = sorted(dt_dict.items(), key=lambda kv: kv[1], reverse=True)
-        dt_dict_sorted = OrderedDict(sorted_dt)
+            dt_dict_sorted.setdefault(ds.country, np.nan)
         return dt_dict_sorted
 
 
+class CLazyDataTimeSeriesList:
+    """
+    List of CDataTimeSeries objects, every data set is created on first access.
+    ...
+    Attributes
+    ----------
+    country_names : list of str
+        names of the data sets in the list
+
+    Methods
+    -------
+    is_loaded(self, ix:int)
+        checks if the data set at position ix was already created
+    append(self, ds:CDataTimeSeries)
+        appends an already created data set
+    """
+
+    def __init__(self, country_names, load_function):
+        """
+        Parameter
+        ---------
+        country_names : list of str
+            names of the data sets
+        load_function : callable
+            creates the CDataTimeSeries object of a country name
+        """
+        self.country_names = list(country_names)
+        self._load_function = load_function
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.country_names)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice):
+            return [self[i] for i in range(*ix.indices(len(self)))]
+        if ix < 0:
+            ix += len(self)
+        if ix not in self._loaded:
+            name = self.country_names[ix]
+            with self._lock:
+                if ix not in self._loaded:
+                    self._loaded[ix] = self._load_function(name)
+        return self._loaded[ix]
+
+    def __iter__(self):
+        for ix in range(len(self)):
+            yield self[ix]
+
+    def is_loaded(self, ix: int) -> bool:
+        return ix in self._loaded
+
+    def append(self, ds: CDataTimeSeries):
+        self._loaded[len(self.country_names)] = ds
+        self.country_names.append(ds.country)
+
+
+class CAllCountriesCollection(CDataTimeSeriesCollection):
+    """
+    Collection of all countries of the CSSE files. The data sets are created on first
+    access only, so looking up a handful of countries pays only for these.
+    ...
+    Attributes
+    ----------
+    aggregate_provinces : boolean
+        passed on to the CDataTimeSeries objects (see CDataTimeSeries)
+
+    see CDataTimeSeriesCollection for the others, data_collection is a
+    CLazyDataTimeSeriesList
+
+    Methods
+    -------
+    loaded_countries(self)
+        returns the names of the countries whose data sets were already created
+    """
+
+    def __init__(
+        self,
+        data_store: CDataStore = None,
+        aggregate_provinces: bool = None,
+        dtype=None,
+    ):
+        """
+        Parameter
+        ---------
+        data_store : CDataStore, optional
+            store to take the data from (default is the process wide store)
+        aggregate_provinces : boolean, optional
+            see CDataTimeSeries (default is None)
+        dtype : numpy dtype, optional
+            see CDataTimeSeries (default is None)
+        """
+        self.aggregate_provinces = aggregate_provinces
+        super().__init__([], data_store=data_store, dtype=dtype)
+        self.country_list = self.data_store.country_list
+        self.data_collection = CLazyDataTimeSeriesList(
+            self.country_list, self._load_country
+        )
+        self._index = {name: ix for ix, name in enumerate(self.country_list)}
+
+    def _load_country(self, country: str) -> CDataTimeSeries:
+        logger.debug(f"Loading {country}")
+        return CDataTimeSeries(
+            country=country,
+            data_store=self.data_store,
+            aggregate_provinces=self.aggregate_provinces,
+            dtype=self.dtype,
+        )
+
+    def loaded_countries(self) -> list:
+        """Returns the names of the countries whose data sets were already created"""
+        return [
+            name
+            for ix, name in enumerate(self.country_list)
+            if self.data_collection.is_loaded(ix)
+        ]
+
+
 if __name__ == "__main__":
     pass
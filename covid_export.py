@@ -0,0 +1,328 @@
+"""
+Columnar export of collections as tidy tables, one row per country and day with the
+columns country, date, confirmed, deaths, recovered, still_infected, doubling_time and
+optionally further metrics (see covid_metrics). The tables are assembled column by
+column from the country x day matrices of CCollectionMetrics and written in chunks of
+countries: Parquet and Feather files with pyarrow, CSV files (the fallback if pyarrow is
+not installed) by formatting whole columns with numpy.
+"""
+import os
+import sys
+import numpy as np
+from logzero import logger
+from covid_metrics import METRIC_FIELDS, METRICS
+
+# columns of every exported table
+EXPORT_COLUMNS = ("country", "date") + METRIC_FIELDS + ("doubling_time",)
+# metrics that can be added as further columns
+EXPORT_METRICS = tuple(m for m in METRICS if m not in EXPORT_COLUMNS + ("incidence",))
+# number of countries written at once
+CHUNK_COUNTRIES = 32
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def _csv_field(text: str) -> str:
+    if any(c in text for c in ',"\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+class CCountryColumn:
+    """
+    Country column of a chunk as codes into the list of all exported country names, so
+    the names are neither repeated nor formatted for every day.
+    ...
+    Attributes
+    ----------
+    categories : list of str
+        country names
+    codes : numpy array of ints
+        index into categories for every row
+    """
+
+    def __init__(self, categories: list, codes: np.ndarray):
+        """
+        Parameters
+        ----------
+        categories : list of str
+            country names
+        codes : numpy array of ints
+            index into categories for every row
+        """
+        self.categories = categories
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class CCsvTableWriter:
+    """
+    Writes chunks of a table to a CSV file. Numbers are formatted column wise by numpy,
+    missing values are written as nan.
+    ...
+    Attributes
+    ----------
+    fname : str
+        URL of the CSV file, None writes to stdout
+
+    Methods
+    -------
+    write(columns)
+        appends the rows of a chunk
+    close()
+        closes the file
+    """
+
+    def __init__(self, fname: str = None):
+        """
+        Parameter
+        ---------
+        fname : str, optional
+            URL of the CSV file (default is None, which writes to stdout)
+        """
+        self.fname = fname
+        self._out = open(fname, "wt", newline="") if fname else sys.stdout
+        self._header_written = False
+        self._categories = None
+        self._quoted = None
+
+    def write(self, columns: dict):
+        if not self._header_written:
+            self._out.write(",".join(columns) + "\n")
+            self._header_written = True
+        fields = []
+        for name, values in columns.items():
+            if name == "country":
+                if self._categories is not values.categories:
+                    self._categories = values.categories
+                    self._quoted = np.array([_csv_field(str(c)) for c in values.categories])
+                values = self._quoted[values.codes]
+            fields.append(np.asarray(values).astype(str).tolist())
+        if not len(fields[0]):
+            return
+        self._out.write("\n".join(map(",".join, zip(*fields))) + "\n")
+
+    def close(self):
+        if self.fname:
+            self._out.close()
+        else:
+            self._out.flush()
+
+
+class CArrowTableWriter:
+    """
+    Writes chunks of a table with pyarrow, as row groups of a Parquet file or record
+    batches of a Feather (Arrow IPC) file. Countries are dictionary encoded, dates are
+    stored as date32.
+    ...
+    Attributes
+    ----------
+    fname : str
+        URL of the file
+    fmt : str
+        'parquet' or 'feather'
+
+    Methods
+    -------
+    write(columns)
+        appends the rows of a chunk
+    close()
+        finishes the file
+    """
+
+    def __init__(self, fname: str, fmt: str = "parquet"):
+        """
+        Parameters
+        ----------
+        fname : str
+            URL of the file
+        fmt : str, optional
+            'parquet' or 'feather' (default is 'parquet')
+        """
+        self._pa = _import_pyarrow()
+        self.fname = fname
+        self.fmt = fmt
+        self._writer = None
+
+    def _to_batch(self, columns: dict):
+        pa = self._pa
+        arrays = []
+        for name, values in columns.items():
+            if name == "country":
+                arrays.append(
+                    pa.DictionaryArray.from_arrays(
+                        pa.array(values.codes, type=pa.int32()),
+                        pa.array(values.categories, type=pa.string()),
+                    )
+                )
+            else:
+                arrays.append(pa.array(values))
+        return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+    def write(self, columns: dict):
+        batch = self._to_batch(columns)
+        if self._writer is None:
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self.fname, batch.schema)
+            else:
+                self._writer = self._pa.ipc.new_file(self.fname, batch.schema)
+        if self.fmt == "parquet":
+            self._writer.write_table(self._pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def format_of(fname: str) -> str:
+    """Table format given by the extension of fname: 'parquet', 'feather' or 'csv'"""
+    ext = os.path.splitext(fname or "")[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".feather", ".arrow"):
+        return "feather"
+    return "csv"
+
+
+def get_table_writer(fname: str = None, fmt: str = None):
+    """Returns the writer for the file type given by fmt or the extension of fname. If
+    pyarrow is not installed Parquet and Feather files are written as CSV files instead.
+
+    Parameters
+    ----------
+    fname : str, optional
+        URL of the file (default is None, which writes CSV to stdout)
+    fmt : str, optional
+        'parquet', 'feather' or 'csv' (default is None, given by the extension of fname)
+    Returns
+    -------
+    writer : CCsvTableWriter or CArrowTableWriter object
+    """
+    fmt = fmt or format_of(fname)
+    if fmt not in ("parquet", "feather", "csv"):
+        raise ValueError(f"Unsupported table format {fmt}, use parquet, feather or csv")
+    if fmt == "csv" or fname is None:
+        return CCsvTableWriter(fname)
+    if _import_pyarrow() is None:
+        fname = os.path.splitext(fname)[0] + ".csv"
+        logger.warning(f"pyarrow not installed, unable to write {fmt}, writing {fname}")
+        return CCsvTableWriter(fname)
+    return CArrowTableWriter(fname, fmt)
+
+
+def iter_table_chunks(
+    collection,
+    from_date=None,
+    to_date=None,
+    average_interval_days: int = 1,
+    metrics: tuple = (),
+    n_days: int = 7,
+    chunk_countries: int = CHUNK_COUNTRIES,
+):
+    """Yields the tidy table of a collection in chunks of countries as dicts of columns.
+    Countries without data are left out.
+
+    Parameters
+    ----------
+    collection : CDataTimeSeriesCollection object
+        countries to export, the days are the ones of the first data set
+    from_date : datetime object, optional
+        first day to export (default is None, the first day)
+    to_date : datetime object, optional
+        day after the last day to export (default is None, the last day)
+    average_interval_days : int, optional
+        interval the doubling times are averaged over (default is 1)
+    metrics : tuple of str, optional
+        further columns, any of EXPORT_METRICS (default is ())
+    n_days : int, optional
+        window of the moving average and growth metrics (default is 7)
+    chunk_countries : int, optional
+        number of countries per chunk (default is CHUNK_COUNTRIES)
+    """
+    unknown = [m for m in metrics if m not in EXPORT_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}, use any of {EXPORT_METRICS}")
+    if not collection.data_collection:
+        return
+    ref = collection.data_collection[0]
+    ixs, ixe = ref._get_time_range_indices(start_date=from_date, end_date=to_date)
+    dates = ref.calendar.as_datetime64()[ixs:ixe]
+    names = EXPORT_COLUMNS[2:] + tuple(metrics)
+    matrices = [collection.metrics.matrix(field) for field in METRIC_FIELDS]
+    matrices.append(collection.metrics.doubling_time(average_interval_days))
+    matrices.extend(
+        collection.metrics.metric_matrix(
+            m, n_days=n_days, average_interval_days=average_interval_days
+        )
+        for m in metrics
+    )
+    has_data = np.array(
+        [len(np.ravel(ds.n_confirmed)) > 0 for ds in collection.data_collection],
+        dtype=bool,
+    )
+    for ds, ok in zip(collection.data_collection, has_data):
+        if not ok:
+            logger.warning(f"No data available for {ds.country}, not exported")
+    countries = np.flatnonzero(has_data)
+    # all chunks share the country names, Arrow files need one dictionary per column
+    names_of_countries = [collection.data_collection[r].country for r in countries]
+    n_dates = len(dates)
+    for ix in range(0, len(countries), chunk_countries):
+        rows = countries[ix : ix + chunk_countries]
+        columns = {
+            "country": CCountryColumn(
+                names_of_countries,
+                np.repeat(np.arange(ix, ix + len(rows)), n_dates),
+            ),
+            "date": np.tile(dates, len(rows)),
+        }
+        for name, matrix in zip(names, matrices):
+            columns[name] = matrix[rows, ixs:ixe].ravel()
+        yield columns
+
+
+def export_collection(collection, fname: str = None, fmt: str = None, **kwargs) -> int:
+    """Writes the tidy table of a collection to a file, see iter_table_chunks for the
+    further arguments
+
+    Parameters
+    ----------
+    collection : CDataTimeSeriesCollection object
+        countries to export
+    fname : str, optional
+        URL of the file (default is None, which writes CSV to stdout)
+    fmt : str, optional
+        'parquet', 'feather' or 'csv' (default is None, given by the extension of fname)
+    Returns
+    -------
+    n_rows : int
+        number of rows written
+    """
+    writer = get_table_writer(fname, fmt)
+    n_rows = 0
+    try:
+        for columns in iter_table_chunks(collection, **kwargs):
+            writer.write(columns)
+            n_rows += len(columns["date"])
+    finally:
+        writer.close()
+    logger.debug(f"Exported {n_rows} rows to {writer.fname or 'stdout'}")
+    return n_rows
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,297 @@
+"""
+Fitting of the simulation parameters (doubling time schedule, mortality and days to
+recovery) against reported data. Candidate parameter sets are simulated in batches
+(see covid_sim), the batches are spread over a process pool.
+"""
+import os
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+from logzero import logger
+from covid_calendar import CCalendar
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_sim import simulate_time_series
+
+CFitResult = namedtuple("CFitResult", ["config", "error"])
+
+
+def _schedule_to_dict(breakpoints, doubling_times):
+    return {
+        str(bp): float(d_t)
+        for bp, d_t in zip(breakpoints.astype("datetime64[D]"), doubling_times)
+    }
+
+
+def _fit_error(n_sim, n_real, mask):
+    return np.mean((np.log1p(n_sim[:, mask]) - np.log1p(n_real[mask])) ** 2, axis=1)
+
+
+def _evaluate_candidates(args):
+    """Simulates a batch of candidates and returns their errors, runs in the workers"""
+    (
+        day_numbers,
+        targets,
+        mask,
+        breakpoints,
+        doubling_times,
+        mortality,
+        days_to_recovery,
+    ) = args
+    d_dicts = [_schedule_to_dict(breakpoints, d_ts) for d_ts in doubling_times]
+    n_confirmed, n_deaths, n_recovered = simulate_time_series(
+        day_numbers, d_dicts, mortality=mortality, days_to_recovery=days_to_recovery
+    )
+    error = _fit_error(n_confirmed, targets[0], mask)
+    error += _fit_error(n_deaths, targets[1], mask)
+    if np.any(targets[2][mask] > 0):
+        error += _fit_error(n_recovered, targets[2], mask)
+    return error
+
+
+def _initial_doubling_times(day_numbers, n_confirmed, breakpoints, bounds):
+    """Doubling times of the mean log growth of the reported cases between breakpoints"""
+    log_n = np.log(np.maximum(n_confirmed, 1))
+    doubling_times = []
+    start = 0
+    for bp in breakpoints:
+        end = int(np.searchsorted(day_numbers, bp, side="right")) - 1
+        growth = (log_n[end] - log_n[start]) / max(end - start, 1)
+        doubling_times.append(np.log(2) / growth if growth > 0 else bounds[1])
+        start = end
+    return np.clip(doubling_times, *bounds)
+
+
+def fit_simulation(
+    ds: CDataTimeSeries,
+    start_date: dt = None,
+    end_date: dt = None,
+    breakpoint_interval_days: int = 14,
+    mortality_range=(0.005, 0.1),
+    days_to_recovery_range=(7.0, 21.0),
+    doubling_time_bounds=(0.5, 1000.0),
+    n_candidates: int = 256,
+    n_rounds: int = 30,
+    workers: int = None,
+    seed: int = 0,
+    executor=None,
+) -> CFitResult:
+    """Searches the doubling time schedule, mortality and days to recovery that
+    reproduce the reported data of a time series best (least squares of log(1+cases)
+    of confirmed, deaths and recovered).
+
+    The schedule has one breakpoint every breakpoint_interval_days. Starting from the
+    mean growth of the reported cases between breakpoints, every round evaluates
+    n_candidates random variations of the best parameter set so far.
+
+    Parameters
+    ----------
+    ds : CDataTimeSeries object
+        reported data to fit
+    start_date : datetime object, optional
+        first date taken into account (default is None, the first reported case)
+    end_date : datetime object, optional
+        last date taken into account (default is None, the last date)
+    breakpoint_interval_days : int, optional
+        days between two breakpoints of the doubling time schedule (default is 14)
+    mortality_range : tuple of floats, optional
+        lower and upper bound of the mortality (default is (0.005, 0.1))
+    days_to_recovery_range : tuple of floats, optional
+        lower and upper bound of the days to recovery (default is (7.0, 21.0))
+    doubling_time_bounds : tuple of floats, optional
+        lower and upper bound of the doubling times (default is (0.5, 1000.0))
+    n_candidates : int, optional
+        number of candidates per round (default is 256)
+    n_rounds : int, optional
+        number of rounds (default is 30)
+    workers : int, optional
+        number of worker processes, 1 evaluates in the calling process (default is None,
+        the number of CPUs)
+    seed : int, optional
+        seed of the random number generator (default is 0)
+    executor : concurrent.futures.Executor, optional
+        executor to evaluate the candidates on instead of a new process pool, the
+        candidates are split into workers (default the number of CPUs) jobs per round
+        (default is None)
+    Returns
+    -------
+    result : CFitResult
+        config holds the keyword arguments of CDataTimeSeries(**result.config) that
+        create the fitted simulation on the calendar of ds.data_store, error the
+        remaining fit error
+    """
+    result = _fit_arrays(
+        ds.country,
+        *_fit_targets(ds, start_date, end_date),
+        breakpoint_interval_days=breakpoint_interval_days,
+        mortality_range=mortality_range,
+        days_to_recovery_range=days_to_recovery_range,
+        doubling_time_bounds=doubling_time_bounds,
+        n_candidates=n_candidates,
+        n_rounds=n_rounds,
+        workers=workers,
+        seed=seed,
+        executor=executor,
+    )
+    result.config["data_store"] = ds.data_store
+    return result
+
+
+def _fit_targets(ds: CDataTimeSeries, start_date: dt = None, end_date: dt = None):
+    """Returns day numbers, reported data and fit mask of a time series as plain
+    arrays, which are cheap to send to worker processes"""
+    day_numbers = ds.calendar.day_numbers
+    targets = np.array(
+        [np.ravel(n) for n in (ds.n_confirmed, ds.n_deaths, ds.n_recovered)],
+        dtype=float,
+    )
+    if targets.shape[1] != len(day_numbers):
+        raise ValueError(f"No data available for {ds.country}")
+    ixs, ixe = ds._get_time_range_indices(start_date=start_date, end_date=end_date)
+    if (
+        end_date is not None
+        and ixe < len(day_numbers)
+        and day_numbers[ixe] <= CCalendar.to_day_number(end_date)
+    ):
+        # the time range ends before end_date, the fit includes it
+        ixe += 1
+    if start_date is None:
+        reported = np.flatnonzero(targets[0] > 0)
+        ixs = int(reported[0]) if len(reported) else 0
+    mask = np.zeros(len(day_numbers), dtype=bool)
+    mask[ixs:ixe] = True
+    return day_numbers, targets, mask
+
+
+def _fit_arrays(
+    country: str,
+    day_numbers,
+    targets,
+    mask,
+    breakpoint_interval_days: int = 14,
+    mortality_range=(0.005, 0.1),
+    days_to_recovery_range=(7.0, 21.0),
+    doubling_time_bounds=(0.5, 1000.0),
+    n_candidates: int = 256,
+    n_rounds: int = 30,
+    workers: int = None,
+    seed: int = 0,
+    executor=None,
+) -> CFitResult:
+    breakpoints = np.arange(
+        day_numbers[0] + breakpoint_interval_days,
+        day_numbers[-1] + breakpoint_interval_days,
+        breakpoint_interval_days,
+    )
+    best_d_ts = _initial_doubling_times(
+        day_numbers, targets[0], breakpoints, doubling_time_bounds
+    )
+    best_mort = float(np.mean(mortality_range))
+    best_dtr = float(np.mean(days_to_recovery_range))
+    best_err = _evaluate_candidates(
+        (
+            day_numbers,
+            targets,
+            mask,
+            breakpoints,
+            best_d_ts[np.newaxis],
+            best_mort,
+            best_dtr,
+        )
+    )[0]
+
+    rng = np.random.default_rng(seed)
+    own_executor = executor is None and workers != 1
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        n_chunks = 1 if executor is None else workers or os.cpu_count() or 1
+        for n_round in range(n_rounds):
+            # shrink the variations from +-50% to +-5% over the rounds
+            spread = 0.5 * (0.1 ** (n_round / max(n_rounds - 1, 1)))
+            d_ts = best_d_ts * np.exp(
+                rng.normal(0, spread, (n_candidates, len(best_d_ts)))
+            )
+            d_ts = np.clip(d_ts, *doubling_time_bounds)
+            mort = np.clip(
+                best_mort * np.exp(rng.normal(0, spread, n_candidates)),
+                *mortality_range,
+            )
+            dtr = np.clip(
+                best_dtr + rng.normal(0, spread * 10, n_candidates),
+                *days_to_recovery_range,
+            )
+            chunks = np.array_split(np.arange(n_candidates), max(n_chunks, 1))
+            jobs = [
+                (day_numbers, targets, mask, breakpoints, d_ts[c], mort[c], dtr[c])
+                for c in chunks
+                if len(c)
+            ]
+            if executor is None:
+                errors = np.concatenate([_evaluate_candidates(job) for job in jobs])
+            else:
+                errors = np.concatenate(list(executor.map(_evaluate_candidates, jobs)))
+            ix = int(np.nanargmin(errors))
+            if errors[ix] < best_err:
+                best_err = float(errors[ix])
+                best_d_ts, best_mort, best_dtr = d_ts[ix], float(mort[ix]), float(dtr[ix])
+            logger.debug(f"Fit {country}, round {n_round}: error {best_err:.4g}")
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    config = {
+        "country": country + " Sim",
+        "sim_data": True,
+        "doubling_time_dict": _schedule_to_dict(breakpoints, best_d_ts),
+        "mortality": best_mort,
+        "days_to_recovery": best_dtr,
+    }
+    logger.info(f"Fitted simulation of {country}, error {best_err:.4g}")
+    return CFitResult(config, float(best_err))
+
+
+def _fit_country(args):
+    country, targets, kwargs = args
+    return _fit_arrays(country, *targets, workers=1, **kwargs)
+
+
+def fit_collection(
+    collection: CDataTimeSeriesCollection, workers: int = None, **kwargs
+) -> dict:
+    """Fits the simulation of every data set of a collection, the countries are fitted
+    concurrently, one country per worker process.
+
+    Parameters
+    ----------
+    collection : CDataTimeSeriesCollection object
+        reported data to fit
+    workers : int, optional
+        number of worker processes, 1 fits in the calling process (default is None,
+        the number of CPUs)
+    kwargs : optional
+        passed on to fit_simulation (start_date, end_date, breakpoint_interval_days, ...)
+    Returns
+    -------
+    results : dict
+        maps the country names to their CFitResult
+    """
+    start_date = kwargs.pop("start_date", None)
+    end_date = kwargs.pop("end_date", None)
+    jobs = [
+        (ds.country, _fit_targets(ds, start_date, end_date), kwargs)
+        for ds in collection.data_collection
+    ]
+    if workers == 1:
+        results = [_fit_country(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_fit_country, jobs))
+    # the stores stay in this process, the workers only get plain arrays
+    for ds, res in zip(collection.data_collection, results):
+        res.config["data_store"] = ds.data_store
+    return {ds.country: res for ds, res in zip(collection.data_collection, results)}
+
+
+if __name__ == "__main__":
+    pass
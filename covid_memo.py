@@ -0,0 +1,143 @@
+"""
+Memoization of derived results of the doc-classes. Every time series and collection owns
+a CResultCache, results are keyed by their query parameters and remember the arrays
+they were computed from, so replaced data (a new simulation, reloaded files) is never
+served from the cache.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# memory budget of a single cache
+DEFAULT_MAX_BYTES = 32 * 2 ** 20
+# accounted size of results that are no numpy arrays
+OBJECT_BYTES = 64
+
+
+def result_nbytes(value) -> int:
+    """Approximate memory used by a cached result"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) + OBJECT_BYTES
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(v) for v in value) + OBJECT_BYTES
+    return OBJECT_BYTES
+
+
+def _freeze(value):
+    # cached arrays are shared between all callers
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+class CResultCache:
+    """
+    Least recently used cache of derived results with a memory budget.
+    ...
+    Attributes
+    ----------
+    max_bytes : int
+        memory budget, least recently used results are evicted beyond it
+    nbytes : int
+        memory used by the cached results
+    hits : int
+        number of lookups served from the cache
+    misses : int
+        number of lookups that had to compute the result (including stale entries)
+    evictions : int
+        number of results evicted to stay within max_bytes
+
+    Methods
+    -------
+    get_or_compute(key, sources, compute)
+        returns the cached result of key or computes and caches it
+    stats()
+        counters and memory use as dict
+    clear()
+        drops all cached results, the counters are kept
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Parameter
+        ---------
+        max_bytes : int, optional
+            memory budget of the cache (default is DEFAULT_MAX_BYTES)
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, sources: tuple, compute):
+        """Returns the cached result of key if it was computed from the same source
+        arrays (identity, not content), otherwise computes, caches and returns it.
+        Cached numpy arrays are read-only.
+
+        Parameters
+        ----------
+        key : hashable
+            query parameters identifying the result
+        sources : tuple
+            arrays (or other objects) the result is derived from
+        compute : callable
+            compute() returns the result, called without holding the cache lock, so it
+            may use the cache itself
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if len(entry[0]) == len(sources) and all(
+                    a is b for a, b in zip(entry[0], sources)
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.__drop(key)
+            self.misses += 1
+        value = _freeze(compute())
+        size = result_nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self.__drop(key)
+            self._entries[key] = (sources, value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.__drop(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def __drop(self, key):
+        self.nbytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,440 @@
+"""
+Rolling window metrics of the doc-classes: daily new cases, moving averages, week over
+week growth and incidence. The kernels work on single series as well as on country x day
+matrices (days along the last axis) and are built on cumulative sums, so the cost does
+not depend on the window size. CTimeSeriesMetrics and CCollectionMetrics cache their
+results per field and window in the result cache of their time series or collection,
+see CDataTimeSeries.metrics and CDataTimeSeriesCollection.metrics.
+"""
+import numpy as np
+from covid_calendar import CCalendar
+from covid_profile import profiled
+
+# fields of the doc-classes the metrics can be computed for
+METRIC_FIELDS = ("confirmed", "deaths", "recovered", "still_infected")
+# metrics of CCollectionMetrics.metric_matrix, fields give their cumulative numbers
+METRICS = METRIC_FIELDS + (
+    "doubling_time",
+    "daily_new",
+    "moving_average",
+    "week_over_week_growth",
+    "incidence",
+)
+
+
+def _window_start_indices(n_points: int, n_days: int, calendar: CCalendar = None):
+    """Index of the first data point of the trailing window of n_days days ending at
+    every data point, and a mask of the windows that lie completely inside the data"""
+    if calendar is None:
+        ix_start = np.maximum(np.arange(n_points) - n_days + 1, 0)
+        complete = np.arange(n_points) >= n_days - 1
+        return ix_start, complete
+    ix_start = calendar.lookback_indices(n_days - 1)
+    complete = calendar.day_numbers - n_days + 1 >= calendar.day_numbers[:1]
+    return ix_start, complete
+
+
+@profiled
+def daily_increments(cumulative):
+    """Daily increments of cumulative numbers (e.g. new cases per day)
+
+    Parameters
+    ----------
+    cumulative : numpy array of floats
+        cumulative numbers, days along the last axis
+    Returns
+    -------
+    increments : numpy array of floats, same shape, nan on the first day
+    """
+    cumulative = np.asarray(cumulative, dtype=float)
+    increments = np.full(cumulative.shape, np.nan)
+    increments[..., 1:] = np.diff(cumulative, axis=-1)
+    return increments
+
+
+@profiled
+def moving_average(values, n_days: int = 7, calendar: CCalendar = None):
+    """Trailing moving average over n_days days, nan values are left out of the average
+
+    Parameters
+    ----------
+    values : numpy array of floats
+        daily values, days along the last axis
+    n_days : int, optional
+        length of the window in days (default is 7)
+    calendar : CCalendar object, optional
+        days of the data points, needed for calendars with gaps (default is None, one
+        data point per day)
+    Returns
+    -------
+    average : numpy array of floats, same shape, nan where the window reaches before the
+        first day or holds no valid value
+    """
+    values = np.asarray(values, dtype=float)
+    valid = np.isfinite(values)
+    zeros = np.zeros(values.shape[:-1] + (1,))
+    sums = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=-1)], -1)
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=-1)], axis=-1)
+    ix_start, complete = _window_start_indices(values.shape[-1], n_days, calendar)
+    window_sum = sums[..., 1:] - sums[..., ix_start]
+    window_count = counts[..., 1:] - counts[..., ix_start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = window_sum / window_count
+    average[..., ~complete] = np.nan
+    average[window_count == 0] = np.nan
+    return average
+
+
+def _window_increase(cumulative, n_days: int, calendar: CCalendar = None):
+    cumulative = np.asarray(cumulative, dtype=float)
+    n_points = cumulative.shape[-1]
+    if calendar is None:
+        ix_back = np.maximum(np.arange(n_points) - n_days, 0)
+        complete = np.arange(n_points) >= n_days
+    else:
+        ix_back = calendar.lookback_indices(n_days)
+        complete = calendar.day_numbers - n_days >= calendar.day_numbers[:1]
+    return cumulative - cumulative[..., ix_back], ix_back, complete
+
+
+@profiled
+def week_over_week_growth(cumulative, n_days: int = 7, calendar: CCalendar = None):
+    """Growth of the new cases of the last n_days days over the n_days days before,
+    0.5 means 50% more new cases than in the previous window
+
+    Parameters
+    ----------
+    cumulative : numpy array of floats
+        cumulative numbers, days along the last axis
+    n_days : int, optional
+        length of the compared windows in days (default is 7)
+    calendar : CCalendar object, optional
+        days of the data points, needed for calendars with gaps (default is None, one
+        data point per day)
+    Returns
+    -------
+    growth : numpy array of floats, same shape, nan where the windows reach before the
+        first day or the previous window has no new cases
+    """
+    increase, ix_back, complete = _window_increase(cumulative, n_days, calendar)
+    previous = increase[..., ix_back]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = increase / previous - 1
+    growth[..., ~(complete & complete[ix_back])] = np.nan
+    growth[previous == 0] = np.nan
+    return growth
+
+
+@profiled
+def incidence(
+    cumulative, population, n_days: int = 7, per: float = 100000, calendar: CCalendar = None
+):
+    """New cases of the last n_days days per population
+
+    Parameters
+    ----------
+    cumulative : numpy array of floats
+        cumulative numbers, days along the last axis
+    population : float or numpy array of floats
+        population, one value per row of a matrix
+    n_days : int, optional
+        length of the window in days (default is 7)
+    per : float, optional
+        size of the reference population (default is 100000)
+    calendar : CCalendar object, optional
+        days of the data points, needed for calendars with gaps (default is None, one
+        data point per day)
+    Returns
+    -------
+    incidence : numpy array of floats, same shape, nan where the window reaches before
+        the first day
+    """
+    increase, _, complete = _window_increase(cumulative, n_days, calendar)
+    population = np.asarray(population, dtype=float)
+    if population.ndim == 1:
+        population = population[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = increase / population * per
+    result[..., ~complete] = np.nan
+    return result
+
+
+@profiled
+def top_k_indices(values, k: int, largest: bool = True, finite_only: bool = False):
+    """Indices of the k largest (or smallest) values, best first. Only the k values are
+    sorted, the others are split off by a partial sort (argpartition). nan values are
+    never ranked, +inf and -inf rank as the most extreme values unless finite_only is
+    set. Ties are ordered by index.
+
+    Parameters
+    ----------
+    values : numpy array of floats
+        values to rank, one per country
+    k : int
+        number of values to return, fewer if there are less rankable values
+    largest : boolean, optional
+        controls if the largest or the smallest values are returned (default is True)
+    finite_only : boolean, optional
+        controls if +inf and -inf are left out like nan (default is False)
+    Returns
+    -------
+    indices : numpy array of ints
+    """
+    values = np.asarray(values, dtype=float)
+    rankable = np.isfinite(values) if finite_only else ~np.isnan(values)
+    candidates = np.flatnonzero(rankable)
+    keys = -values[candidates] if largest else values[candidates]
+    k = max(min(k, len(candidates)), 0)
+    if k == 0:
+        return candidates[:0]
+    if k < len(candidates):
+        # all values beyond the k-th value and the first of the values equal to it
+        kth = np.partition(keys, k - 1)[k - 1]
+        selected = np.flatnonzero(keys < kth)
+        ties = np.flatnonzero(keys == kth)[: k - len(selected)]
+        selected = np.concatenate([selected, ties])
+    else:
+        selected = np.arange(len(candidates))
+    order = np.lexsort((candidates[selected], keys[selected]))
+    return candidates[selected[order]]
+
+
+class CTimeSeriesMetrics:
+    """
+    Class computing and caching the metrics of a single time series.
+    ...
+    Attributes
+    ----------
+    cv_data : CDataTimeSeries object
+        time series the metrics are computed for
+
+    Methods
+    -------
+    daily_new(field='confirmed')
+        daily increments of a field
+    moving_average(n_days=7, field='confirmed')
+        trailing moving average of the daily increments
+    week_over_week_growth(n_days=7, field='confirmed')
+        growth of the new cases of the last n_days days over the n_days days before
+    incidence(population, n_days=7, per=100000, field='confirmed')
+        new cases of the last n_days days per population
+    clear()
+        drops all cached results
+    """
+
+    def __init__(self, cv_data):
+        """
+        Parameter
+        ---------
+        cv_data : CDataTimeSeries
+            time series to compute the metrics for
+        """
+        self.cv_data = cv_data
+
+    def clear(self):
+        self.cv_data.result_cache.clear()
+
+    def _source(self, field: str):
+        if field not in METRIC_FIELDS:
+            raise ValueError(f"Unknown field {field}, use one of {METRIC_FIELDS}")
+        return getattr(self.cv_data, "n_" + field)
+
+    def _cached(self, key: tuple, field: str, compute):
+        """Returns the cached result of key if it was computed from the current data of
+        field (see covid_memo.CResultCache)"""
+        source = self._source(field)
+        return self.cv_data.result_cache.get_or_compute(
+            ("metrics",) + key, (source,), lambda: compute(np.ravel(source))
+        )
+
+    def daily_new(self, field: str = "confirmed"):
+        return self._cached(("daily_new", field), field, daily_increments)
+
+    def moving_average(self, n_days: int = 7, field: str = "confirmed"):
+        calendar = self.cv_data.calendar
+        return self._cached(
+            ("moving_average", field, n_days),
+            field,
+            lambda _: moving_average(self.daily_new(field), n_days, calendar),
+        )
+
+    def week_over_week_growth(self, n_days: int = 7, field: str = "confirmed"):
+        calendar = self.cv_data.calendar
+        return self._cached(
+            ("week_over_week_growth", field, n_days),
+            field,
+            lambda n: week_over_week_growth(n, n_days, calendar),
+        )
+
+    def incidence(
+        self, population: float, n_days: int = 7, per: float = 100000, field="confirmed"
+    ):
+        calendar = self.cv_data.calendar
+        return self._cached(
+            # nan never equals itself, it would never be found in the cache
+            ("incidence", field, n_days, np.float64(population).tobytes(), per),
+            field,
+            lambda n: incidence(n, population, n_days, per, calendar),
+        )
+
+
+class CCollectionMetrics:
+    """
+    Class computing and caching the metrics of all time series of a collection as
+    (countries, days) matrices. The days are the ones of the first data set, longer
+    series are cut, shorter or empty ones are padded with nan.
+    ...
+    Attributes
+    ----------
+    collection : CDataTimeSeriesCollection object
+        collection the metrics are computed for
+
+    Methods
+    -------
+    matrix(field='confirmed')
+        cumulative numbers of all countries
+    daily_new(field='confirmed')
+        daily increments of a field
+    moving_average(n_days=7, field='confirmed')
+        trailing moving average of the daily increments
+    week_over_week_growth(n_days=7, field='confirmed')
+        growth of the new cases of the last n_days days over the n_days days before
+    incidence(population, n_days=7, per=100000, field='confirmed')
+        new cases of the last n_days days per population, population maps the country
+        names to their population, countries without population get nan
+    doubling_time(average_interval_days=1)
+        doubling times of the confirmed cases
+    metric_matrix(metric, ...)
+        any of the metrics above selected by name (see METRICS)
+    clear()
+        drops all cached results
+    """
+
+    def __init__(self, collection):
+        """
+        Parameter
+        ---------
+        collection : CDataTimeSeriesCollection
+            collection to compute the metrics for
+        """
+        self.collection = collection
+
+    def clear(self):
+        self.collection.result_cache.clear()
+
+    @property
+    def calendar(self) -> CCalendar:
+        if not self.collection.data_collection:
+            return CCalendar()
+        return self.collection.data_collection[0].calendar
+
+    def _sources(self, field: str) -> tuple:
+        if field not in METRIC_FIELDS:
+            raise ValueError(f"Unknown field {field}, use one of {METRIC_FIELDS}")
+        return tuple(getattr(ds, "n_" + field) for ds in self.collection.data_collection)
+
+    def _cached(self, key: tuple, field: str, compute):
+        """Returns the cached result of key if it was computed from the current data sets
+        and data of field (see covid_memo.CResultCache)"""
+        sources = self._sources(field)
+        return self.collection.result_cache.get_or_compute(
+            ("metrics",) + key, sources, lambda: compute(sources)
+        )
+
+    @profiled
+    def _build_matrix(self, sources):
+        n_days = len(self.calendar)
+        matrix = np.full((len(sources), n_days), np.nan)
+        for ix, source in enumerate(sources):
+            n = np.ravel(source)[:n_days]
+            matrix[ix, : len(n)] = n
+        return matrix
+
+    def matrix(self, field: str = "confirmed"):
+        return self._cached(("matrix", field), field, self._build_matrix)
+
+    def daily_new(self, field: str = "confirmed"):
+        return self._cached(
+            ("daily_new", field), field, lambda _: daily_increments(self.matrix(field))
+        )
+
+    def moving_average(self, n_days: int = 7, field: str = "confirmed"):
+        return self._cached(
+            ("moving_average", field, n_days),
+            field,
+            lambda _: moving_average(self.daily_new(field), n_days, self.calendar),
+        )
+
+    def week_over_week_growth(self, n_days: int = 7, field: str = "confirmed"):
+        return self._cached(
+            ("week_over_week_growth", field, n_days),
+            field,
+            lambda _: week_over_week_growth(self.matrix(field), n_days, self.calendar),
+        )
+
+    def incidence(
+        self, population: dict, n_days: int = 7, per: float = 100000, field="confirmed"
+    ):
+        countries = [ds.country for ds in self.collection.data_collection]
+        pop = np.array([population.get(c, np.nan) for c in countries], dtype=float)
+        return self._cached(
+            # keyed by the bytes, countries without population are nan
+            ("incidence", field, n_days, pop.tobytes(), per),
+            field,
+            lambda _: incidence(self.matrix(field), pop, n_days, per, self.calendar),
+        )
+
+    def doubling_time(self, average_interval_days: int = 1):
+        return self._cached(
+            ("doubling_time", average_interval_days),
+            "confirmed",
+            lambda _: self.collection._calc_doubling_time_matrix(average_interval_days),
+        )
+
+    def metric_matrix(
+        self,
+        metric: str = "doubling_time",
+        field: str = "confirmed",
+        n_days: int = 7,
+        average_interval_days: int = 1,
+        population: dict = None,
+    ):
+        """Returns a metric of all countries and days by name
+
+        Parameters
+        ----------
+        metric : str, optional
+            one of METRICS, the fields return their cumulative numbers
+            (default is 'doubling_time')
+        field : str, optional
+            field daily_new, moving_average, week_over_week_growth and incidence are
+            computed from (default is 'confirmed')
+        n_days : int, optional
+            window of moving_average, week_over_week_growth and incidence (default is 7)
+        average_interval_days : int, optional
+            averaging interval of doubling_time (default is 1)
+        population : dict, optional
+            population of the countries, needed for incidence (default is None)
+        Returns
+        -------
+        matrix : numpy array of floats, shape (countries, days)
+        """
+        if metric in METRIC_FIELDS:
+            return self.matrix(metric)
+        if metric == "doubling_time":
+            return self.doubling_time(average_interval_days)
+        if metric == "daily_new":
+            return self.daily_new(field)
+        if metric == "moving_average":
+            return self.moving_average(n_days, field)
+        if metric == "week_over_week_growth":
+            return self.week_over_week_growth(n_days, field)
+        if metric == "incidence":
+            if population is None:
+                raise ValueError("incidence needs the population of the countries")
+            return self.incidence(population, n_days, field=field)
+        raise ValueError(f"Unknown metric {metric}, use one of {METRICS}")
+
+
+if __name__ == "__main__":
+    pass
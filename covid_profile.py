@@ -0,0 +1,225 @@
+"""
+Opt-in timing of the stages of a run: reading and parsing the files, time ranges,
+doubling times, simulations and the plot methods. Functions decorated with profiled
+and blocks inside stage() add their wall time to a per-run report, count() adds to
+named counters. While profiling is disabled (the default) a decorated function only
+checks one flag before calling through.
+
+Usage
+-----
+    import covid_profile
+
+    with covid_profile.profiling("report.json"):
+        ...
+    # or from the command line
+    python covid_cli.py --profile --profile-json report.json rank --top 10
+    COVID_PROFILE=report.json python analyse_data.py
+
+Stages nest, the time of a stage includes the time of the stages it calls.
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+from logzero import logger
+
+# environment variable enabling profiling for a whole run, 1 logs the report at exit,
+# any other value is taken as URL of the JSON report
+PROFILE_ENV = "COVID_PROFILE"
+
+
+class CProfileReport:
+    """
+    Wall times and call counts of the stages of a run, and named counters.
+    ...
+    Attributes
+    ----------
+    enabled : boolean
+        controls if stages are timed
+    stages : dict
+        maps the stage names to [calls, total seconds, max seconds]
+    counters : dict
+        maps counter names to their values
+    started : float
+        time.time() of the last reset
+
+    Methods
+    -------
+    add(name, seconds)
+        adds a call of a stage
+    count(name, n)
+        adds n to a counter
+    as_dict()
+        the report as JSON serializable dict, stages sorted by total time
+    log()
+        logs the report as table
+    dump(fname)
+        writes the report as JSON file
+    reset()
+        drops all stages and counters
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+            return {
+                "wall_seconds": time.time() - self.started,
+                "stages": {
+                    name: {
+                        "calls": calls,
+                        "total_seconds": total,
+                        "mean_seconds": total / calls,
+                        "max_seconds": t_max,
+                    }
+                    for name, (calls, total, t_max) in stages
+                },
+                "counters": dict(self.counters),
+            }
+
+    def log(self):
+        report = self.as_dict()
+        width = max([len(name) + 2 for name in report["stages"]] + [40])
+        lines = [f"{'stage':<{width}}{'calls':>8}{'total [s]':>12}{'max [s]':>10}"]
+        for name, res in report["stages"].items():
+            lines.append(
+                f"{name:<{width}}{res['calls']:>8}{res['total_seconds']:>12.4f}"
+                f"{res['max_seconds']:>10.4f}"
+            )
+        for name, value in report["counters"].items():
+            lines.append(f"{name:<{width}}{value:>8}")
+        logger.info(
+            f"Profile of {report['wall_seconds']:.2f} s run\n" + "\n".join(lines)
+        )
+
+    def dump(self, fname: str):
+        with open(fname, "wt") as fh:
+            json.dump(self.as_dict(), fh, indent=1)
+        logger.info(f"Wrote profile to {fname}")
+
+
+# process wide report
+report = CProfileReport()
+
+
+def enable(reset: bool = True):
+    """Starts timing the stages, by default with an empty report"""
+    if reset:
+        report.reset()
+    report.enabled = True
+
+
+def disable():
+    report.enabled = False
+
+
+def is_enabled() -> bool:
+    return report.enabled
+
+
+def count(name: str, n: int = 1):
+    """Adds n to a named counter if profiling is enabled"""
+    if report.enabled:
+        report.count(name, n)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block as stage name if profiling is enabled"""
+    if not report.enabled:
+        yield
+        return
+    t_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        report.add(name, time.perf_counter() - t_start)
+
+
+def profiled(func):
+    """Decorator timing every call of func as stage named by its qualified name"""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not report.enabled:
+            return func(*args, **kwargs)
+        t_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            report.add(name, time.perf_counter() - t_start)
+
+    return wrapper
+
+
+@contextmanager
+def profiling(fname: str = None, log: bool = True):
+    """Profiles the enclosed block, the report is logged and optionally dumped
+
+    Parameters
+    ----------
+    fname : str, optional
+        URL of the JSON report (default is None, no file is written)
+    log : boolean, optional
+        controls if the report is logged with logzero (default is True)
+    """
+    was_enabled = report.enabled
+    enable()
+    try:
+        yield report
+    finally:
+        report.enabled = was_enabled
+        if log:
+            report.log()
+        if fname:
+            report.dump(fname)
+
+
+def _enable_from_environment():
+    value = os.environ.get(PROFILE_ENV, "")
+    if not value or value == "0":
+        return
+    enable()
+    fname = None if value == "1" else value
+
+    def write_report():
+        report.log()
+        if fname:
+            report.dump(fname)
+
+    atexit.register(write_report)
+
+
+_enable_from_environment()
+
+
+if __name__ == "__main__":
+    pass
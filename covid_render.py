@@ -0,0 +1,238 @@
+"""
+Headless batch rendering of the view-classes. Figures are rendered with the Agg
+backend on a process pool, saved to files and closed right away, plt.show() is
+never called.
+
+Usage
+-----
+    python covid_render.py --out-dir ./report --format png svg --workers 4
+"""
+import io
+import os
+import re
+import time
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from logzero import logger
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_store import get_data_store
+from covid_view import CDataTimeSeriesView, CDataTimeSeriesCollectionView
+from covid_profile import stage
+
+# date is the day of the bar chart of collection_doubling_time, None takes to_date
+# (the last day if to_date is None too)
+CRenderJob = namedtuple(
+    "CRenderJob",
+    ["kind", "countries", "fname", "from_date", "to_date", "date"],
+    defaults=(None,),
+)
+CRenderResult = namedtuple("CRenderResult", ["kind", "countries", "fname", "seconds", "error"])
+
+# figures rendered per data set and for the whole collection
+COUNTRY_FIGURES = ("time_series", "doubling_time")
+COLLECTION_FIGURES = ("collection_doubling_time", "collection_subplots")
+
+
+def _file_name_of(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_")
+
+
+def _render_figure(job: CRenderJob, data_store=None):
+    if job.kind == "time_series":
+        view = CDataTimeSeriesView(
+            CDataTimeSeries(country=job.countries[0], data_store=data_store)
+        )
+        return view.plot_time_series(
+            show_plot=False, from_date=job.from_date, to_date=job.to_date
+        )
+    if job.kind == "doubling_time":
+        view = CDataTimeSeriesView(
+            CDataTimeSeries(country=job.countries[0], data_store=data_store)
+        )
+        return view.plot_doubling_time_over_days(
+            show_plot=False, from_date=job.from_date, to_date=job.to_date
+        )
+    view = CDataTimeSeriesCollectionView(
+        CDataTimeSeriesCollection(job.countries, data_store=data_store)
+    )
+    if job.kind == "collection_doubling_time":
+        return view.plot_doubling_time_from_date_as_bar_chart(
+            show_plot=False, date=job.to_date if job.date is None else job.date
+        )
+    if job.kind == "collection_subplots":
+        return view.plot_collection_subplots(
+            from_date=job.from_date, to_date=job.to_date, show_plot=False
+        )
+    raise ValueError(f"Unknown figure {job.kind}")
+
+
+def render_job(job: CRenderJob) -> CRenderResult:
+    """Renders and saves a single figure, runs in the worker processes. Errors are
+    returned instead of raised, so one failing figure does not stop the batch."""
+    t_start = time.perf_counter()
+    error = None
+    fig = None
+    try:
+        fig = _render_figure(job)
+        with stage("covid_render.savefig"):
+            fig.savefig(job.fname)
+    except Exception as err:
+        error = f"{type(err).__name__}: {err}"
+    finally:
+        if fig is not None:
+            plt.close(fig)
+        plt.close("all")
+    return CRenderResult(
+        job.kind, job.countries, job.fname, time.perf_counter() - t_start, error
+    )
+
+
+def render_png(job: CRenderJob, data_store=None) -> bytes:
+    """Renders a single figure into PNG bytes, job.fname is ignored. Errors are raised.
+
+    Parameters
+    ----------
+    job : CRenderJob
+        figure to render
+    data_store : CDataStore object, optional
+        store to take the data from (default is None, the process wide store)
+    """
+    fig = None
+    try:
+        fig = _render_figure(job, data_store=data_store)
+        buf = io.BytesIO()
+        with stage("covid_render.savefig"):
+            fig.savefig(buf, format="png")
+        return buf.getvalue()
+    finally:
+        if fig is not None:
+            plt.close(fig)
+        plt.close("all")
+
+
+def create_render_jobs(
+    countries: list,
+    out_dir: str,
+    formats=("png",),
+    from_date: dt = None,
+    to_date: dt = None,
+    date: dt = None,
+    country_figures=COUNTRY_FIGURES,
+    collection_figures=COLLECTION_FIGURES,
+) -> list:
+    """Creates the jobs for the figures of every country and of the whole collection
+
+    Parameters
+    ----------
+    countries : list of str
+        countries to render
+    out_dir : str
+        directory the figures are saved to
+    formats : tuple of str, optional
+        file formats, every figure is saved once per format (default is ('png',))
+    from_date : datetime object, optional
+        controls the start date for plotting (default is None)
+    to_date : datetime object, optional
+        controls the end date for plotting (default is None)
+    date : datetime object, optional
+        date of the doubling time bar chart of the collection (default is None,
+        to_date)
+    country_figures : tuple of str, optional
+        figures per country (default is COUNTRY_FIGURES)
+    collection_figures : tuple of str, optional
+        figures of the collection of all countries (default is COLLECTION_FIGURES)
+    """
+    jobs = []
+    for fmt in formats:
+        for country in countries:
+            for kind in country_figures:
+                fname = os.path.join(out_dir, f"{_file_name_of(country)}_{kind}.{fmt}")
+                jobs.append(
+                    CRenderJob(kind, (country,), fname, from_date, to_date, date)
+                )
+        for kind in collection_figures:
+            fname = os.path.join(out_dir, f"{kind}.{fmt}")
+            jobs.append(
+                CRenderJob(kind, tuple(countries), fname, from_date, to_date, date)
+            )
+    return jobs
+
+
+def render_batch(jobs: list, workers: int = None) -> list:
+    """Renders a list of jobs on a process pool and logs timings and failures
+
+    Parameters
+    ----------
+    jobs : list of CRenderJob
+        figures to render
+    workers : int, optional
+        number of worker processes, 1 renders in the calling process (default is None,
+        the number of CPUs)
+    Returns
+    -------
+    results : list of CRenderResult, in the order of jobs
+    """
+    for out_dir in {os.path.dirname(job.fname) for job in jobs}:
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+    t_start = time.perf_counter()
+    if workers == 1:
+        results = [render_job(job) for job in jobs]
+    else:
+        # load the files of all fields once before forking, the workers share the
+        # parsed files, the time series figures need every field
+        store = get_data_store()
+        for field in store.fname._fields:
+            store.get_table(field)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render_job, jobs, chunksize=4))
+    for res in results:
+        if res.error is None:
+            logger.debug(f"{res.fname}: {res.seconds:.2f} s")
+        else:
+            logger.warning(f"{res.fname} failed after {res.seconds:.2f} s: {res.error}")
+    n_failed = sum(res.error is not None for res in results)
+    logger.info(
+        f"Rendered {len(results) - n_failed}/{len(results)} figures in "
+        f"{time.perf_counter() - t_start:.1f} s, {n_failed} failed"
+    )
+    return results
+
+
+def _parse_date(date_str: str) -> dt:
+    return dt.strptime(date_str, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--countries", nargs="*", help="countries, default is all")
+    parser.add_argument("--out-dir", default="./report")
+    parser.add_argument("--format", nargs="+", default=["png"], dest="formats")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--from-date", type=_parse_date, default=None)
+    parser.add_argument("--to-date", type=_parse_date, default=None)
+    parser.add_argument(
+        "--date", type=_parse_date, default=None, help="day of the bar chart"
+    )
+    args = parser.parse_args(argv)
+    countries = args.countries or get_data_store().country_list
+    jobs = create_render_jobs(
+        countries,
+        args.out_dir,
+        formats=args.formats,
+        from_date=args.from_date,
+        to_date=args.to_date,
+        date=args.date,
+    )
+    results = render_batch(jobs, workers=args.workers)
+    return 1 if any(res.error is not None for res in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,557 @@
+"""
+Local HTTP query service over the data store. The CSSE files are loaded once and kept
+in memory, queries are answered as JSON (PNG for figures) from the doc- and
+view-classes. Requests are handled concurrently by asyncio, the numeric queries run on
+a thread pool, figures are rendered on a process pool, so the event loop never waits
+for them. Responses are cached (see covid_memo) until the data changes, the files are
+polled and reloaded in place when e.g. pull_csse_data.sh updated them.
+
+Usage
+-----
+    python covid_server.py --port 8050
+
+Endpoints
+---------
+    /countries
+    /series?country=Germany&from=2020-03-01&to=2020-06-01
+    /doubling_time?country=Germany&average_interval_days=7&from=...&to=...
+    /rank?metric=doubling_time&date=2020-05-01&end_date=...&k=10&ascending=1
+    /plot?kind=time_series&country=Germany&from=...&to=...
+    /plot?kind=collection_subplots&countries=Germany,Italy
+    /plot?kind=collection_doubling_time&countries=Germany,Italy&date=2020-05-01
+    /stats
+Dates are given as YYYY-MM-DD.
+"""
+import json
+import math
+import time
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime as dt
+from urllib.parse import urlsplit, parse_qsl
+import numpy as np
+from logzero import logger
+from covid_store import get_data_store
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_memo import CResultCache
+from covid_metrics import METRICS
+
+# figures served by /plot, see covid_render
+PLOT_KINDS = (
+    "time_series",
+    "doubling_time",
+    "collection_doubling_time",
+    "collection_subplots",
+)
+# size limit of request lines and headers
+MAX_LINE_BYTES = 8192
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class CRequestError(Exception):
+    """Request that can not be answered, status is the HTTP status code"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _store_key(data_store) -> tuple:
+    """Identifies the data of a store: its class, files and the sha1 hashes of its
+    loaded tables. Small to send to the render processes, unlike the tables."""
+    return (
+        type(data_store),
+        tuple(data_store.fname),
+        data_store.use_cache,
+        None if data_store.country_filter is None else tuple(data_store.country_filter),
+        tuple(
+            (field, (table.fingerprint or {}).get("sha1"))
+            for field, table in sorted(data_store.tables.items())
+        ),
+    )
+
+
+# store of the render process and its key, replaced when the files changed
+_worker_store = (None, None)
+
+
+def _render_png_in_worker(job, store_key: tuple, data_store=None) -> bytes:
+    """Renders a figure in the render processes. Every process keeps one store, loaded
+    from the files (and their cache) when the data of store_key is first requested.
+    Returns None if the files changed since, data_store (a pickled snapshot) is then
+    used as is."""
+    global _worker_store
+    import covid_render
+
+    if data_store is None:
+        key, data_store = _worker_store
+        if key != store_key:
+            store_class, fname, use_cache, country_filter, fields = store_key
+            data_store = store_class(
+                store_class.fnames_class(*fname),
+                use_cache=use_cache,
+                country_filter=None if country_filter is None else list(country_filter),
+            )
+            for field, _ in fields:
+                data_store.get_table(field)
+            key = _store_key(data_store)
+            _worker_store = (key, data_store)
+        if key != store_key:
+            return None
+    return covid_render.render_png(job, data_store=data_store)
+
+
+def _json_list(values) -> list:
+    return [
+        v if not isinstance(v, float) or math.isfinite(v) else None
+        for v in np.asarray(values).tolist()
+    ]
+
+
+def _json_value(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class CServiceData:
+    """
+    Data of one version of the CSSE files. Data sets are created on first request and
+    shared by all later ones, a reload replaces the whole object.
+    ...
+    Attributes
+    ----------
+    data_store : CDataStore object
+        snapshot of the store the data sets view into, not changed by reloads
+    version : int
+        counts the reloads, 0 for the initial load
+    store_key : tuple
+        identifies the data of data_store in the render processes
+    countries : set of str
+        names of all countries of the store
+
+    Methods
+    -------
+    series(country)
+        returns the CDataTimeSeries object of a country
+    collection()
+        returns the CDataTimeSeriesCollection of all countries
+    """
+
+    def __init__(self, data_store, version: int = 0):
+        """
+        Parameters
+        ----------
+        data_store : CDataStore object
+            snapshot of the store the data sets view into (see CDataStore.snapshot)
+        version : int, optional
+            counts the reloads (default is 0)
+        """
+        self.data_store = data_store
+        self.version = version
+        self.store_key = _store_key(data_store)
+        self.countries = set(data_store.country_list)
+        self._series = {}
+        self._collection = None
+        self._lock = threading.Lock()
+
+    def series(self, country: str) -> CDataTimeSeries:
+        if country not in self.countries:
+            raise CRequestError(404, f"Unknown country {country}")
+        with self._lock:
+            if country not in self._series:
+                self._series[country] = CDataTimeSeries(
+                    country=country, data_store=self.data_store
+                )
+            return self._series[country]
+
+    def collection(self) -> CDataTimeSeriesCollection:
+        with self._lock:
+            if self._collection is None:
+                self._collection = CDataTimeSeriesCollection(
+                    sorted(self.countries), data_store=self.data_store
+                )
+            return self._collection
+
+
+class CQueryService:
+    """
+    Asyncio HTTP service answering queries on the CSSE data, see the module docstring
+    for the endpoints.
+    ...
+    Attributes
+    ----------
+    data_store : CDataStore object
+        store holding the parsed files
+    data : CServiceData object
+        data sets of the current version of the files
+    response_cache : CResultCache object
+        cached response bodies, dropped with every reload
+    poll_interval : float
+        seconds between two checks of the files for changes, None disables reloading
+
+    Methods
+    -------
+    handle_query(path, query)
+        returns content type and body of the response to a query, runs off the loop
+    reload()
+        checks the files for changes and switches to the new data
+    serve(host, port)
+        runs the service until it is cancelled
+    """
+
+    def __init__(
+        self,
+        data_store=None,
+        render_workers: int = 2,
+        poll_interval: float = 10.0,
+        cache_bytes: int = 64 * 2 ** 20,
+    ):
+        """
+        Parameters
+        ----------
+        data_store : CDataStore object, optional
+            store to serve (default is None, the process wide store)
+        render_workers : int, optional
+            number of processes rendering figures (default is 2)
+        poll_interval : float, optional
+            seconds between two checks of the files for changes, None disables
+            reloading (default is 10.0)
+        cache_bytes : int, optional
+            memory budget of the response cache (default is 64 MB)
+        """
+        self.data_store = data_store if data_store is not None else get_data_store()
+        self.data = CServiceData(self.data_store.snapshot())
+        self.response_cache = CResultCache(cache_bytes)
+        self.poll_interval = poll_interval
+        self._threads = ThreadPoolExecutor(thread_name_prefix="covid-query")
+        # spawned, forking a process running threads and an event loop is not safe
+        self._renderers = ProcessPoolExecutor(
+            max_workers=render_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._n_requests = 0
+        self._started = time.time()
+        self._routes = {
+            "/countries": self._query_countries,
+            "/series": self._query_series,
+            "/doubling_time": self._query_doubling_time,
+            "/rank": self._query_rank,
+            "/plot": self._query_plot,
+        }
+
+    # -- queries, run on the thread pool --
+
+    def handle_query(self, path: str, query: dict):
+        """Returns (content_type, body) of the response to a query, bodies of the data
+        version they were computed from are cached
+
+        Parameters
+        ----------
+        path : str
+            path of the URL, e.g. '/series'
+        query : dict
+            parameters of the URL
+        """
+        if path == "/stats":
+            return self._query_stats(query)
+        route = self._routes.get(path)
+        if route is None:
+            raise CRequestError(404, f"Unknown endpoint {path}")
+        data = self.data
+        return self.response_cache.get_or_compute(
+            (path, tuple(sorted(query.items()))), (data,), lambda: route(data, query)
+        )
+
+    def _query_countries(self, data: CServiceData, query: dict):
+        return self._json({"countries": sorted(data.countries)})
+
+    def _query_series(self, data: CServiceData, query: dict):
+        ds = data.series(self._get(query, "country"))
+        ixs, ixe = self._range(ds, query)
+        return self._json(
+            {
+                "country": ds.country,
+                "dates": ds.calendar.as_datetime64()[ixs:ixe].astype(str).tolist(),
+                "confirmed": _json_list(np.ravel(ds.n_confirmed)[ixs:ixe]),
+                "deaths": _json_list(np.ravel(ds.n_deaths)[ixs:ixe]),
+                "recovered": _json_list(np.ravel(ds.n_recovered)[ixs:ixe]),
+                "still_infected": _json_list(np.ravel(ds.n_still_infected)[ixs:ixe]),
+            }
+        )
+
+    def _query_doubling_time(self, data: CServiceData, query: dict):
+        ds = data.series(self._get(query, "country"))
+        average_interval_days = self._get(query, "average_interval_days", int, 1)
+        ixs, ixe = self._range(ds, query)
+        doubling_times = ds._calc_doubling_time_for_all_days(average_interval_days)
+        return self._json(
+            {
+                "country": ds.country,
+                "average_interval_days": average_interval_days,
+                "dates": ds.calendar.as_datetime64()[ixs:ixe].astype(str).tolist(),
+                "doubling_time": _json_list(doubling_times[ixs:ixe]),
+            }
+        )
+
+    def _query_rank(self, data: CServiceData, query: dict):
+        metric = self._get(query, "metric", str, "doubling_time")
+        if metric not in METRICS or metric == "incidence":
+            raise CRequestError(400, f"Unsupported metric {metric}")
+        collection = data.collection()
+        ranking = collection.rank(
+            metric,
+            date=self._get(query, "date", self._parse_date, None),
+            end_date=self._get(query, "end_date", self._parse_date, None),
+            k=self._get(query, "k", int, 10),
+            largest=not self._get(query, "ascending", self._parse_bool, False),
+            finite_only=self._get(query, "finite_only", self._parse_bool, False),
+            n_days=self._get(query, "window", int, 7),
+            average_interval_days=self._get(query, "average_interval_days", int, 1),
+        )
+        return self._json(
+            {
+                "metric": metric,
+                "ranking": [
+                    {"country": country, "value": _json_value(value)}
+                    for country, value in ranking.items()
+                ],
+            }
+        )
+
+    def _query_plot(self, data: CServiceData, query: dict):
+        from covid_render import CRenderJob
+
+        kind = self._get(query, "kind", str, "time_series")
+        if kind not in PLOT_KINDS:
+            raise CRequestError(400, f"Unknown plot kind {kind}, use one of {PLOT_KINDS}")
+        if kind.startswith("collection"):
+            countries = [c for c in self._get(query, "countries").split(",") if c]
+        else:
+            countries = [self._get(query, "country")]
+        for country in countries:
+            if country not in data.countries:
+                raise CRequestError(404, f"Unknown country {country}")
+        job = CRenderJob(
+            kind,
+            countries,
+            None,
+            self._get(query, "from", self._parse_date, None),
+            self._get(query, "to", self._parse_date, None),
+            self._get(query, "date", self._parse_date, None),
+        )
+        # this thread waits, the figure is rendered in another process from the tables
+        # of the data version the response is cached for. The process loads them
+        # itself, the snapshot is only sent if the files changed since
+        key = data.store_key
+        png = self._renderers.submit(_render_png_in_worker, job, key).result()
+        if png is None:
+            png = self._renderers.submit(
+                _render_png_in_worker, job, key, data.data_store
+            ).result()
+        return "image/png", png
+
+    def _query_stats(self, query: dict):
+        data = self.data
+        return self._json(
+            {
+                "version": data.version,
+                "requests": self._n_requests,
+                "uptime_seconds": time.time() - self._started,
+                "days": len(data.data_store.calendar),
+                "last_day": data.data_store.days[-1].strftime("%Y-%m-%d")
+                if len(data.data_store.calendar)
+                else None,
+                "response_cache": self.response_cache.stats(),
+            }
+        )
+
+    @staticmethod
+    def _json(obj):
+        return "application/json", json.dumps(obj, allow_nan=False).encode()
+
+    @staticmethod
+    def _parse_date(date_str: str) -> dt:
+        return dt.strptime(date_str, "%Y-%m-%d")
+
+    @staticmethod
+    def _parse_bool(value: str) -> bool:
+        return value.lower() in ("1", "true", "yes")
+
+    @staticmethod
+    def _get(query: dict, name: str, convert=str, default=CRequestError):
+        if name not in query:
+            if default is CRequestError:
+                raise CRequestError(400, f"Missing parameter {name}")
+            return default
+        try:
+            return convert(query[name])
+        except ValueError as err:
+            raise CRequestError(400, f"Invalid parameter {name}: {err}")
+
+    def _range(self, ds: CDataTimeSeries, query: dict):
+        return ds._get_time_range_indices(
+            start_date=self._get(query, "from", self._parse_date, None),
+            end_date=self._get(query, "to", self._parse_date, None),
+        )
+
+    # -- reloading --
+
+    def reload(self) -> bool:
+        """Brings the store up to date with its files. If the data changed, new data
+        sets are created for the following requests on a snapshot of the updated store.
+        The store swaps in the updated tables at once, running requests finish on the
+        snapshot of the previous data and their cached responses are never served again.
+
+        Returns
+        -------
+        reloaded : boolean, True if the data changed
+        """
+        changed = self.data_store.update()
+        if not changed:
+            return False
+        self.data = CServiceData(self.data_store.snapshot(), self.data.version + 1)
+        self.response_cache.clear()
+        logger.info(f"Reloaded {', '.join(changed)}, data version {self.data.version}")
+        return True
+
+    async def _poll_files(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await loop.run_in_executor(self._threads, self.reload)
+            except Exception as err:
+                logger.warning(f"Reloading the data failed: {err}")
+
+    # -- HTTP --
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        if len(request_line) > MAX_LINE_BYTES:
+            raise CRequestError(400, "Request line too long")
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(line) > MAX_LINE_BYTES:
+                raise CRequestError(400, "Header too long")
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise CRequestError(400, "Malformed request line")
+        return parts[0], parts[1]
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        t_start = time.perf_counter()
+        status, content_type, body, target = 200, None, b"", ""
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, target = request
+            if method not in ("GET", "HEAD"):
+                raise CRequestError(405, f"Method {method} not allowed")
+            url = urlsplit(target)
+            query = dict(parse_qsl(url.query))
+            self._n_requests += 1
+            content_type, body = await loop.run_in_executor(
+                self._threads, self.handle_query, url.path, query
+            )
+            if method == "HEAD":
+                body = b""
+        except CRequestError as err:
+            status, content_type, body = err.status, *self._json({"error": str(err)})
+        except Exception as err:
+            logger.exception(f"Failed to answer {target}")
+            status, content_type, body = 500, *self._json({"error": str(err)})
+        try:
+            header = (
+                f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(header.encode("latin-1") + body)
+            await writer.drain()
+            logger.debug(
+                f"{status} {target} {(time.perf_counter() - t_start) * 1000:.1f} ms"
+            )
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8050):
+        """Runs the service until it is cancelled
+
+        Parameters
+        ----------
+        host : str, optional
+            address to listen on (default is '127.0.0.1', local connections only)
+        port : int, optional
+            port to listen on, 0 picks a free one (default is 8050)
+        """
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        poller = None
+        if self.poll_interval:
+            poller = asyncio.ensure_future(self._poll_files())
+        for sock in server.sockets:
+            host, port = sock.getsockname()[:2]
+            logger.info(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if poller is not None:
+                poller.cancel()
+            self.close()
+
+    def close(self):
+        self._threads.shutdown(wait=False)
+        self._renderers.shutdown(wait=False)
+
+
+def main(argv=None):
+    description, _, usage = __doc__.strip().partition("\n\n")
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=usage,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10.0,
+        help="seconds between checks of the files for changes, 0 disables reloading",
+    )
+    parser.add_argument("--cache-mb", type=float, default=64, help="response cache size")
+    args = parser.parse_args(argv)
+    service = CQueryService(
+        render_workers=args.render_workers,
+        poll_interval=args.poll_interval or None,
+        cache_bytes=int(args.cache_mb * 2 ** 20),
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
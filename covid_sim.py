@@ -0,0 +1,103 @@
+"""
+Simulation kernel of the doc-view model based approach. Time series are simulated from
+a schedule of doubling times as array computation, many parameter sets at once.
+"""
+import numpy as np
+from covid_profile import profiled
+
+
+def _broadcast_parameter(value, n_runs: int, name: str):
+    values = np.atleast_1d(np.asarray(value, dtype=float))
+    if len(values) == 1:
+        return np.repeat(values, n_runs)
+    if len(values) != n_runs:
+        raise ValueError(f"{name} needs 1 or {n_runs} values, got {len(values)}")
+    return values
+
+
+def resolve_doubling_times(day_numbers, doubling_time_dict: dict):
+    """Looks up the doubling time for every day from a schedule of breakpoints. A day
+    takes the value of the first key (in insertion order) that is not earlier than the
+    day, days after all keys take the value of the last key.
+
+    Parameters
+    ----------
+    day_numbers : numpy array of ints
+        days since 1970-01-01 (see CCalendar.day_numbers)
+    doubling_time_dict : dict
+        dict with keys '%Y-%m-%d' formatted strings to indicate the date and float values
+        with corresponding doubling times
+    Returns
+    -------
+    doubling_times : numpy array of floats, one value per day
+    """
+    keys = list(doubling_time_dict.keys())
+    values = np.array([doubling_time_dict[k] for k in keys], dtype=float)
+    key_days = np.array(keys, dtype="datetime64[D]").astype(np.int64)
+    order = np.argsort(key_days, kind="stable")
+    # first key in insertion order among all keys from a sorted position on
+    first_key = np.minimum.accumulate(order[::-1])[::-1]
+    pos = np.searchsorted(key_days[order], np.asarray(day_numbers), side="left")
+    ix_key = np.full(len(pos), len(keys) - 1)
+    inside = pos < len(keys)
+    ix_key[inside] = first_key[pos[inside]]
+    return values[ix_key]
+
+
+@profiled
+def simulate_time_series(
+    day_numbers,
+    doubling_time_dicts,
+    mortality=0.045,
+    days_to_recovery=12.65,
+):
+    """Simulates confirmed, dead and recovered cases for one or many parameter sets.
+    Starting with one confirmed case, confirmed cases grow by the daily rate given by
+    the doubling time of the day. Cases confirmed days_to_recovery days ago count as
+    dead (share mortality) or recovered.
+
+    Parameters
+    ----------
+    day_numbers : numpy array of ints
+        days since 1970-01-01 to simulate (see CCalendar.day_numbers)
+    doubling_time_dicts : dict or list of dicts
+        doubling time schedules, see resolve_doubling_times
+    mortality : float or sequence of floats, optional
+        rate of people dying once confirmed, one value or one per schedule (default is 0.045)
+    days_to_recovery : float or sequence of floats, optional
+        time in days it takes to recover or die, one value or one per schedule
+        (default is 12.65)
+    Returns
+    -------
+    n_confirmed, n_deaths, n_recovered : numpy arrays of floats, shape (runs, days)
+    """
+    if isinstance(doubling_time_dicts, dict):
+        doubling_time_dicts = [doubling_time_dicts]
+    n_runs = len(doubling_time_dicts)
+    n_days = len(day_numbers)
+    mortality = _broadcast_parameter(mortality, n_runs, "mortality")
+    days_to_recovery = _broadcast_parameter(
+        days_to_recovery, n_runs, "days_to_recovery"
+    )
+
+    inf_rate = np.ones((n_runs, n_days))
+    for run, d_dict in enumerate(doubling_time_dicts):
+        inf_rate[run, 1:] = np.exp(
+            np.log(2) / resolve_doubling_times(day_numbers[1:], d_dict)
+        )
+    n_confirmed = np.cumprod(inf_rate, axis=1)
+
+    days = np.arange(n_days)
+    lag = np.round(days_to_recovery).astype(int)[:, np.newaxis]
+    active = (days >= days_to_recovery[:, np.newaxis]) & (days >= 1)
+    n_lagged = np.take_along_axis(
+        n_confirmed, np.clip(days - lag, 0, max(n_days - 1, 0)), axis=1
+    )
+    n_lagged[~active] = 0
+    n_deaths = n_lagged * mortality[:, np.newaxis]
+    n_recovered = n_lagged * (1 - mortality[:, np.newaxis])
+    return n_confirmed, n_deaths, n_recovered
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,946 @@
+"""
+Data store of the doc-view model based approach. The CSSE time series files are
+parsed once per process and kept as country x day matrices, the doc-classes only
+hold views into these matrices. Besides the global files the US files with one row
+per county are supported (CUSFnames, CUSDataStore), rolled up to states and the nation.
+"""
+import re
+import csv
+import copy
+import gzip
+import zlib
+import threading
+import numpy as np
+from datetime import datetime as dt
+from collections import namedtuple
+from logzero import logger
+import covid_cache
+from covid_calendar import CCalendar
+from covid_profile import profiled, count
+
+CFnames = namedtuple(
+    "fnames",
+    ["confirmed", "recovered", "deaths"],
+    defaults=[
+        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv",
+        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv",
+        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv",
+    ],
+)
+# the US files hold no recovered cases
+CUSFnames = namedtuple(
+    "us_fnames",
+    ["confirmed", "deaths"],
+    defaults=[
+        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv",
+        "../COVID-19/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_US.csv",
+    ],
+)
+
+# process wide registry of data stores, one per set of file names
+_data_stores = {}
+# rows of the data matrix allocated at once while parsing
+ROW_BLOCK_SIZE = 512
+# columns in front of the dates, mapped to the CDataTable attributes holding them. The
+# global files have the first four, the US files the others in addition, the columns
+# are located by name, as their number and order differs (Population is only part of
+# the US deaths file)
+META_COLUMNS = {
+    "Province/State": "provinces",
+    "Province_State": "provinces",
+    "Country/Region": "countries",
+    "Country_Region": "countries",
+    "Lat": "latitude",
+    "Long": "longitude",
+    "Long_": "longitude",
+    "Admin2": "counties",
+    "UID": "uid",
+    "FIPS": "fips",
+    "Population": "population",
+}
+# header fields of the data columns
+DATE_COLUMN = re.compile(r"\d{1,2}/\d{1,2}/\d{2}")
+# levels of the US data
+US_LEVELS = ("nation", "state", "county")
+
+
+def open_csv(fname: str):
+    """Opens a CSSE csv file for streaming, gzip compressed files (*.gz) are
+    decompressed on the fly
+
+    Parameters
+    ----------
+    fname : str
+        URL of the file
+    """
+    if fname.endswith(".gz"):
+        return gzip.open(fname, "rt", newline="")
+    return open(fname, "rt", newline="")
+
+
+def _row_crc(n_strs) -> int:
+    return zlib.crc32(",".join(n_strs).encode())
+
+
+def split_header(header):
+    """Splits the header of a CSSE file into the names of the meta columns and the
+    date strings of the data columns
+
+    Parameters
+    ----------
+    header : list of str
+        first line of the file
+    Returns
+    -------
+    (meta_header, day_strs) : tuple of lists of str
+    """
+    n_meta = 0
+    while n_meta < len(header) and not DATE_COLUMN.fullmatch(header[n_meta].strip()):
+        n_meta += 1
+    return [name.strip() for name in header[:n_meta]], header[n_meta:]
+
+
+def get_data_store(fname: CFnames = None, use_cache: bool = True):
+    """Returns the process wide data store for the given file names
+
+    Parameters
+    ----------
+    fname : namedTuple fnames, optional
+        file names of the CSSE data files, CUSFnames for the US files (default is
+        CFnames())
+    use_cache : boolean, optional
+        controls if the binary cache next to the files is used, only evaluated
+        when the store is created (default is True)
+    Returns
+    -------
+    store : CDataStore object, CUSDataStore object for CUSFnames
+    """
+    if fname is None:
+        fname = CFnames()
+    if fname not in _data_stores:
+        store_class = CUSDataStore if isinstance(fname, CUSFnames) else CDataStore
+        _data_stores[fname] = store_class(fname, use_cache=use_cache)
+    return _data_stores[fname]
+
+
+def reset_data_stores():
+    """Drops all process wide data stores, files will be parsed again on next access"""
+    _data_stores.clear()
+
+
+class CDataTable:
+    """
+    Class representing the parsed content of a single CSSE time series file.
+    ...
+    Attributes
+    ----------
+    fname : str
+        URL of the parsed file
+    calendar : CCalendar object
+        dates of the data columns
+    days : tuple of datetime objects
+        dates of the data columns (read-only, shared with calendar)
+    meta_header : list of str
+        names of the columns in front of the dates
+    provinces : list of str
+        province/state of every row, empty string for country level rows
+    countries : list of str
+        country/region of every row
+    counties : list of str
+        county (Admin2) of every row, empty strings if the file has no such column
+    latitude : numpy array of floats
+        geographic latitude of every row
+    longitude : numpy array of floats
+        geographic longitude of every row
+    uid : numpy array of floats
+        UID of every row (US files only, nan otherwise)
+    fips : numpy array of floats
+        FIPS code of every row (US files only, nan otherwise)
+    population : numpy array of floats
+        population of every row (US deaths file only, nan otherwise)
+    data : numpy array of floats
+        matrix of shape (rows, days), every row holds the time series of one row in the file
+    row_index : dict
+        maps the country name to the row of its country level entry
+    province_index : dict
+        maps (country, province) to the row of the entry
+    group_names : list of str
+        sorted names of all countries, including those only split into provinces
+    group_index : dict
+        maps the country name to its row in the aggregated matrix
+    row_crc : numpy array of uint32
+        crc32 of every parsed line, used to detect revised history on update
+    fingerprint : dict
+        size, modification time and hash of the file at the time it was parsed
+    use_cache : boolean
+        data is taken from / written to the binary cache next to the file (see covid_cache)
+    country_filter : list of str
+        countries the table is restricted to, None for all
+
+    Methods
+    -------
+    get_row(self, country:str, province:str=None, aggregate:bool=None)
+        returns the time series of a country or a province as a read-only view
+    get_aggregated(self)
+        returns the matrix of all countries with their province rows summed up
+    get_province_list(self, country:str)
+        returns the provinces a country is split into
+    update(self)
+        brings the table up to date with its file, parses only appended date columns
+    updated(self)
+        returns an up to date copy of the table, the table itself is left unchanged
+    """
+
+    def __init__(self, fname: str, use_cache: bool = True, country_filter=None):
+        """
+        Parameter
+        ---------
+        fname : str
+            URL of the CSSE time series file to parse, may be gzip compressed (*.gz)
+        use_cache : boolean, optional
+            controls if the binary cache next to the file is used (default is True)
+        country_filter : list of str, optional
+            keep only the rows of these countries, parsing stops as soon as all of their
+            rows were read. Filtered tables are never cached (default is None)
+        """
+        self.fname = fname
+        self.country_filter = country_filter
+        self.use_cache = use_cache and country_filter is None
+        self.fingerprint = None
+        self.__reset()
+        if self.use_cache and covid_cache.load_table(self):
+            logger.debug(f"Loaded {self.fname} from cache")
+            self.update()
+        else:
+            self.__read_csv_data()
+            if self.use_cache:
+                covid_cache.save_table(self)
+        self._build_row_index()
+
+    def get_row(self, country: str, province: str = None, aggregate: bool = None):
+        """Returns the time series of a country or one of its provinces
+
+        Parameters
+        ----------
+        country : str
+            name of the country
+        province : str, optional
+            name of a province/state, selects the row of this province only (default is None)
+        aggregate : boolean, optional
+            True sums up all rows of the country (country level entry and provinces/
+            territories), False only takes the country level entry. None takes the
+            country level entry if available and the sum of the provinces otherwise
+            (default is None)
+        Returns
+        -------
+        row : numpy array of floats, empty if the country is not available
+        """
+        if province is not None:
+            ix = self.province_index.get((country, province))
+            return self.data[ix] if ix is not None else np.zeros(0)
+        ix = self.row_index.get(country)
+        if ix is not None and not aggregate:
+            return self.data[ix]
+        if aggregate is False or country not in self.group_index:
+            return np.zeros(0)
+        return self.get_aggregated()[self.group_index[country]]
+
+    def get_location(self, country: str, province: str = None):
+        """Returns (latitude, longitude) of a country or province, (None, None) if not
+        available. Countries without country level entry get the mean of their provinces."""
+        if province is not None:
+            ixs = [self.province_index.get((country, province))]
+        elif country in self.row_index:
+            ixs = [self.row_index[country]]
+        elif country in self.group_index:
+            g = self.group_index[country]
+            ixs = self._group_order[self._group_bounds[g] : self._group_bounds[g + 1]]
+        else:
+            ixs = [None]
+        if ixs[0] is None:
+            return (None, None)
+        return (
+            float(np.nanmean(self.latitude[ixs])),
+            float(np.nanmean(self.longitude[ixs])),
+        )
+
+    def get_aggregated(self):
+        """Returns the matrix of shape (len(group_names), days) holding the sum over all
+        rows of every country. All countries are reduced at once by segment sums over
+        the rows sorted by country name."""
+        if self._aggregated is None:
+            self._aggregated = self._group_sums(self.data)
+            self._aggregated.flags.writeable = False
+        return self._aggregated
+
+    def _group_sums(self, values: np.ndarray) -> np.ndarray:
+        """Sums values (one entry or row per table row) over the rows of every group"""
+        if len(self._group_order) == 0:
+            return np.zeros((0,) + values.shape[1:])
+        return np.add.reduceat(
+            values[self._group_order], self._group_bounds[:-1], axis=0
+        )
+
+    def get_province_list(self, country: str):
+        """Returns the names of the provinces/states a country is split into"""
+        return [p for (c, p) in self.province_index.keys() if c == country and p != ""]
+
+    def update(self) -> bool:
+        """Brings the table up to date with its file. If only new date columns were
+        appended to the file, only these columns are parsed and appended to self.data.
+        If the existing history was revised, the whole file is parsed again.
+
+        Returns
+        -------
+        updated : boolean, True if the data of the table changed
+        """
+        state = covid_cache.compare_fingerprint(self.fname, self.fingerprint)
+        if state == "same":
+            return False
+        if state == "touched":
+            if self.use_cache:
+                covid_cache.save_fingerprint(self)
+            return False
+        if self.__append_new_columns():
+            logger.info(f"Appended new dates of {self.fname}")
+        else:
+            logger.info(f"History of {self.fname} was revised, parsing whole file")
+            self.__reset()
+            self.__read_csv_data()
+        self._build_row_index()
+        if self.use_cache:
+            covid_cache.save_table(self)
+        return True
+
+    def updated(self):
+        """Returns a copy of the table brought up to date with its file (see update),
+        the table itself is never changed, so it can be read by other threads meanwhile.
+
+        Returns
+        -------
+        table : CDataTable object, None if the data did not change
+        """
+        table = copy.copy(self)
+        if self.fingerprint is not None:
+            table.fingerprint = dict(self.fingerprint)
+        if not table.update():
+            # keeps the timestamps of a touched file, the data is the same
+            self.fingerprint = table.fingerprint
+            return None
+        return table
+
+    # attributes holding the meta columns, see META_COLUMNS
+    TEXT_COLUMNS = ("provinces", "countries", "counties")
+    NUMBER_COLUMNS = ("latitude", "longitude", "uid", "fips", "population")
+
+    def __reset(self):
+        self.calendar = CCalendar()
+        self.meta_header = []
+        for name in self.TEXT_COLUMNS:
+            setattr(self, name, [])
+        for name in self.NUMBER_COLUMNS:
+            setattr(self, name, np.zeros(0))
+        self.data = np.zeros((0, 0))
+        self.row_crc = np.zeros(0, dtype=np.uint32)
+        self.row_index = {}
+
+    @profiled
+    def __read_csv_data(self):
+        try:
+            self.fingerprint = covid_cache.file_fingerprint(self.fname)
+            with open_csv(self.fname) as fh:
+                reader = csv.reader(fh)
+                self.meta_header, day_strs = split_header(next(reader))
+                self.calendar = self.__parse_csv_data_header_for_dates(day_strs)
+                self.__parse_csv_data(reader)
+        except FileNotFoundError:
+            raise NotADirectoryError(
+                f"File {self.fname} not found. Make sure the 'COVID-19' directory is in the same root directory as the 'covid19_analysis' directory"
+            )
+
+    def _meta_positions(self) -> dict:
+        """Maps the attributes of the meta columns to their position in a row"""
+        positions = {}
+        for ix, name in enumerate(self.meta_header):
+            positions.setdefault(META_COLUMNS.get(name), ix)
+        positions.pop(None, None)
+        if "countries" not in positions:
+            raise ValueError(f"Unknown layout of {self.fname}, no Country/Region column")
+        return positions
+
+    @profiled
+    def __parse_csv_data(self, rows):
+        n_days = len(self.calendar)
+        n_meta = len(self.meta_header)
+        n_cols = n_days + n_meta
+        positions = self._meta_positions()
+        ix_country = positions["countries"]
+        data = np.empty((ROW_BLOCK_SIZE, n_days))
+        texts = {name: [] for name in self.TEXT_COLUMNS if name in positions}
+        numbers = {name: [] for name in self.NUMBER_COLUMNS if name in positions}
+        row_crc = []
+        wanted = set(self.country_filter) if self.country_filter is not None else None
+        found = set()
+        for n_strs in rows:
+            if len(n_strs) != n_cols:
+                logger.debug(f"Skipping malformed row in {self.fname}: {n_strs[:2]}")
+                continue
+            country = n_strs[ix_country].strip()
+            if wanted is not None:
+                if country not in wanted:
+                    # rows of a country are consecutive in the CSSE files
+                    if found == wanted:
+                        break
+                    continue
+                found.add(country)
+            ix = len(row_crc)
+            if ix == len(data):
+                data = np.concatenate([data, np.empty_like(data)])
+            try:
+                data[ix] = n_strs[n_meta:]
+            except ValueError:
+                data[ix] = [self._to_float(n_str) for n_str in n_strs[n_meta:]]
+            for name, values in texts.items():
+                values.append(n_strs[positions[name]].strip())
+            for name, values in numbers.items():
+                values.append(self._to_float(n_strs[positions[name]]))
+            row_crc.append(_row_crc(n_strs))
+        n_rows = len(row_crc)
+        # columns missing in the file are empty strings / nan for every row
+        for name in self.TEXT_COLUMNS:
+            setattr(self, name, texts.get(name, [""] * n_rows))
+        for name in self.NUMBER_COLUMNS:
+            setattr(
+                self, name, np.array(numbers.get(name, [np.nan] * n_rows), dtype=float)
+            )
+        self.row_crc = np.array(row_crc, dtype=np.uint32)
+        self.data = data[: len(row_crc)].copy()
+        count("covid_store.rows_parsed", len(row_crc))
+        self.data.flags.writeable = False
+
+    @profiled
+    def __append_new_columns(self) -> bool:
+        """Parses only the date columns not yet contained in self.data. Returns False if
+        the header or any row differs from the stored state in the already known columns."""
+        fingerprint = covid_cache.file_fingerprint(self.fname)
+        with open_csv(self.fname) as fh:
+            reader = csv.reader(fh)
+            meta_header, day_strs = split_header(next(reader))
+            if meta_header != self.meta_header:
+                return False
+            calendar = self.__parse_csv_data_header_for_dates(day_strs)
+            if not calendar.starts_with(self.calendar):
+                return False
+            n_old_cols = len(self.calendar) + len(meta_header)
+            n_cols = len(calendar) + len(meta_header)
+            new_rows = []
+            row_crc = []
+            for n_strs in reader:
+                if len(n_strs) != n_cols:
+                    continue
+                ix = len(new_rows)
+                if ix >= len(self.row_crc):
+                    return False
+                if _row_crc(n_strs[:n_old_cols]) != self.row_crc[ix]:
+                    return False
+                new_rows.append(n_strs[n_old_cols:])
+                row_crc.append(_row_crc(n_strs))
+        if len(new_rows) != len(self.row_crc):
+            return False
+        new_data = np.empty((len(new_rows), n_cols - n_old_cols))
+        for ix, n_strs in enumerate(new_rows):
+            try:
+                new_data[ix] = n_strs
+            except ValueError:
+                new_data[ix] = [self._to_float(n_str) for n_str in n_strs]
+        self.data = np.hstack([self.data, new_data])
+        self.data.flags.writeable = False
+        self.calendar = calendar
+        self.row_crc = np.array(row_crc, dtype=np.uint32)
+        self.fingerprint = fingerprint
+        return True
+
+    @profiled
+    def _build_row_index(self):
+        self.row_index = {}
+        self.province_index = {}
+        for ix, (province, country) in enumerate(zip(self.provinces, self.countries)):
+            self.province_index.setdefault((country, province), ix)
+            if province == "" and country not in self.row_index:
+                self.row_index[country] = ix
+        self._build_groups(self.countries)
+
+    def _build_groups(self, keys):
+        """Groups the rows by keys (one per row) for the segment sums of get_aggregated"""
+        # rows sorted by key, group g covers _group_order[_group_bounds[g]:_group_bounds[g+1]]
+        keys = np.array(keys, dtype=object)
+        self._group_order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self._group_order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        if len(sorted_keys) == 0:
+            starts = np.zeros(0, dtype=int)
+        self._group_bounds = np.r_[starts, len(sorted_keys)]
+        self.group_names = list(sorted_keys[starts])
+        self.group_index = {name: g for g, name in enumerate(self.group_names)}
+        self._aggregated = None
+
+    @property
+    def days(self):
+        return self.calendar.days
+
+    @staticmethod
+    @profiled
+    def __parse_csv_data_header_for_dates(day_strs):
+        return CCalendar(
+            [dt.strptime(day_str.strip(), "%m/%d/%y") for day_str in day_strs]
+        )
+
+    @staticmethod
+    def _to_float(n_str: str) -> float:
+        try:
+            return float(n_str)
+        except ValueError:
+            return np.nan
+
+
+class CDataStore:
+    """
+    Class holding the parsed CSSE data files of one set of file names.
+    Every file is parsed at most once, on first access.
+    ...
+    Attributes
+    ----------
+    fname : namedTuple fnames
+        containing the file URLs to the data files
+    tables : dict
+        maps the field names of fname to the parsed CDataTable objects
+    use_cache : boolean
+        files are loaded from / stored to the binary cache (see covid_cache)
+    country_filter : list of str
+        countries the store is restricted to, None for all
+
+    Methods
+    -------
+    get_table(self, field:str)
+        returns the parsed table of a field, parses the file on first access
+    get_country_data(self, country:str, field:str, province:str=None, aggregate:bool=None)
+        returns the time series of a country for a field as a read-only view
+    get_province_list(self, country:str)
+        returns the provinces/states a country is split into
+    update(self)
+        brings all loaded tables up to date with their files
+    snapshot(self)
+        returns a store holding the current tables, unaffected by later updates
+    """
+
+    # class of the parsed tables and of the file names
+    table_class = CDataTable
+    fnames_class = CFnames
+
+    def __init__(
+        self, fname: CFnames = None, use_cache: bool = True, country_filter=None
+    ):
+        """
+        Parameter
+        ---------
+        fname : namedTuple fnames, optional
+            file names of the CSSE data files (default is CFnames())
+        use_cache : boolean, optional
+            controls if the binary cache next to the files is used (default is True)
+        country_filter : list of str, optional
+            restrict the store to these countries, files are only read up to their rows,
+            useful for one-off queries without cache (default is None)
+        """
+        self.fname = fname if fname is not None else CFnames()
+        self.use_cache = use_cache
+        self.country_filter = country_filter
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    @property
+    def calendar(self):
+        """dates of the data columns, taken from the confirmed cases file"""
+        return self.get_table("confirmed").calendar
+
+    @property
+    def days(self):
+        """dates of the data columns as tuple of datetime objects"""
+        return self.get_table("confirmed").days
+
+    @property
+    def country_list(self):
+        """names of all countries in the confirmed cases file, including the ones only
+        split into provinces"""
+        return list(self.get_table("confirmed").group_names)
+
+    def get_table(self, field: str) -> CDataTable:
+        """Returns the parsed table of a field, parses the file on first access
+
+        Parameters
+        ----------
+        field : str
+            one of the fields of CFnames ('confirmed', 'recovered', 'deaths')
+        """
+        if field not in self.tables:
+            with self._lock:
+                if field not in self.tables:
+                    logger.debug(f"Loading {getattr(self.fname, field)}")
+                    self.tables[field] = self.table_class(
+                        getattr(self.fname, field),
+                        use_cache=self.use_cache,
+                        country_filter=self.country_filter,
+                    )
+        return self.tables[field]
+
+    def update(self) -> list:
+        """Brings all loaded tables up to date with their files, e.g. after running
+        pull_csse_data.sh. Only newly appended date columns are parsed. The updated
+        tables are built aside and replace the previous ones at once, tables and data
+        arrays taken from the store before keep their previous content. Use snapshot()
+        to read all fields of one version while updates happen.
+
+        Returns
+        -------
+        fields : list of str
+            fields whose data changed
+        """
+        with self._lock:
+            tables = dict(self.tables)
+            changed = []
+            for field, table in self.tables.items():
+                new_table = table.updated()
+                if new_table is not None:
+                    tables[field] = new_table
+                    changed.append(field)
+            if changed:
+                self.tables = tables
+            return changed
+
+    def snapshot(self):
+        """Returns a store holding the current tables of all fields. Later updates of
+        this store do not change it, e.g. for serving queries during a reload.
+
+        Returns
+        -------
+        store : CDataStore object of the same class
+        """
+        for field in self.fname._fields:
+            self.get_table(field)
+        store = copy.copy(self)
+        with self._lock:
+            store.tables = dict(self.tables)
+        store._lock = threading.Lock()
+        return store
+
+    def __getstate__(self):
+        # the namedtuple classes of the file names can not be pickled, e.g. to send a
+        # snapshot to a render process, they are restored from the mapping
+        state = self.__dict__.copy()
+        state["fname"] = self.fname._asdict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fname = self.fnames_class(**state["fname"])
+        self._lock = threading.Lock()
+
+    def get_country_data(
+        self, country: str, field: str, province: str = None, aggregate: bool = None
+    ):
+        """Returns the time series of a country for a field as a read-only view
+
+        Parameters
+        ----------
+        country : str
+            name of the country
+        field : str
+            one of the fields of CFnames ('confirmed', 'recovered', 'deaths')
+        province : str, optional
+            name of a province/state to take the data from (default is None)
+        aggregate : boolean, optional
+            see CDataTable.get_row (default is None)
+        """
+        return self.get_table(field).get_row(
+            country, province=province, aggregate=aggregate
+        )
+
+    def get_country_location(self, country: str, province: str = None):
+        """Returns (latitude, longitude) of a country, (None, None) if not available"""
+        return self.get_table("confirmed").get_location(country, province=province)
+
+    def get_province_list(self, country: str):
+        """Returns the names of the provinces/states a country is split into"""
+        return self.get_table("confirmed").get_province_list(country)
+
+
+class CUSDataTable(CDataTable):
+    """
+    Parsed content of a CSSE US time series file, one row per county (Admin2), plus
+    rows of territories, cruise ships and cases not assigned to a county. The counties
+    are rolled up to states and the nation by segment sums over the rows sorted by
+    state, all states at once.
+
+    Data is addressed by name on three levels, see US_LEVELS:
+    nation : 'US'
+    state : the Province_State, e.g. 'New York', territories like 'Guam' are states
+    county : 'Admin2, Province_State', e.g. 'Kings, New York', unique in contrast to
+        the county names alone
+    Alternatively a county is given as province of its state, a state as province of
+    the nation.
+    ...
+    Attributes
+    ----------
+    names : list of str
+        name of every row, 'Admin2, Province_State' or Province_State for rows without
+        county
+    fips_index : dict
+        maps the FIPS code (int) to the row
+    group_names : list of str
+        sorted names of all states
+    group_index : dict
+        maps the state name to its row in the aggregated matrix
+    nation_names : list of str
+        names of the nations (Country_Region), only 'US'
+    see CDataTable for the others
+
+    Methods
+    -------
+    level_of(self, country:str, province:str=None)
+        returns the level and row of a name
+    get_row(self, country:str, province:str=None, aggregate:bool=None)
+        returns the time series of the nation, a state or a county
+    get_aggregated(self)
+        returns the matrix of all states
+    get_nation(self)
+        returns the time series of the nation
+    get_population(self, country:str, province:str=None)
+        returns the population of the nation, a state or a county
+    get_location_list(self, level:str='state')
+        returns the names of all nations, states or counties
+    """
+
+    def level_of(self, country: str, province: str = None):
+        """Returns (level, index) of a name, index is the row of a county and the group
+        of a state. Unknown names return (None, None).
+
+        Parameters
+        ----------
+        country : str
+            name of the nation, a state or a county
+        province : str, optional
+            state of the nation or county of the state given as country (default is None)
+        """
+        if province is not None:
+            if country in self.nation_names:
+                return self.level_of(province)
+            return self.level_of(f"{province}, {country}")
+        if country in self.nation_names:
+            return ("nation", None)
+        if country in self.group_index:
+            return ("state", self.group_index[country])
+        if country in self.row_index:
+            return ("county", self.row_index[country])
+        return (None, None)
+
+    def get_row(self, country: str, province: str = None, aggregate: bool = None):
+        """Returns the time series of the nation, a state or a county, see level_of.
+        States and the nation are always the sum of their rows, aggregate is ignored.
+
+        Returns
+        -------
+        row : numpy array of floats, empty if the name is not available
+        """
+        level, ix = self.level_of(country, province)
+        if level == "nation":
+            return self.get_nation()
+        if level == "state":
+            return self.get_aggregated()[ix]
+        if level == "county":
+            return self.data[ix]
+        return np.zeros(0)
+
+    def get_nation(self):
+        """Returns the sum of all rows, the time series of the nation"""
+        if self._nation is None:
+            self._nation = self.get_aggregated().sum(axis=0)
+            self._nation.flags.writeable = False
+        return self._nation
+
+    def get_location(self, country: str, province: str = None):
+        """Returns (latitude, longitude) of the nation, a state or a county, (None, None)
+        if not available. States and the nation get the mean of their counties, rows
+        without location (unassigned cases at 0, 0) are left out."""
+        ixs = self.__rows_of(country, province)
+        if ixs is None:
+            return (None, None)
+        latitude = self.latitude[ixs]
+        longitude = self.longitude[ixs]
+        located = np.isfinite(latitude) & ((latitude != 0) | (longitude != 0))
+        if not located.any():
+            return (None, None)
+        return (
+            float(np.mean(latitude[located])),
+            float(np.mean(longitude[located])),
+        )
+
+    def get_population(self, country: str, province: str = None) -> float:
+        """Returns the population of the nation, a state or a county, nan if not
+        available (the population is only part of the deaths file, cruise ships and
+        unassigned cases have none)"""
+        level, ix = self.level_of(country, province)
+        population = np.nan
+        if level == "nation":
+            population = np.nansum(self.population)
+        elif level == "state":
+            if self._state_population is None:
+                self._state_population = self._group_sums(
+                    np.nan_to_num(self.population)
+                )
+            population = self._state_population[ix]
+        elif level == "county":
+            population = self.population[ix]
+        return float(population) if population > 0 else np.nan
+
+    def get_province_list(self, country: str):
+        """Returns the states of the nation or the counties of a state"""
+        level, g = self.level_of(country)
+        if level == "nation":
+            return list(self.group_names)
+        if level != "state":
+            return []
+        rows = self._group_order[self._group_bounds[g] : self._group_bounds[g + 1]]
+        return [self.counties[ix] for ix in rows if self.counties[ix]]
+
+    def get_location_list(self, level: str = "state"):
+        """Returns the names of all nations, states or counties
+
+        Parameters
+        ----------
+        level : str, optional
+            one of US_LEVELS (default is 'state')
+        """
+        if level == "nation":
+            return list(self.nation_names)
+        if level == "state":
+            return list(self.group_names)
+        if level == "county":
+            return [name for name, county in zip(self.names, self.counties) if county]
+        raise ValueError(f"Unknown level {level}, use one of {US_LEVELS}")
+
+    def __rows_of(self, country: str, province: str = None):
+        level, ix = self.level_of(country, province)
+        if level == "nation":
+            return np.arange(len(self.names))
+        if level == "state":
+            return self._group_order[
+                self._group_bounds[ix] : self._group_bounds[ix + 1]
+            ]
+        if level == "county":
+            return np.array([ix])
+        return None
+
+    @profiled
+    def _build_row_index(self):
+        self.names = [
+            f"{county}, {state}" if county else state
+            for county, state in zip(self.counties, self.provinces)
+        ]
+        self.row_index = {}
+        for ix, name in enumerate(self.names):
+            self.row_index.setdefault(name, ix)
+        self.province_index = {}
+        self.fips_index = {
+            int(fips): ix for ix, fips in enumerate(self.fips) if np.isfinite(fips)
+        }
+        self.nation_names = sorted(set(self.countries))
+        self._build_groups(self.provinces)
+        self._nation = None
+        self._state_population = None
+
+
+class CUSDataStore(CDataStore):
+    """
+    Data store of the CSSE US files (see CUSFnames). All counties are parsed at once
+    into one county x day matrix per file, the doc-classes view into it at any level:
+    country is the nation 'US', a state or a county as 'Admin2, Province_State' (see
+    CUSDataTable). country_list holds the states. The US files hold no recovered cases,
+    they are zero.
+    ...
+    Attributes
+    ----------
+    see CDataStore
+
+    Methods
+    -------
+    get_location_list(self, level:str='state')
+        returns the names of all nations, states or counties
+    get_fips_name(self, fips:int)
+        returns the name of the county with a FIPS code
+    get_population(self, names)
+        returns the population of nations, states or counties as dict
+    see CDataStore for the others
+    """
+
+    table_class = CUSDataTable
+    fnames_class = CUSFnames
+
+    def __init__(
+        self, fname: CUSFnames = None, use_cache: bool = True, country_filter=None
+    ):
+        """
+        Parameter
+        ---------
+        fname : namedTuple us_fnames, optional
+            file names of the CSSE US data files (default is CUSFnames())
+        use_cache : boolean, optional
+            controls if the binary cache next to the files is used (default is True)
+        country_filter : list of str, optional
+            see CDataStore, filters by Country_Region (default is None)
+        """
+        super().__init__(
+            fname if fname is not None else CUSFnames(),
+            use_cache=use_cache,
+            country_filter=country_filter,
+        )
+
+    def get_country_data(
+        self, country: str, field: str, province: str = None, aggregate: bool = None
+    ):
+        """Returns the time series of the nation, a state or a county for a field as a
+        read-only view, see CDataStore.get_country_data"""
+        if field not in self.fname._fields:
+            n_days = len(self.get_country_data(country, "confirmed", province=province))
+            row = np.zeros(n_days)
+            row.flags.writeable = False
+            return row
+        return super().get_country_data(
+            country, field, province=province, aggregate=aggregate
+        )
+
+    def get_location_list(self, level: str = "state"):
+        """Returns the names of all nations, states or counties, see
+        CUSDataTable.get_location_list"""
+        return self.get_table("confirmed").get_location_list(level)
+
+    def get_fips_name(self, fips: int):
+        """Returns the name of the county with a FIPS code, None if unknown"""
+        table = self.get_table("confirmed")
+        ix = table.fips_index.get(int(fips))
+        return table.names[ix] if ix is not None else None
+
+    def get_population(self, names) -> dict:
+        """Returns the population of nations, states or counties as dict mapping the
+        names to it, e.g. for the incidence metric of a collection (see covid_metrics)
+
+        Parameters
+        ----------
+        names : list of str
+            names of the nations, states or counties
+        """
+        table = self.get_table("deaths")
+        return {name: table.get_population(name) for name in names}
+
+
+if __name__ == "__main__":
+    pass
@@ -3,12 +3,39 @@ View-Classes of the doc-view model based approach.
 """
 
 from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_calendar import CCalendar
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from datetime import datetime as dt
 from collections import namedtuple
 from logzero import logger
+from covid_animation import CTextSprites, get_frame_writer, write_blitted_frames
+from covid_profile import profiled
+
+# doc-class attributes plotted by the time series views, in plotting order
+TIME_SERIES_FIELDS = ("n_confirmed", "n_recovered", "n_deaths", "n_still_infected")
+
+
+def _rescale_and_redraw(ax: plt.axes):
+    """Rescales the data limits of an axes after its artists changed and schedules
+    a redraw of its figure"""
+    ax.relim()
+    ax.autoscale_view()
+    ax.figure.canvas.draw_idle()
+
+
+def _same_state(state: tuple, other: tuple) -> bool:
+    """Compares two plot states (key, sources): the keys by value, the source arrays by
+    identity. The state holds the arrays themselves, their ids could be reused by new
+    arrays once the old ones are freed."""
+    return (
+        state[0] == other[0]
+        and len(state[1]) == len(other[1])
+        and all(a is b for a, b in zip(state[1], other[1]))
+    )
 
 
 class CDataTimeSeriesView:
@@ -30,6 +57,16 @@ class CDataTimeSeriesView:
         plot_doubling_time_over_days(self, ax:plt.axes=None, show_plot:bool=True,...
                 from_date:dt=None, to_date:dt=None,average_interval_days:int=1)
             Plots the time interval needed to double the number of confirmed cases for the selected country
+
+        update_time_series(cv_data=None, from_date=None, to_date=None)
+            Updates the lines of the last plot_time_series call in place with the data of
+            the (new) time series and date window
+
+        update_doubling_time_over_days(cv_data=None, from_date=None, to_date=None)
+            Updates the bars of the last plot_doubling_time_over_days call in place
+
+        animate_time_series(fname, from_date=None, to_date=None, fps=10, dpi=100)
+            Writes the time series growing day by day as GIF or MP4 animation
     )
 
     """
@@ -42,7 +79,10 @@ class CDataTimeSeriesView:
             Time series to plot data from (default is None)
         """
         self.cv_data = cv_data
+        # artist handles of the last plot of every kind, reused by the update methods
+        self._artists = {}
 
+    @profiled
     def plot_time_series(
         self,
         ax: plt.axes = None,
@@ -85,25 +125,25 @@ class CDataTimeSeriesView:
         ixs, ixe = self.cv_data._get_time_range_indices(
             start_date=from_date, end_date=to_date
         )
-        ax.plot(
+        (line_confirmed,) = ax.plot(
             self.cv_data.days[ixs:ixe],
             self.cv_data.n_confirmed[ixs:ixe],
             color="red",
             label="total confirmed",
         )
-        ax.plot(
+        (line_recovered,) = ax.plot(
             self.cv_data.days[ixs:ixe],
             self.cv_data.n_recovered[ixs:ixe],
             color="green",
             label="total recovered",
         )
-        ax.plot(
+        (line_deaths,) = ax.plot(
             self.cv_data.days[ixs:ixe],
             self.cv_data.n_deaths[ixs:ixe],
             color="black",
             label="total deaths",
         )
-        ax.plot(
+        (line_still_infected,) = ax.plot(
             self.cv_data.days[ixs:ixe],
             self.cv_data.n_still_infected[ixs:ixe],
             color="blue",
@@ -114,7 +154,7 @@ class CDataTimeSeriesView:
         if show_xlabel:
             ax.set_xlabel("Date")
         ax.set_ylabel("Number of cases")
-        ax.text(
+        title = ax.text(
             0.5,
             0.9,
             self.cv_data.country,
@@ -128,13 +168,20 @@ class CDataTimeSeriesView:
         if use_scientific_notation:
             ax.ticklabel_format(style="scientific", axis="y", scilimits=(0, 3))
         self._nicely_format_date_ticks(ax)
-        plt.legend()
+        ax.legend()
+        self._artists["time_series"] = {
+            "ax": ax,
+            "lines": [line_confirmed, line_recovered, line_deaths, line_still_infected],
+            "title": title,
+            "state": self._plot_state(ixs, ixe, TIME_SERIES_FIELDS),
+        }
         if show_plot:
             plt.show()
         if "fh" in locals():
             return fh
-        return plt.gcf()
+        return ax.figure
 
+    @profiled
     def plot_doubling_time_over_days(
         self,
         ax: plt.axes = None,
@@ -170,7 +217,7 @@ class CDataTimeSeriesView:
         ixs, ixe = self.cv_data._get_time_range_indices(
             start_date=from_date, end_date=to_date
         )
-        ax.bar(
+        bars = ax.bar(
             self.cv_data.days[ixs:ixe],
             self.cv_data._calc_doubling_time_over_interval(
                 start_date=from_date, end_date=to_date
@@ -181,7 +228,7 @@ class CDataTimeSeriesView:
         ax.grid(True)
         ax.set_xlabel("Date")
         ax.set_ylabel("Doubling time (days)")
-        ax.text(
+        title = ax.text(
             0.5,
             0.9,
             self.cv_data.country,
@@ -193,13 +240,200 @@ class CDataTimeSeriesView:
             bbox=dict(facecolor="white", alpha=1.0, edgecolor="None"),
         )
         self._nicely_format_date_ticks(ax)
-        plt.legend()
+        ax.legend()
+        self._artists["doubling_time"] = {
+            "ax": ax,
+            "bars": bars,
+            "title": title,
+            "state": self._plot_state(ixs, ixe, ("n_confirmed",)),
+        }
 
         if show_plot:
             plt.show()
         if "fh" in locals():
             return fh
-        return plt.gcf()
+        return ax.figure
+
+    @profiled
+    def update_time_series(
+        self, cv_data: CDataTimeSeries = None, from_date: dt = None, to_date: dt = None
+    ) -> bool:
+        """Updates the lines of the last plot_time_series call in place. Nothing is
+        redrawn if neither the time series nor the date window changed.
+
+        Parameters
+        ----------
+        cv_data : CDataTimeSeries, optional
+            new time series to show, replaces self.cv_data (default is None, keep the
+            current one)
+        from_date : datetime object, optional
+            controls the start date for plotting (default is None)
+        to_date : datetime object, optional
+            controls the end date for plotting (default is None)
+        Returns
+        -------
+        changed : boolean, True if the plot was updated
+        """
+        artists = self._artists.get("time_series")
+        if artists is None:
+            logger.warning("No time series plot to update, call plot_time_series first")
+            return False
+        if cv_data is not None:
+            self.cv_data = cv_data
+        ixs, ixe = self.cv_data._get_time_range_indices(
+            start_date=from_date, end_date=to_date
+        )
+        state = self._plot_state(ixs, ixe, TIME_SERIES_FIELDS)
+        if _same_state(state, artists["state"]):
+            return False
+        days = self.cv_data.days[ixs:ixe]
+        for line, field in zip(artists["lines"], TIME_SERIES_FIELDS):
+            line.set_data(days, getattr(self.cv_data, field)[ixs:ixe])
+        artists["title"].set_text(self.cv_data.country)
+        artists["state"] = state
+        _rescale_and_redraw(artists["ax"])
+        return True
+
+    @profiled
+    def update_doubling_time_over_days(
+        self, cv_data: CDataTimeSeries = None, from_date: dt = None, to_date: dt = None
+    ) -> bool:
+        """Updates the bars of the last plot_doubling_time_over_days call in place. The
+        bars are only recreated if the number of days in the window changed.
+
+        Parameters
+        ----------
+        cv_data : CDataTimeSeries, optional
+            new time series to show, replaces self.cv_data (default is None, keep the
+            current one)
+        from_date : datetime object, optional
+            controls the start date for plotting (default is None)
+        to_date : datetime object, optional
+            controls the end date for plotting (default is None)
+        Returns
+        -------
+        changed : boolean, True if the plot was updated
+        """
+        artists = self._artists.get("doubling_time")
+        if artists is None:
+            logger.warning(
+                "No doubling time plot to update, call plot_doubling_time_over_days first"
+            )
+            return False
+        if cv_data is not None:
+            self.cv_data = cv_data
+        ixs, ixe = self.cv_data._get_time_range_indices(
+            start_date=from_date, end_date=to_date
+        )
+        state = self._plot_state(ixs, ixe, ("n_confirmed",))
+        if _same_state(state, artists["state"]):
+            return False
+        days = self.cv_data.days[ixs:ixe]
+        doubling_times = self.cv_data._calc_doubling_time_over_interval(
+            start_date=from_date, end_date=to_date
+        )
+        bars = artists["bars"]
+        if len(bars) == len(days):
+            for patch, x, height in zip(bars, mdates.date2num(days), doubling_times):
+                patch.set_x(x - patch.get_width() / 2)
+                patch.set_height(height)
+        else:
+            bars.remove()
+            artists["bars"] = artists["ax"].bar(
+                days, doubling_times, label="doubling time"
+            )
+        artists["title"].set_text(self.cv_data.country)
+        artists["state"] = state
+        _rescale_and_redraw(artists["ax"])
+        return True
+
+    @profiled
+    def animate_time_series(
+        self,
+        fname: str,
+        from_date: dt = None,
+        to_date: dt = None,
+        fps: float = 10,
+        dpi: float = 100,
+        use_scientific_notation: bool = False,
+    ) -> bool:
+        """Writes an animation of the time series growing day by day, one frame per day.
+        The figure is set up once with the axes limits of the whole time range, every
+        frame only redraws the lines and the date.
+
+        Parameters
+        ----------
+        fname : str
+            URL of the animation file, *.gif or *.mp4 (needs ffmpeg)
+        from_date : datetime object, optional
+            controls the start date of the animation (default is None)
+        to_date : datetime object, optional
+            controls the end date of the animation (default is None)
+        fps : float, optional
+            frames (days) per second (default is 10)
+        dpi : float, optional
+            resolution of the frames (default is 100)
+        use_scientific_notation : boolean, optional
+            controls if the y-axis is plotted in scientific notatiom 1e... (default is False)
+        Returns
+        -------
+        success : boolean, False if no animation was written
+        """
+        if self.cv_data == None:
+            logger.warning(
+                "No data available, initialize self.cv_data with CDataTimeSeries object"
+            )
+            return False
+        writer = get_frame_writer(fname, fps)
+        if writer is None:
+            return False
+        fig = Figure(figsize=[10, 8], dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        self.plot_time_series(
+            ax=ax,
+            use_scientific_notation=use_scientific_notation,
+            from_date=from_date,
+            to_date=to_date,
+        )
+        lines = self._artists["time_series"]["lines"]
+        ixs, ixe = self.cv_data._get_time_range_indices(
+            start_date=from_date, end_date=to_date
+        )
+        days = self.cv_data.days[ixs:ixe]
+        x = mdates.date2num(days)
+        series = [
+            np.ravel(getattr(self.cv_data, field))[ixs:ixe] for field in TIME_SERIES_FIELDS
+        ]
+        date_text = ax.text(
+            0.5,
+            0.83,
+            "",
+            horizontalalignment="center",
+            verticalalignment="center",
+            transform=ax.transAxes,
+            fontsize=10,
+        )
+
+        def update_frame(ix):
+            for line, y in zip(lines, series):
+                line.set_data(x[: ix + 1], y[: ix + 1])
+            date_text.set_text(days[ix].strftime("%d-%b-%Y"))
+
+        if not write_blitted_frames(
+            fig, lines + [date_text], update_frame, len(days), writer
+        ):
+            return False
+        logger.info(f"Wrote {len(days)} frames to {fname}")
+        return True
+
+    def _plot_state(self, ixs: int, ixe: int, fields) -> tuple:
+        """Identifies what a plot shows: the date window and the arrays it was taken
+        from. Reloaded or replaced data arrays change the state (see _same_state)."""
+        return (
+            (ixs, ixe, self.cv_data.country),
+            (self.cv_data.days,) + tuple(getattr(self.cv_data, field) for field in fields),
+        )
 
     @staticmethod
     def _nicely_format_date_ticks(ax: plt.axes):
@@ -221,7 +455,7 @@ class CDataTimeSeriesView:
         ax.format_xdata = mdates.DateFormatter("%Y-%m-%d")
         # rotates and right aligns the x labels, and moves the bottom of the
         # axes up to make room for them
-        plt.gcf().autofmt_xdate()
+        ax.figure.autofmt_xdate()
 
 
 class CDataTimeSeriesCollectionView:
@@ -236,6 +470,15 @@ class CDataTimeSeriesCollectionView:
     -------
     plot_collection_subplots(from_date=None, to_date=None)
         Plots the time series data for a set of selected countries.
+
+    update_collection_subplots(from_date=None, to_date=None)
+        Updates the subplots of the last plot_collection_subplots call in place
+
+    update_country_comparison(country_name_1=None, country_name_2=None, from_date=None, to_date=None)
+        Updates the lines of the last plot_country_comparison call in place
+
+    animate_doubling_time_race(fname, from_date=None, to_date=None, ...)
+        Writes the ranking of the doubling times over all days as bar chart race
     """
 
     def __init__(self, cv_data_collection: CDataTimeSeriesCollection = None):
@@ -246,7 +489,10 @@ class CDataTimeSeriesCollectionView:
             Time series to plot data from (default is None)
         """
         self.cv_data_collection = cv_data_collection
+        # artist handles of the last plot of every kind, reused by the update methods
+        self._artists = {}
 
+    @profiled
     def plot_collection_subplots(
         self, from_date: dt = None, to_date: dt = None, show_plot: bool = True
     ) -> plt.figure:
@@ -268,24 +514,29 @@ class CDataTimeSeriesCollectionView:
                 "No collection available, initialize self.cv_data_collection with CDataTimeSeriesCollection object"
             )
             return
-        if len(self.cv_data_collection.country_list) < 2:
-            subplot_str = "11"
-        elif len(self.cv_data_collection.country_list) < 3:
-            subplot_str = "21"
-        elif len(self.cv_data_collection.country_list) < 5:
-            subplot_str = "22"
-        elif len(self.cv_data_collection.country_list) < 7:
-            subplot_str = "32"
-        elif len(self.cv_data_collection.country_list) < 10:
-            subplot_str = "33"
+        n_plots = len(self.cv_data_collection.country_list)
+        if n_plots < 2:
+            subplot_grid = (1, 1)
+        elif n_plots < 3:
+            subplot_grid = (2, 1)
+        elif n_plots < 5:
+            subplot_grid = (2, 2)
+        elif n_plots < 7:
+            subplot_grid = (3, 2)
+        elif n_plots < 10:
+            subplot_grid = (3, 3)
+        else:
+            n_cols = int(np.ceil(np.sqrt(n_plots)))
+            subplot_grid = (int(np.ceil(n_plots / n_cols)), n_cols)
         fh = plt.figure(figsize=(15, 8))
+        subplot_views = []
         for ix, data in enumerate(self.cv_data_collection.data_collection):
-            # if ix>int(subplot_str[0])*(int(subplot_str[1])-1):
+            # if ix>subplot_grid[0]*(subplot_grid[1]-1):
             #     show_x_label=True
             # else:
             #     show_x_label=False
             show_x_label = True
-            ax = fh.add_subplot(subplot_str + str(ix + 1))
+            ax = fh.add_subplot(*subplot_grid, ix + 1)
             data_view = CDataTimeSeriesView(cv_data=data)
             data_view.plot_time_series(
                 ax=ax,
@@ -295,10 +546,39 @@ class CDataTimeSeriesCollectionView:
                 from_date=from_date,
                 to_date=to_date,
             )
+            subplot_views.append(data_view)
+        self._artists["subplots"] = subplot_views
         if show_plot:
             plt.show()
         return fh
 
+    @profiled
+    def update_collection_subplots(self, from_date: dt = None, to_date: dt = None) -> bool:
+        """Updates the subplots of the last plot_collection_subplots call in place to a
+        new date window or reloaded data, unchanged subplots are left alone.
+
+        Parameters
+        ----------
+        from_date : datetime object, optional
+            controls the start date for plotting (default is None)
+        to_date : datetime object, optional
+            controls the end date for plotting (default is None)
+        Returns
+        -------
+        changed : boolean, True if any subplot was updated
+        """
+        subplot_views = self._artists.get("subplots")
+        if subplot_views is None:
+            logger.warning(
+                "No subplots to update, call plot_collection_subplots first"
+            )
+            return False
+        changed = False
+        for data_view in subplot_views:
+            changed |= data_view.update_time_series(from_date=from_date, to_date=to_date)
+        return changed
+
+    @profiled
     def plot_country_comparison(
         self,
         country_name_1: str,
@@ -345,56 +625,56 @@ class CDataTimeSeriesCollectionView:
 
         ixs1, ixe1 = ds1._get_time_range_indices(start_date=from_date, end_date=to_date)
         ixs2, ixe2 = ds2._get_time_range_indices(start_date=from_date, end_date=to_date)
-        ax.plot(
+        (line_confirmed_1,) = ax.plot(
             ds1.days[ixs1:ixe1],
             ds1.n_confirmed[ixs1:ixe1],
             color="red",
             linewidth=2,
             label=ds1.country + " confirmed",
         )
-        ax.plot(
+        (line_confirmed_2,) = ax.plot(
             ds2.days[ixs2:ixe2],
             ds2.n_confirmed[ixs2:ixe2],
             color="darkred",
             linestyle="-.",
             label=ds2.country + " confirmed",
         )
-        ax.plot(
+        (line_recovered_1,) = ax.plot(
             ds1.days[ixs1:ixe1],
             ds1.n_recovered[ixs1:ixe1],
             color="green",
             linewidth=2,
             label=ds1.country + " recovered",
         )
-        ax.plot(
+        (line_recovered_2,) = ax.plot(
             ds2.days[ixs2:ixe2],
             ds2.n_recovered[ixs2:ixe2],
             color="darkgreen",
             linestyle="-.",
             label=ds2.country + " recovered",
         )
-        ax.plot(
+        (line_deaths_1,) = ax.plot(
             ds1.days[ixs1:ixe1],
             ds1.n_deaths[ixs1:ixe1],
             color="darkgrey",
             linewidth=2,
             label=ds1.country + " deaths",
         )
-        ax.plot(
+        (line_deaths_2,) = ax.plot(
             ds2.days[ixs2:ixe2],
             ds2.n_deaths[ixs2:ixe2],
             color="black",
             linestyle="-.",
             label=ds2.country + " deaths",
         )
-        ax.plot(
+        (line_still_infected_1,) = ax.plot(
             ds1.days[ixs1:ixe1],
             ds1.n_still_infected[ixs1:ixe1],
             color="blue",
             linewidth=2,
             label=ds1.country + " still infected",
         )
-        ax.plot(
+        (line_still_infected_2,) = ax.plot(
             ds2.days[ixs2:ixe2],
             ds2.n_still_infected[ixs2:ixe2],
             color="darkblue",
@@ -405,8 +685,8 @@ class CDataTimeSeriesCollectionView:
         ax.grid(True)
         ax.set_xlabel("Date")
         ax.set_ylabel("Cases")
-        plt.legend()
-        ax.text(
+        ax.legend()
+        title = ax.text(
             0.6,
             0.9,
             ds1.country + " vs. " + ds2.country,
@@ -418,13 +698,104 @@ class CDataTimeSeriesCollectionView:
             bbox=dict(facecolor="white", alpha=1.0, edgecolor="None"),
         )
         CDataTimeSeriesView._nicely_format_date_ticks(ax)
+        self._artists["comparison"] = {
+            "ax": ax,
+            "lines": [
+                [line_confirmed_1, line_recovered_1, line_deaths_1, line_still_infected_1],
+                [line_confirmed_2, line_recovered_2, line_deaths_2, line_still_infected_2],
+            ],
+            "title": title,
+            "state": self._comparison_state(ds1, ds2, ixs1, ixe1, ixs2, ixe2),
+        }
 
         if show_plot:
             plt.show()
         if "fh" in locals():
             return fh
-        return plt.gcf()
+        return ax.figure
+
+    @profiled
+    def update_country_comparison(
+        self,
+        country_name_1: str = None,
+        country_name_2: str = None,
+        from_date: dt = None,
+        to_date: dt = None,
+    ) -> bool:
+        """Updates the lines of the last plot_country_comparison call in place. Nothing
+        is redrawn if neither the countries, their data nor the date window changed.
+
+        Parameters
+        ----------
+        country_name_1 : str, optional
+            Name of the first country selected for compare (default is None, keep the
+            current one)
+        country_name_2 : str, optional
+            Name of the second country selected for compare (default is None, keep the
+            current one)
+        from_date : datetime object, optional
+            controls the start date for plotting (default is None)
+        to_date : datetime object, optional
+            controls the end date for plotting (default is None)
+        Returns
+        -------
+        changed : boolean, True if the plot was updated
+        """
+        artists = self._artists.get("comparison")
+        if artists is None:
+            logger.warning(
+                "No comparison plot to update, call plot_country_comparison first"
+            )
+            return False
+        names = artists["state"][0][0]
+        ds1 = self.cv_data_collection._get_data_from_country_name(
+            country_name_1 or names[0]
+        )
+        ds2 = self.cv_data_collection._get_data_from_country_name(
+            country_name_2 or names[1]
+        )
+        if not ds1 or not ds2:
+            logger.info("Country does not exist")
+            return False
+        ixs1, ixe1 = ds1._get_time_range_indices(start_date=from_date, end_date=to_date)
+        ixs2, ixe2 = ds2._get_time_range_indices(start_date=from_date, end_date=to_date)
+        state = self._comparison_state(ds1, ds2, ixs1, ixe1, ixs2, ixe2)
+        if _same_state(state, artists["state"]):
+            return False
+        for ds, ixs, ixe, lines in (
+            (ds1, ixs1, ixe1, artists["lines"][0]),
+            (ds2, ixs2, ixe2, artists["lines"][1]),
+        ):
+            days = ds.days[ixs:ixe]
+            for line, field, label in zip(
+                lines,
+                TIME_SERIES_FIELDS,
+                (" confirmed", " recovered", " deaths", " still infected"),
+            ):
+                line.set_data(days, getattr(ds, field)[ixs:ixe])
+                line.set_label(ds.country + label)
+        ax = artists["ax"]
+        if state[0][0] != artists["state"][0][0]:
+            artists["title"].set_text(ds1.country + " vs. " + ds2.country)
+            ax.legend()
+        artists["state"] = state
+        _rescale_and_redraw(ax)
+        return True
 
+    @staticmethod
+    def _comparison_state(ds1, ds2, ixs1, ixe1, ixs2, ixe2) -> tuple:
+        """Identifies what a comparison plot shows: countries, date windows and the
+        arrays the lines were taken from"""
+        return (
+            ((ds1.country, ds2.country), (ixs1, ixe1, ixs2, ixe2)),
+            tuple(
+                getattr(ds, field)
+                for ds in (ds1, ds2)
+                for field in ("days",) + TIME_SERIES_FIELDS
+            ),
+        )
+
+    @profiled
     def plot_doubling_time_from_date_as_bar_chart(
         self,
         ax: plt.axes = None,
@@ -461,6 +832,7 @@ class CDataTimeSeriesCollectionView:
 
         if date == None:
             date = self.cv_data_collection.data_collection[0].days[-1]
+        date = CCalendar.to_datetime64(date).astype(object)
         ax.text(
             0.75,
             0.9,
@@ -477,7 +849,142 @@ class CDataTimeSeriesCollectionView:
             plt.show()
         if "fh" in locals():
             return fh
-        return plt.gcf()
+        return ax.figure
+
+    @profiled
+    def animate_doubling_time_race(
+        self,
+        fname: str,
+        from_date: dt = None,
+        to_date: dt = None,
+        average_interval_days: int = 1,
+        n_countries: int = 20,
+        max_doubling_time: float = None,
+        fps: float = 10,
+        dpi: float = 100,
+    ) -> bool:
+        """Writes the doubling times of all countries of the collection as bar chart
+        race, one frame per day with the countries sorted by their doubling time of the
+        day. The doubling times of all days are computed once up front, the frames only
+        move and resize the bars.
+
+        Parameters
+        ----------
+        fname : str
+            URL of the animation file, *.gif or *.mp4 (needs ffmpeg)
+        from_date : datetime object, optional
+            controls the start date of the animation (default is None)
+        to_date : datetime object, optional
+            controls the end date of the animation (default is None)
+        average_interval_days : int, optional
+            sets the number of days to look back into past from given date. Returned value
+            is the average value over the selected time range (default is 1)
+        n_countries : int, optional
+            number of top ranked countries shown, None shows all countries, their names
+            get cut if the rows are lower than the font (default is 20)
+        max_doubling_time : float, optional
+            end of the doubling time axis, longer doubling times and days without new
+            cases are drawn as full bar (default is None, the 95th percentile)
+        fps : float, optional
+            frames (days) per second (default is 10)
+        dpi : float, optional
+            resolution of the frames (default is 100)
+        Returns
+        -------
+        success : boolean, False if no animation was written
+        """
+        if self.cv_data_collection == None or not self.cv_data_collection.data_collection:
+            logger.warning(
+                "No collection available, initialize self.cv_data_collection with CDataTimeSeriesCollection object"
+            )
+            return False
+        writer = get_frame_writer(fname, fps)
+        if writer is None:
+            return False
+        ref = self.cv_data_collection.data_collection[0]
+        ixs, ixe = ref._get_time_range_indices(start_date=from_date, end_date=to_date)
+        days = ref.days[ixs:ixe]
+        if not days:
+            logger.warning("No frames to write")
+            writer.abort()
+            return False
+        doubling_times = self.cv_data_collection._calc_doubling_time_matrix(
+            average_interval_days=average_interval_days
+        )[:, ixs:ixe]
+        names = [ds.country for ds in self.cv_data_collection.data_collection]
+        n_show = min(n_countries or len(names), len(names))
+
+        # longest doubling time on top, shrinking case numbers below, missing data last
+        order = np.argsort(
+            -np.where(np.isnan(doubling_times), -np.inf, doubling_times),
+            axis=0,
+            kind="stable",
+        )
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(len(names))[:, np.newaxis], axis=0)
+        if max_doubling_time is None:
+            valid = doubling_times[np.isfinite(doubling_times) & (doubling_times > 0)]
+            max_doubling_time = float(np.percentile(valid, 95)) if len(valid) else 1.0
+        widths = np.clip(np.nan_to_num(doubling_times, nan=0.0), 0, max_doubling_time)
+
+        fig = Figure(figsize=(10, 7), dpi=dpi)
+        FigureCanvasAgg(fig)
+        fig.subplots_adjust(left=0.2)
+        ax = fig.add_subplot(111)
+        colors = [f"C{ix % 10}" for ix in range(len(names))]
+        bars = ax.barh(
+            ranks[:, 0], widths[:, 0], height=0.8, color=colors, edgecolor="black"
+        )
+        name_texts = [
+            ax.text(
+                -0.01,
+                0,
+                name,
+                horizontalalignment="right",
+                verticalalignment="center",
+                transform=ax.get_yaxis_transform(),
+            )
+            for name in names
+        ]
+        ax.set_xlim(0, max_doubling_time * 1.05)
+        ax.set_ylim(n_show - 0.5, -0.5)
+        ax.set_yticks([])
+        ax.set_xlabel("Doubling time (days)")
+        ax.grid(True, axis="x")
+        date_text = ax.text(
+            0.75,
+            0.1,
+            "",
+            horizontalalignment="center",
+            verticalalignment="center",
+            transform=ax.transAxes,
+            fontsize=12,
+            fontweight="bold",
+            bbox=dict(facecolor="white", alpha=1.0, edgecolor="None"),
+        )
+
+        # the names are rendered once on top and moved to their rank as pixel sprites
+        y_pixels = ax.transData.transform(
+            np.c_[np.zeros(len(name_texts)), np.arange(len(name_texts))]
+        )[:, 1]
+        row_pitch = abs(y_pixels[1] - y_pixels[0]) if len(y_pixels) > 1 else None
+        names = CTextSprites(name_texts, max_height=row_pitch)
+
+        def update_frame(ix):
+            for bar, rank, width in zip(bars, ranks[:, ix], widths[:, ix]):
+                bar.set_y(rank - 0.4)
+                bar.set_width(width)
+            names.offsets = y_pixels[ranks[:, ix]] - y_pixels[0]
+            names.visible = ranks[:, ix] < n_show
+            date_text.set_text(days[ix].strftime("%d-%b-%Y"))
+
+        artists = list(bars) + [date_text]
+        if not write_blitted_frames(
+            fig, artists, update_frame, len(days), writer, sprites=names
+        ):
+            return False
+        logger.info(f"Wrote {len(days)} frames to {fname}")
+        return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+Fixtures of the tests, small CSSE shaped files written to a temporary directory.
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from covid_store import CFnames, CUSFnames, CDataStore, CUSDataStore  # noqa: E402
+
+GLOBAL_HEADER = ["Province/State", "Country/Region", "Lat", "Long"]
+# (province, country, lat, long) of the rows of the global files
+GLOBAL_ROWS = [
+    ("", "Germany", "51.0", "9.0"),
+    ("", "Italy", "43.0", "12.0"),
+    ("Ontario", "Canada", "51.2", "-85.3"),
+    ("Quebec", "Canada", "52.9", "-73.5"),
+    ("", "Korea, South", "36.0", "128.0"),
+]
+
+
+def day_strs(n_days: int):
+    """Header strings of n_days consecutive days starting at 2020-03-01"""
+    return [f"3/{day}/20" for day in range(1, 32)][:n_days] + [
+        f"4/{day}/20" for day in range(1, 31)
+    ][: max(n_days - 31, 0)]
+
+
+def confirmed_values(row: int, day: int) -> int:
+    """Synthetic growing number of cases of a row on a day, every row grows differently"""
+    return int((row + 1) * (day + 1) ** (1.5 + 0.25 * row))
+
+
+def write_csse_file(fname: str, n_days: int, scale: float = 1.0, rows=GLOBAL_ROWS):
+    """Writes a global CSSE time series file with n_days date columns, names holding a
+    comma are quoted like in the CSSE files"""
+    with open(fname, "wt", newline="") as fh:
+        fh.write(",".join(GLOBAL_HEADER + day_strs(n_days)) + "\n")
+        for ix, meta in enumerate(rows):
+            names = [f'"{m}"' if "," in m else m for m in meta]
+            values = [str(int(confirmed_values(ix, d) * scale)) for d in range(n_days)]
+            fh.write(",".join(names + values) + "\n")
+
+
+def write_global_files(directory, n_days: int) -> CFnames:
+    """Writes confirmed, recovered and deaths files and returns their names"""
+    fname = CFnames(
+        confirmed=os.path.join(directory, "confirmed.csv"),
+        recovered=os.path.join(directory, "recovered.csv"),
+        deaths=os.path.join(directory, "deaths.csv"),
+    )
+    write_csse_file(fname.confirmed, n_days)
+    write_csse_file(fname.recovered, n_days, scale=0.5)
+    write_csse_file(fname.deaths, n_days, scale=0.1)
+    return fname
+
+
+US_HEADER = [
+    "UID", "iso2", "iso3", "code3", "FIPS", "Admin2", "Province_State",
+    "Country_Region", "Lat", "Long_", "Combined_Key",
+]
+# (fips, county, state, lat, long, population) of the rows of the US files
+US_ROWS = [
+    ("1001", "Autauga", "Alabama", "32.5", "-86.6", "55869"),
+    ("1003", "Baldwin", "Alabama", "30.7", "-87.7", "223234"),
+    ("36047", "Kings", "New York", "40.6", "-73.9", "2559903"),
+    ("", "Unassigned", "New York", "0.0", "0.0", "0"),
+    ("66", "", "Guam", "13.4", "144.8", "168489"),
+]
+
+
+def write_us_file(fname: str, n_days: int, scale: float = 1.0, population=False):
+    """Writes a US CSSE time series file, the deaths file has the population column"""
+    header = US_HEADER + (["Population"] if population else [])
+    with open(fname, "wt", newline="") as fh:
+        fh.write(",".join(header + day_strs(n_days)) + "\n")
+        for ix, (fips, county, state, lat, lon, pop) in enumerate(US_ROWS):
+            key = ", ".join(name for name in (county, state, "US") if name)
+            meta = [str(84000000 + ix), "US", "USA", "840", fips, county, state, "US"]
+            meta += [lat, lon, f'"{key}"'] + ([pop] if population else [])
+            values = [str(int(confirmed_values(ix, d) * scale)) for d in range(n_days)]
+            fh.write(",".join(meta + values) + "\n")
+
+
+def write_us_files(directory, n_days: int) -> CUSFnames:
+    """Writes confirmed and deaths files of the US and returns their names"""
+    fname = CUSFnames(
+        confirmed=os.path.join(directory, "confirmed_US.csv"),
+        deaths=os.path.join(directory, "deaths_US.csv"),
+    )
+    write_us_file(fname.confirmed, n_days)
+    write_us_file(fname.deaths, n_days, scale=0.1, population=True)
+    return fname
+
+
+@pytest.fixture
+def global_files(tmp_path):
+    return write_global_files(str(tmp_path), 20)
+
+
+@pytest.fixture
+def store(global_files):
+    return CDataStore(global_files, use_cache=False)
+
+
+@pytest.fixture
+def us_store(tmp_path):
+    return CUSDataStore(write_us_files(str(tmp_path), 20), use_cache=False)
+
+
+def expected_row(row: int, n_days: int, scale: float = 1.0):
+    """Values of a row as written by write_csse_file and write_us_file"""
+    return np.array([int(confirmed_values(row, d) * scale) for d in range(n_days)])
+
+
+@pytest.fixture
+def default_stores(store, us_store, monkeypatch):
+    """Makes store and us_store the process wide stores of the default file names"""
+    import covid_store
+
+    monkeypatch.setitem(covid_store._data_stores, CFnames(), store)
+    monkeypatch.setitem(covid_store._data_stores, CUSFnames(), us_store)
+    return store, us_store
@@ -0,0 +1,41 @@
+import os
+import pytest
+from PIL import Image
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_view import CDataTimeSeriesView, CDataTimeSeriesCollectionView
+
+
+def n_frames_of(fname: str) -> int:
+    with Image.open(fname) as img:
+        return img.n_frames
+
+
+def test_time_series_animation_has_one_frame_per_day(store, tmp_path):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    view = CDataTimeSeriesView(ds)
+    fname = str(tmp_path / "germany.gif")
+    assert view.animate_time_series(fname, dpi=30)
+    assert n_frames_of(fname) == len(ds.days)
+    assert view.animate_time_series(
+        fname, from_date=ds.days[5], to_date=ds.days[12], dpi=30
+    )
+    assert n_frames_of(fname) == 7
+
+
+def test_doubling_time_race_has_one_frame_per_day(store, tmp_path):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    view = CDataTimeSeriesCollectionView(collection)
+    fname = str(tmp_path / "race.gif")
+    days = collection.data_collection[0].days
+    assert view.animate_doubling_time_race(
+        fname, from_date=days[2], n_countries=3, dpi=30
+    )
+    assert n_frames_of(fname) == len(days) - 2
+
+
+@pytest.mark.parametrize("name", ["empty.gif", "germany.avi"])
+def test_nothing_is_written_without_frames_or_writer(store, tmp_path, name):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    fname = str(tmp_path / name)
+    assert not CDataTimeSeriesView(ds).animate_time_series(fname, to_date=ds.days[0])
+    assert not os.path.exists(fname)
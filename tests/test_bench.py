@@ -0,0 +1,44 @@
+import json
+import numpy as np
+from covid_bench import compare_results, generate_csse_files, main, run_benchmarks
+from covid_store import CDataStore
+
+
+def test_generated_files_are_parsed_like_csse_files(tmp_path):
+    fname = generate_csse_files(str(tmp_path), n_rows=60, n_days=30, seed=1)
+    store = CDataStore(fname, use_cache=False)
+    table = store.get_table("confirmed")
+    assert table.data.shape == (60, 30)
+    assert np.all(np.diff(table.data, axis=1) >= 0)
+    assert any("," in country for country in table.countries)
+    assert any(province for province in table.provinces)
+    # the same seed generates the same numbers
+    again = generate_csse_files(str(tmp_path / "again"), 60, 30, seed=1)
+    again = CDataStore(again, use_cache=False)
+    assert np.array_equal(again.get_table("deaths").data, store.get_table("deaths").data)
+
+
+def test_benchmark_run_and_compare(tmp_path):
+    fname = generate_csse_files(str(tmp_path), n_rows=30, n_days=40)
+    stages = run_benchmarks(
+        fname, repeat=1, track_memory=False, render=False, n_sim_runs=4
+    )
+    assert stages
+    for res in stages.values():
+        assert 0 <= res["seconds_min"] < 60
+    base = {"stages": stages}
+    slower = {
+        "stages": {
+            name: dict(res, seconds_min=2 * res["seconds_min"] + 1)
+            for name, res in stages.items()
+        }
+    }
+    assert not any(row[4] for row in compare_results(base, base))
+    assert all(row[4] for row in compare_results(base, slower))
+    base_fname, slower_fname = str(tmp_path / "base.json"), str(tmp_path / "new.json")
+    for name, results in ((base_fname, base), (slower_fname, slower)):
+        with open(name, "wt") as fh:
+            json.dump(results, fh)
+    argv = ["compare", base_fname, slower_fname]
+    assert main(argv) == 0
+    assert main(argv + ["--fail-on-regression"]) == 1
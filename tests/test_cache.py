@@ -0,0 +1,82 @@
+import os
+import time
+import numpy as np
+import covid_cache
+from covid_store import CDataTable
+from conftest import write_csse_file
+
+
+def test_fingerprint_states(global_files):
+    fname = global_files.confirmed
+    fingerprint = covid_cache.file_fingerprint(fname)
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "same"
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "touched"
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "same"
+    write_csse_file(fname, 21)
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "changed"
+    assert covid_cache.compare_fingerprint(fname, None) == "changed"
+
+
+def test_racy_fingerprint_is_refreshed_once_the_file_is_old(global_files, monkeypatch):
+    fname = global_files.confirmed
+    st = os.stat(fname)
+    mtime_ns = st.st_mtime_ns - 10 * covid_cache.RACY_INTERVAL_NS
+    os.utime(fname, ns=(st.st_atime_ns, mtime_ns))
+    fingerprint = covid_cache.file_fingerprint(fname)
+    # taken right after the write, size and mtime can not be trusted
+    fingerprint["taken_ns"] = mtime_ns + 1
+    hashed = []
+    file_hash = covid_cache._file_hash
+    monkeypatch.setattr(
+        covid_cache, "_file_hash", lambda name: hashed.append(name) or file_hash(name)
+    )
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "touched"
+    assert len(hashed) == 1
+    assert covid_cache.compare_fingerprint(fname, fingerprint) == "same"
+    assert len(hashed) == 1
+
+
+def test_refreshed_fingerprint_is_stored(global_files, monkeypatch):
+    monkeypatch.setattr(covid_cache, "RACY_INTERVAL_NS", 2 * 10 ** 8)
+    # parsed right after the file was written
+    parsed = CDataTable(global_files.confirmed)
+    assert parsed.fingerprint["taken_ns"] - parsed.fingerprint["mtime_ns"] < 2 * 10 ** 8
+    time.sleep(0.3)
+    CDataTable(global_files.confirmed)
+    fingerprint = CDataTable(global_files.confirmed).fingerprint
+    assert fingerprint["mtime_ns"] == parsed.fingerprint["mtime_ns"]
+    assert fingerprint["taken_ns"] - fingerprint["mtime_ns"] >= 2 * 10 ** 8
+
+
+def test_mmap_round_trip(global_files):
+    parsed = CDataTable(global_files.confirmed)
+    assert os.path.exists(global_files.confirmed + covid_cache.CACHE_DIR_SUFFIX)
+    cached = CDataTable(global_files.confirmed)
+    assert isinstance(cached.data, np.memmap)
+    assert np.array_equal(cached.data, parsed.data)
+    assert cached.calendar == parsed.calendar
+    assert cached.countries == parsed.countries
+    assert cached.meta_header == parsed.meta_header
+    assert np.array_equal(cached.row_crc, parsed.row_crc)
+    assert np.array_equal(cached.latitude, parsed.latitude)
+
+
+def test_cache_follows_file_changes(global_files):
+    CDataTable(global_files.confirmed)
+    write_csse_file(global_files.confirmed, 24)
+    appended = CDataTable(global_files.confirmed)
+    assert len(appended.calendar) == 24
+    full = CDataTable(global_files.confirmed, use_cache=False)
+    assert np.array_equal(appended.data, full.data)
+    # the cache was rewritten with the appended dates
+    assert len(CDataTable(global_files.confirmed).calendar) == 24
+
+
+def test_unreadable_cache_is_parsed_again(global_files):
+    parsed = CDataTable(global_files.confirmed)
+    c_dir = global_files.confirmed + covid_cache.CACHE_DIR_SUFFIX
+    os.remove(os.path.join(c_dir, "data.npy"))
+    table = CDataTable(global_files.confirmed)
+    assert np.array_equal(table.data, parsed.data)
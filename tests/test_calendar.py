@@ -0,0 +1,57 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from covid_calendar import CCalendar
+from test_doc import baseline_time_range_indices
+
+DAYS = [datetime(2020, 3, 1) + timedelta(days=d) for d in range(20)]
+# a calendar with gaps, index lookups are a binary search there
+GAPPED_DAYS = [DAYS[d] for d in (0, 1, 2, 5, 6, 10, 11, 12, 19)]
+
+
+@pytest.mark.parametrize("days", [DAYS, GAPPED_DAYS])
+def test_index_of_matches_the_baseline(days):
+    cal = CCalendar(days)
+    assert cal.contiguous == (days is DAYS)
+    for probe in [DAYS[0] - timedelta(days=3)] + DAYS + [DAYS[-1] + timedelta(days=1)]:
+        for offset in (timedelta(0), timedelta(hours=7)):
+            found = np.where(np.array(days) >= probe + offset)[0]
+            expected = int(found[0]) if len(found) else None
+            assert cal.index_of(probe + offset) == expected
+
+
+def test_index_of_accepts_every_date_type():
+    cal = CCalendar(DAYS)
+    assert cal.index_of(DAYS[4]) == 4
+    assert cal.index_of(date(2020, 3, 5)) == 4
+    assert cal.index_of("2020-03-05") == 4
+    assert cal.index_of(np.datetime64("2020-03-05")) == 4
+    assert CCalendar().index_of(DAYS[0]) is None
+
+
+@pytest.mark.parametrize("days", [DAYS, GAPPED_DAYS])
+@pytest.mark.parametrize("n_days", [1, 3, 7])
+def test_lookback_indices_match_the_baseline(days, n_days):
+    cal = CCalendar(days)
+    expected = [
+        baseline_time_range_indices(days, day - timedelta(days=n_days), day)[0]
+        for day in days
+    ]
+    assert cal.lookback_indices(n_days).tolist() == expected
+
+
+def test_days_round_trip():
+    cal = CCalendar(DAYS)
+    assert cal.days == tuple(DAYS)
+    assert cal.days is cal.days
+    assert CCalendar(cal.as_datetime64()) == cal
+
+
+def test_extended_calendars_are_shared():
+    cal = CCalendar(DAYS)
+    extended = cal.extended_to(datetime(2020, 3, 25))
+    assert len(extended) == 25
+    assert extended.starts_with(cal)
+    assert extended.days[-1] == datetime(2020, 3, 25)
+    assert cal.extended_to("2020-03-25") is extended
+    assert cal.extended_to(DAYS[10]) is cal
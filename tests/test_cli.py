@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import os
+import pytest
+from covid_cli import main
+from conftest import write_us_files
+
+
+def run(capsys, *argv):
+    assert main(list(argv)) == 0
+    return capsys.readouterr().out
+
+
+def csv_rows(out: str) -> list:
+    return list(csv.DictReader(io.StringIO(out)))
+
+
+def test_load_lists_the_files(default_stores, capsys):
+    rows = csv_rows(run(capsys, "load"))
+    assert [row["field"] for row in rows] == ["confirmed", "recovered", "deaths"]
+    assert {row["days"] for row in rows} == {"20"}
+    assert {row["last_day"] for row in rows} == {"2020-03-20"}
+
+
+def test_metrics_of_countries(default_stores, capsys):
+    store, _ = default_stores
+    out = run(
+        capsys,
+        "metrics",
+        "--countries", "Germany", "Atlantis", "Italy",
+        "--date", "2020-03-10",
+        "--format", "json",
+    )
+    rows = json.loads(out)
+    assert [row["country"] for row in rows] == ["Germany", "Italy"]
+    assert rows[1]["date"] == "2020-03-10"
+    assert rows[1]["confirmed"] == store.get_country_data("Italy", "confirmed")[9]
+
+
+def test_rank(default_stores, capsys):
+    rows = csv_rows(run(capsys, "rank", "--top", "2", "--ascending"))
+    assert [row["rank"] for row in rows] == ["1", "2"]
+    rows = csv_rows(run(capsys, "--us", "state", "rank", "--metric", "incidence"))
+    assert {row["country"] for row in rows} == {"Alabama", "Guam", "New York"}
+    with pytest.raises(SystemExit, match="population"):
+        main(["rank", "--metric", "incidence"])
+
+
+def test_simulate_takes_the_calendar_of_the_selected_files(default_stores, capsys):
+    _, us_store = default_stores
+    write_us_files(os.path.dirname(us_store.fname.confirmed), 25)
+    schedule = ("--doubling-time", "2020-03-05=3", "--doubling-time", "2020-03-20=2")
+    rows = csv_rows(run(capsys, "simulate", *schedule))
+    assert len(rows) == 20
+    assert rows[0]["date"] == "2020-03-01" and rows[0]["confirmed"] == "1.0"
+    assert len(csv_rows(run(capsys, "--us", "county", "simulate", *schedule))) == 25
+    with pytest.raises(SystemExit, match="--doubling-time"):
+        main(["simulate"])
+
+
+def test_simulate_fit_writes_the_config_as_json(default_stores, capsys):
+    fit = json.loads(run(capsys, "simulate", "--fit", "Germany", "--workers", "1"))
+    assert sorted(fit["config"]) == [
+        "country",
+        "days_to_recovery",
+        "doubling_time_dict",
+        "mortality",
+        "sim_data",
+    ]
+    assert fit["config"]["country"] == "Germany Sim"
+
+
+def test_export_csv_to_stdout(default_stores, capsys):
+    out = run(
+        capsys, "export", "--countries", "Germany", "Italy", "--metrics", "daily_new"
+    )
+    rows = csv_rows(out)
+    assert len(rows) == 2 * 20
+    assert "daily_new" in rows[0]
+
+
+def test_render_passes_its_arguments_on(default_stores, tmp_path):
+    out_dir = str(tmp_path / "report")
+    argv = ["render", "--countries", "Germany", "--out-dir", out_dir, "--workers", "1"]
+    assert main(argv) == 0
+    assert "Germany_time_series.png" in os.listdir(out_dir)
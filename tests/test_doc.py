@@ -0,0 +1,249 @@
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+import pytest
+from covid_doc import (
+    CAllCountriesCollection,
+    CDataTimeSeries,
+    CDataTimeSeriesCollection,
+    compact_block,
+)
+from conftest import write_csse_file
+
+
+def test_lazy_fields_are_cut_to_the_calendar_after_files_grew(global_files, store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    assert len(ds.n_confirmed) == 20
+    # pull_csse_data.sh appends dates before deaths and recovered are first accessed
+    write_csse_file(global_files.deaths, 22, scale=0.1)
+    write_csse_file(global_files.recovered, 22, scale=0.5)
+    assert len(ds.n_deaths) == 20
+    assert len(ds.n_still_infected) == 20
+    assert np.array_equal(ds.n_deaths, store.get_table("deaths").data[0, :20])
+    assert len(store.get_table("deaths").calendar) == 22
+
+
+def test_lazy_fields_are_cut_after_store_update(global_files, store):
+    ds = CDataTimeSeries("Italy", data_store=store)
+    write_csse_file(global_files.confirmed, 23)
+    assert store.update() == ["confirmed"]
+    assert len(ds.n_confirmed) == 20
+    assert len(ds.n_still_infected) == 20
+    assert len(CDataTimeSeries("Italy", data_store=store).n_confirmed) == 23
+
+
+def test_lazy_field_of_revised_file_raises(global_files, store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    write_csse_file(global_files.deaths, 15, scale=0.1)
+    with pytest.raises(ValueError, match="changed in between"):
+        ds.n_deaths
+
+
+def test_loaded_data_stays_a_view_into_the_store(store):
+    ds = CDataTimeSeries("Germany", data_store=store, dtype=np.int32)
+    ds._calc_doubling_time_for_all_days()
+    assert sorted(store.tables) == ["confirmed"]
+    assert ds.n_confirmed.dtype == np.float64
+    assert np.shares_memory(ds.n_confirmed, store.get_table("confirmed").data)
+    assert np.shares_memory(ds.n_deaths, store.get_table("deaths").data)
+
+
+def test_simulations_are_stored_as_one_block(store):
+    ds = CDataTimeSeries(
+        "Sim",
+        sim_data=True,
+        doubling_time_dict={"2020-03-10": 2},
+        data_store=store,
+        dtype=np.float32,
+    )
+    assert ds.n_confirmed.dtype == np.float32
+    assert ds.n_confirmed.base is ds.n_recovered.base
+    assert ds.n_confirmed.base.shape == (3, 20)
+    collection = CDataTimeSeriesCollection.from_simulations(
+        ["a", "b"], [{"2020-03-10": 2}] * 2, data_store=store, dtype=np.int32
+    )
+    for ds in collection.data_collection:
+        assert ds.n_deaths.dtype == np.int32
+
+
+def test_days_are_shared_and_can_be_replaced(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    assert isinstance(ds.days, tuple)
+    assert ds.days is store.days
+    ds.days = ds.days[:10]
+    assert len(ds.calendar) == 10 and ds.days[-1] == store.days[9]
+    assert len(store.days) == 20
+
+
+def test_compact_block_keeps_the_requested_dtype():
+    block = compact_block([np.array([1.4, 2.6]), np.array([3.0, 4.0])], np.int32)
+    assert block.dtype == np.int32
+    assert block.tolist() == [[1, 3], [3, 4]]
+    assert compact_block([np.array([1.5])], np.float32).dtype == np.float32
+
+
+@pytest.mark.parametrize(
+    "values, dtype, fallback",
+    [
+        ([1.0, np.nan], np.int32, np.float32),
+        ([1.0, 2.0 ** 40], np.int32, np.float32),
+        ([1.0, 1e300], np.int64, np.float64),
+        ([1.0, 1e300], np.float32, np.float64),
+    ],
+)
+def test_compact_block_falls_back_to_a_float_dtype(values, dtype, fallback):
+    block = compact_block([np.array(values)], dtype)
+    assert block.dtype == fallback
+    assert np.allclose(block[0], values, equal_nan=True, rtol=1e-6)
+
+
+# -- reference implementations of the baseline (loops over datetime lists) --
+
+
+def baseline_time_range_indices(days, start_date=None, end_date=None):
+    days = np.array(days)
+    ix_start, ix_end = 0, len(days)
+    if start_date is not None:
+        found = np.where(days >= start_date)[0]
+        ix_start = found[0] if len(found) else 0
+    if end_date is not None:
+        found = np.where(days >= end_date)[0]
+        ix_end = found[0] if len(found) else len(days)
+    return ix_start, ix_end
+
+
+def baseline_doubling_time_on_date(days, n_confirmed, date, average_interval_days):
+    ixs, ixe = baseline_time_range_indices(
+        days, date - timedelta(days=average_interval_days), date
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = 1 + (n_confirmed[ixe] / n_confirmed[ixs] - 1) / average_interval_days
+        return np.log(2) / np.log(rate)
+
+
+@pytest.mark.parametrize("average_interval_days", [1, 3, 7])
+def test_doubling_times_match_the_baseline(store, average_interval_days):
+    ds = CDataTimeSeries("Canada", data_store=store)
+    n_confirmed = np.asarray(ds.n_confirmed)
+    expected = [
+        baseline_doubling_time_on_date(ds.days, n_confirmed, day, average_interval_days)
+        for day in ds.days
+    ]
+    doubling_times = ds._calc_doubling_time_over_interval(
+        average_interval_days=average_interval_days
+    )
+    assert np.allclose(doubling_times, expected, equal_nan=True)
+    day = ds.days[12]
+    assert np.isclose(
+        ds._calc_doubling_time_on_date(day, average_interval_days),
+        expected[12],
+    )
+    from_date, to_date = ds.days[5], ds.days[15]
+    assert ds._get_time_range_indices(from_date, to_date) == (5, 15)
+    assert np.allclose(
+        ds._calc_doubling_time_over_interval(from_date, to_date, average_interval_days),
+        expected[5:15],
+        equal_nan=True,
+    )
+
+
+def test_collection_doubling_time_matrix_matches_the_series(store):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    matrix = collection._calc_doubling_time_matrix(average_interval_days=3)
+    for row, ds in zip(matrix, collection.data_collection):
+        assert np.allclose(
+            row, ds._calc_doubling_time_for_all_days(3), equal_nan=True
+        )
+
+
+def test_ranking_matches_the_baseline(store):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    date = collection.data_collection[0].days[10]
+    values = {
+        ds.country: baseline_doubling_time_on_date(ds.days, ds.n_confirmed, date, 1)
+        for ds in collection.data_collection
+    }
+    expected = sorted(values.items(), key=lambda kv: kv[1], reverse=True)
+    ranking = collection._get_actual_doubling_time_for_date(date=date)
+    assert list(ranking) == [country for country, _ in expected]
+    assert np.allclose(list(ranking.values()), [value for _, value in expected])
+    top = collection.rank("doubling_time", date=date, k=2, largest=False)
+    assert list(top) == [country for country, _ in expected[::-1][:2]]
+
+
+def test_ranking_over_a_date_range_averages_the_days(store):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    days = collection.data_collection[0].days
+    ranking = collection.rank("doubling_time", date=days[5], end_date=days[10], k=10)
+    for country, value in ranking.items():
+        ds = collection[country]
+        assert np.isclose(value, np.mean(ds._calc_doubling_time_for_all_days()[5:10]))
+
+
+def test_doubling_times_over_an_interval_are_writable(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    doubling_times = ds._calc_doubling_time_over_interval()
+    doubling_times[0] = -1.0
+    assert ds._calc_doubling_time_over_interval()[0] != -1.0
+
+
+def test_collection_loads_with_a_bounded_number_of_threads(store, monkeypatch):
+    get_country_data = store.get_country_data
+    lock = threading.Lock()
+    running, peak, threads = [0], [0], set()
+
+    def counting_get_country_data(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            threads.add(threading.get_ident())
+        time.sleep(0.01)
+        try:
+            return get_country_data(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(store, "get_country_data", counting_get_country_data)
+    collection = CDataTimeSeriesCollection(
+        store.country_list * 3, workers=2, data_store=store
+    )
+    assert len(collection.data_collection) == 3 * len(store.country_list)
+    assert collection.country_list == store.country_list * 3
+    assert 1 < peak[0] <= 2
+    assert len(threads) <= 2
+
+
+def test_countries_without_data_are_recorded_in_failed_countries(store):
+    collection = CDataTimeSeriesCollection(
+        ["Germany", "Atlantis", "Italy"], workers=2, data_store=store
+    )
+    assert collection.country_list == ["Germany", "Italy"]
+    assert list(collection.failed_countries) == ["Atlantis"]
+    assert isinstance(collection.failed_countries["Atlantis"], LookupError)
+    assert "Atlantis" not in collection
+
+
+def test_all_countries_collection_loads_on_first_access(store):
+    collection = CAllCountriesCollection(data_store=store)
+    assert list(collection) == store.country_list
+    assert "Italy" in collection and "Atlantis" not in collection
+    assert collection.loaded_countries() == []
+    italy = collection["Italy"]
+    assert collection.loaded_countries() == ["Italy"]
+    assert collection["Italy"] is italy
+    assert np.array_equal(italy.n_confirmed, store.get_country_data("Italy", "confirmed"))
+    assert collection.data_collection[-1].country == store.country_list[-1]
+    assert len(collection.loaded_countries()) == 2
+    assert len(collection._calc_doubling_time_matrix()) == len(store.country_list)
+    assert collection.loaded_countries() == store.country_list
+
+
+def test_ranking_by_metric_matches_the_metric_matrix(store):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    growth = collection.metrics.week_over_week_growth(5)[:, -1]
+    ranking = collection.rank("week_over_week_growth", n_days=5, k=3)
+    expected = np.argsort(-growth, kind="stable")[:3]
+    assert list(ranking) == [collection.country_list[ix] for ix in expected]
+    assert np.allclose(list(ranking.values()), growth[expected])
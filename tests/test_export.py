@@ -0,0 +1,83 @@
+import csv
+import numpy as np
+import pytest
+import covid_export
+from covid_doc import CDataTimeSeriesCollection
+from covid_export import EXPORT_COLUMNS, export_collection
+
+COUNTRIES = ["Germany", "Korea, South", "Atlantis", "Canada", "Italy"]
+
+
+@pytest.fixture
+def collection(store):
+    return CDataTimeSeriesCollection(COUNTRIES, data_store=store)
+
+
+def expected_table(collection, metrics=()) -> dict:
+    """The exported table assembled row by row from the data sets"""
+    table = {name: [] for name in EXPORT_COLUMNS + tuple(metrics)}
+    for ds in collection.data_collection:
+        columns = [
+            np.ravel(ds.n_confirmed),
+            np.ravel(ds.n_deaths),
+            np.ravel(ds.n_recovered),
+            np.ravel(ds.n_still_infected),
+            ds._calc_doubling_time_for_all_days(),
+        ] + [getattr(ds.metrics, m)() for m in metrics]
+        for ix, day in enumerate(ds.days):
+            table["country"].append(ds.country)
+            table["date"].append(day.strftime("%Y-%m-%d"))
+            for name, column in zip(EXPORT_COLUMNS[2:] + tuple(metrics), columns):
+                table[name].append(float(column[ix]))
+    return table
+
+
+def assert_same_table(table: dict, expected: dict):
+    assert list(table) == list(expected)
+    assert table["country"] == expected["country"]
+    assert table["date"] == expected["date"]
+    for name in list(expected)[2:]:
+        assert np.allclose(table[name], expected[name], equal_nan=True), name
+
+
+def test_csv_round_trip(collection, tmp_path):
+    fname = str(tmp_path / "export.csv")
+    metrics = ("daily_new", "moving_average")
+    n_rows = export_collection(collection, fname, metrics=metrics, chunk_countries=3)
+    with open(fname, newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    assert n_rows == len(rows) == 4 * 20
+    table = {name: [row[name] for row in rows] for name in rows[0]}
+    for name in list(table)[2:]:
+        table[name] = [float(value) for value in table[name]]
+    assert_same_table(table, expected_table(collection, metrics))
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_arrow_round_trip(collection, tmp_path, fmt):
+    pa = pytest.importorskip("pyarrow")
+    fname = str(tmp_path / f"export.{fmt}")
+    assert export_collection(collection, fname, chunk_countries=3) == 4 * 20
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        arrow_table = pq.read_table(fname)
+        assert pq.ParquetFile(fname).num_row_groups == 2
+    else:
+        with pa.ipc.open_file(fname) as reader:
+            arrow_table = reader.read_all()
+    assert pa.types.is_dictionary(arrow_table.schema.field("country").type)
+    table = arrow_table.to_pydict()
+    table["date"] = [str(np.datetime64(day, "D")) for day in table["date"]]
+    assert_same_table(table, expected_table(collection))
+
+
+def test_csv_is_written_without_pyarrow(collection, tmp_path, monkeypatch):
+    monkeypatch.setattr(covid_export, "_import_pyarrow", lambda: None)
+    export_collection(collection, str(tmp_path / "export.parquet"))
+    assert (tmp_path / "export.csv").exists()
+
+
+def test_unknown_metric_raises(collection):
+    with pytest.raises(ValueError, match="Unknown metrics"):
+        export_collection(collection, metrics=("incidence",))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_fit import _fit_targets, fit_collection, fit_simulation
+from covid_store import CDataStore
+from conftest import write_global_files
+
+SCHEDULE = {"2020-03-11": 3.0, "2020-03-21": 1.5, "2020-03-31": 4.0}
+
+
+@pytest.fixture
+def long_store(tmp_path):
+    return CDataStore(write_global_files(str(tmp_path), 40), use_cache=False)
+
+
+def test_fit_recovers_a_simulated_schedule(long_store):
+    real = CDataTimeSeries(
+        "Real",
+        sim_data=True,
+        doubling_time_dict=SCHEDULE,
+        mortality=0.05,
+        days_to_recovery=10,
+        data_store=long_store,
+    )
+    fit = fit_simulation(
+        real, breakpoint_interval_days=10, n_candidates=64, n_rounds=15, workers=1
+    )
+    assert fit.error < 0.05
+    for date, doubling_time in SCHEDULE.items():
+        assert fit.config["doubling_time_dict"][date] == pytest.approx(
+            doubling_time, rel=0.2
+        )
+    assert fit.config["mortality"] == pytest.approx(0.05, rel=0.15)
+    assert fit.config["days_to_recovery"] == pytest.approx(10, abs=1.5)
+    # the fitted simulation is created on the calendar of the fitted store
+    assert fit.config["data_store"] is long_store
+    sim = CDataTimeSeries(**fit.config)
+    assert sim.days == real.days
+
+
+def test_fit_targets_include_the_end_date(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    day_numbers, targets, mask = _fit_targets(ds, ds.days[2], ds.days[5])
+    assert np.flatnonzero(mask).tolist() == [2, 3, 4, 5]
+    _, _, mask = _fit_targets(ds, end_date=ds.days[-1])
+    assert mask.all()
+    assert targets.shape == (3, len(day_numbers))
+
+
+def test_fit_collection_keeps_the_data_stores(store):
+    collection = CDataTimeSeriesCollection(["Germany", "Italy"], data_store=store)
+    results = fit_collection(
+        collection, workers=1, n_candidates=8, n_rounds=2, breakpoint_interval_days=7
+    )
+    assert list(results) == ["Germany", "Italy"]
+    for result in results.values():
+        assert result.config["data_store"] is store
+        assert np.isfinite(result.error)
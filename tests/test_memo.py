@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from covid_doc import CDataTimeSeries
+from covid_memo import CResultCache
+
+
+def test_hits_and_misses_are_counted():
+    cache = CResultCache()
+    source = np.arange(4.0)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return source * 2
+
+    value = cache.get_or_compute("double", (source,), compute)
+    assert cache.get_or_compute("double", (source,), compute) is value
+    assert not value.flags.writeable
+    # equal content, but another array: the entry is stale
+    cache.get_or_compute("double", (source.copy(),), compute)
+    assert len(calls) == 2
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 2,
+        "evictions": 0,
+        "entries": 1,
+        "nbytes": value.nbytes,
+        "max_bytes": cache.max_bytes,
+    }
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = CResultCache(max_bytes=3 * 80)
+    source = np.zeros(1)
+    for key in "abc":
+        cache.get_or_compute(key, (source,), lambda: np.zeros(10))
+    cache.get_or_compute("a", (source,), lambda: pytest.fail("a is cached"))
+    cache.get_or_compute("d", (source,), lambda: np.zeros(10))
+    assert list(cache._entries) == ["c", "a", "d"]
+    assert cache.evictions == 1 and cache.nbytes == 3 * 80
+    # results larger than the budget are returned, but not cached
+    cache.get_or_compute("e", (source,), lambda: np.zeros(100))
+    assert "e" not in cache._entries and len(cache) == 3
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.evictions == 1
+
+
+def test_incidence_of_a_nan_population_is_cached(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    value = ds.metrics.incidence(np.nan)
+    assert np.isnan(value).all()
+    hits = ds.result_cache.hits
+    assert ds.metrics.incidence(float("nan")) is value
+    assert ds.result_cache.hits == hits + 1
+    assert ds.metrics.incidence(1e6) is not value
+
+
+def test_replaced_data_is_never_served_from_the_cache(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    doubling_times = ds._calc_doubling_time_for_all_days()
+    assert ds._calc_doubling_time_for_all_days() is doubling_times
+    ds.n_confirmed = ds.n_confirmed * 3
+    assert ds._calc_doubling_time_for_all_days() is not doubling_times
@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+from covid_calendar import CCalendar
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_metrics import (
+    daily_increments,
+    incidence,
+    moving_average,
+    top_k_indices,
+    week_over_week_growth,
+)
+
+FIRST_DAY = np.datetime64("2020-03-01")
+CONTIGUOUS = CCalendar(FIRST_DAY + np.arange(20))
+GAPPED = CCalendar(
+    FIRST_DAY
+    + np.array([0, 1, 2, 4, 5, 8, 9, 10, 11, 15, 16, 17, 18, 19, 20, 21, 25, 26, 27, 28])
+)
+
+
+def cumulative_values(n_points: int):
+    return np.cumsum(np.arange(n_points) % 5 * 3.0 + 1)
+
+
+def baseline_moving_average(values, n_days, day_numbers):
+    average = np.full(len(values), np.nan)
+    for ix, day in enumerate(day_numbers):
+        if day - n_days + 1 < day_numbers[0]:
+            continue
+        window = [
+            values[j]
+            for j in range(ix + 1)
+            if day_numbers[j] > day - n_days and np.isfinite(values[j])
+        ]
+        if window:
+            average[ix] = np.mean(window)
+    return average
+
+
+def baseline_back_index(day_numbers, ix, n_days):
+    first_day = day_numbers[ix] - n_days
+    return next(j for j, day in enumerate(day_numbers) if day >= first_day)
+
+
+def baseline_growth(cumulative, n_days, day_numbers):
+    growth = np.full(len(cumulative), np.nan)
+    for ix, day in enumerate(day_numbers):
+        back = baseline_back_index(day_numbers, ix, n_days)
+        if day_numbers[back] - n_days < day_numbers[0] or day - n_days < day_numbers[0]:
+            continue
+        back2 = baseline_back_index(day_numbers, back, n_days)
+        previous = cumulative[back] - cumulative[back2]
+        if previous:
+            growth[ix] = (cumulative[ix] - cumulative[back]) / previous - 1
+    return growth
+
+
+def test_daily_increments():
+    cumulative = np.array([[1, 3, 6], [0, 0, 2]])
+    increments = daily_increments(cumulative)
+    assert np.isnan(increments[:, 0]).all()
+    assert increments[:, 1:].tolist() == [[2, 3], [0, 2]]
+
+
+@pytest.mark.parametrize("calendar", [None, CONTIGUOUS, GAPPED])
+@pytest.mark.parametrize("n_days", [1, 3, 7])
+def test_moving_average_matches_the_baseline(calendar, n_days):
+    values = daily_increments(cumulative_values(20))
+    values[6] = np.nan
+    day_numbers = (calendar or CONTIGUOUS).day_numbers
+    expected = baseline_moving_average(values, n_days, day_numbers)
+    assert np.allclose(
+        moving_average(values, n_days, calendar), expected, equal_nan=True
+    )
+
+
+@pytest.mark.parametrize("calendar", [None, CONTIGUOUS, GAPPED])
+@pytest.mark.parametrize("n_days", [2, 7])
+def test_week_over_week_growth_matches_the_baseline(calendar, n_days):
+    cumulative = cumulative_values(20)
+    cumulative[10:12] = cumulative[9]
+    day_numbers = (calendar or CONTIGUOUS).day_numbers
+    expected = baseline_growth(cumulative, n_days, day_numbers)
+    assert np.allclose(
+        week_over_week_growth(cumulative, n_days, calendar), expected, equal_nan=True
+    )
+
+
+def test_incidence_of_a_matrix():
+    cumulative = np.vstack([cumulative_values(20), 2 * cumulative_values(20)])
+    result = incidence(cumulative, [1000.0, np.nan], n_days=7, per=100)
+    assert np.isnan(result[:, :7]).all()
+    assert np.isnan(result[1]).all()
+    assert np.allclose(result[0, 7:], (cumulative[0, 7:] - cumulative[0, :13]) / 10)
+
+
+@pytest.mark.parametrize("largest", [True, False])
+@pytest.mark.parametrize("finite_only", [True, False])
+@pytest.mark.parametrize("k", [0, 1, 3, 10])
+def test_top_k_indices_match_a_full_sort(largest, finite_only, k):
+    values = np.array([3.0, np.nan, np.inf, 1.0, 3.0, -np.inf, 2.0, 3.0])
+    rankable = [
+        ix
+        for ix, value in enumerate(values)
+        if not np.isnan(value) and (np.isfinite(value) or not finite_only)
+    ]
+    expected = sorted(
+        rankable, key=lambda ix: (-values[ix] if largest else values[ix], ix)
+    )[:k]
+    assert top_k_indices(values, k, largest, finite_only).tolist() == expected
+
+
+def test_series_metrics_are_cached_until_the_data_changes(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    average = ds.metrics.moving_average(3)
+    assert ds.metrics.moving_average(3) is average
+    assert ds.metrics.moving_average(7) is not average
+    ds.n_confirmed = ds.n_confirmed * 2
+    assert np.allclose(ds.metrics.moving_average(3), 2 * average, equal_nan=True)
+    with pytest.raises(ValueError, match="Unknown field"):
+        ds.metrics.daily_new("hospitalized")
+
+
+def test_collection_metrics_match_the_series_metrics(store):
+    collection = CDataTimeSeriesCollection(store.country_list, data_store=store)
+    metrics = collection.metrics
+    population = {"Germany": 83e6, "Italy": 60e6}
+    for ix, ds in enumerate(collection.data_collection):
+        assert np.allclose(
+            metrics.moving_average(3)[ix], ds.metrics.moving_average(3), equal_nan=True
+        )
+        assert np.allclose(
+            metrics.week_over_week_growth(5)[ix],
+            ds.metrics.week_over_week_growth(5),
+            equal_nan=True,
+        )
+        assert np.allclose(
+            metrics.incidence(population)[ix],
+            ds.metrics.incidence(population.get(ds.country, np.nan)),
+            equal_nan=True,
+        )
+    assert metrics.incidence(population) is metrics.incidence(dict(population))
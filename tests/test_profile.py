@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import covid_profile
+from covid_doc import CDataTimeSeries
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_state_of_new_process(value: str = None) -> str:
+    env = {k: v for k, v in os.environ.items() if k != covid_profile.PROFILE_ENV}
+    if value is not None:
+        env[covid_profile.PROFILE_ENV] = value
+    return subprocess.run(
+        [sys.executable, "-c", "import covid_profile as p; print(p.is_enabled())"],
+        cwd=PACKAGE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+@pytest.mark.parametrize(
+    "value, enabled", [(None, "False"), ("0", "False"), ("1", "True")]
+)
+def test_profiling_is_off_by_default(value, enabled):
+    assert profile_state_of_new_process(value) == enabled
+
+
+def test_nothing_is_recorded_while_disabled(store, monkeypatch):
+    monkeypatch.setattr(covid_profile.report, "enabled", False)
+    covid_profile.report.reset()
+    CDataTimeSeries("Germany", data_store=store)._calc_doubling_time_over_interval()
+    assert covid_profile.report.stages == {}
+    assert covid_profile.report.counters == {}
+
+
+def test_profiling_records_the_stages(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(covid_profile.report, "enabled", False)
+    fname = str(tmp_path / "profile.json")
+    with covid_profile.profiling(fname, log=False):
+        ds = CDataTimeSeries("Germany", data_store=store)
+        ds._calc_doubling_time_over_interval()
+        ds._calc_doubling_time_over_interval()
+    assert not covid_profile.is_enabled()
+    with open(fname) as fh:
+        stages = json.load(fh)["stages"]
+    name = "covid_doc.CDataTimeSeries._calc_doubling_time_over_interval"
+    assert stages[name]["calls"] == 2
+    assert "covid_store.CDataTable.__read_csv_data" in stages
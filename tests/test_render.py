@@ -0,0 +1,50 @@
+import os
+from datetime import datetime
+import pytest
+import covid_render
+from covid_render import CRenderJob, create_render_jobs, render_batch, render_png
+
+
+def test_render_batch_writes_every_figure(default_stores, tmp_path):
+    out_dir = str(tmp_path / "report")
+    jobs = create_render_jobs(["Germany", "Canada"], out_dir, formats=("png", "svg"))
+    assert len(jobs) == 2 * (2 * 2 + 2)
+    fname = os.path.join(out_dir, "pie_chart.png")
+    jobs.append(CRenderJob("pie_chart", ("Germany",), fname, None, None))
+    results = render_batch(jobs, workers=1)
+    assert [res.fname for res in results] == [job.fname for job in jobs]
+    for res in results[:-1]:
+        assert res.error is None
+        assert os.path.getsize(res.fname) > 0
+    # a failing figure is reported, the others are rendered anyway
+    assert results[-1].error.startswith("ValueError")
+    assert not os.path.exists(results[-1].fname)
+
+
+def test_bar_chart_takes_the_date_of_the_job(store, monkeypatch):
+    dates = []
+    view_class = covid_render.CDataTimeSeriesCollectionView
+    plot = view_class.plot_doubling_time_from_date_as_bar_chart
+
+    def recording_plot(self, *args, date=None, **kwargs):
+        dates.append(date)
+        return plot(self, *args, date=date, **kwargs)
+
+    monkeypatch.setattr(
+        view_class, "plot_doubling_time_from_date_as_bar_chart", recording_plot
+    )
+    countries = ("Germany", "Italy")
+    day, last_day = datetime(2020, 3, 10), datetime(2020, 3, 15)
+    for job in (
+        CRenderJob("collection_doubling_time", countries, None, None, last_day, day),
+        CRenderJob("collection_doubling_time", countries, None, None, last_day),
+    ):
+        assert render_png(job, data_store=store).startswith(b"\x89PNG")
+    assert dates == [day, last_day]
+    jobs = create_render_jobs(["Germany"], "out", date=day)
+    assert {job.date for job in jobs} == {day}
+
+
+def test_unknown_figure_raises(store):
+    with pytest.raises(ValueError, match="Unknown figure"):
+        render_png(CRenderJob("pie_chart", ("Germany",), None, None, None), store)
@@ -0,0 +1,164 @@
+import json
+import pickle
+import asyncio
+import numpy as np
+import pytest
+import covid_server
+from covid_render import CRenderJob
+from covid_server import CQueryService, CRequestError, _render_png_in_worker, _store_key
+from covid_store import CDataStore, CUSDataStore
+from conftest import write_csse_file, write_global_files
+
+
+@pytest.fixture
+def service(store):
+    service = CQueryService(store, render_workers=1, poll_interval=None)
+    yield service
+    service.close()
+
+
+def query(service, path, **params):
+    content_type, body = service.handle_query(path, params)
+    assert content_type == "application/json"
+    return json.loads(body)
+
+
+def test_countries(service, store):
+    assert query(service, "/countries")["countries"] == store.country_list
+
+
+def test_series(service, store):
+    res = query(service, "/series", country="Germany", **{"from": "2020-03-05"})
+    assert res["dates"][0] == "2020-03-05"
+    assert len(res["dates"]) == 16
+    assert res["confirmed"] == store.get_country_data("Germany", "confirmed")[4:].tolist()
+    assert len(res["still_infected"]) == 16
+
+
+def test_doubling_time(service, store):
+    res = query(service, "/doubling_time", country="Italy", average_interval_days="3")
+    ds = service.data.series("Italy")
+    expected = ds._calc_doubling_time_for_all_days(3)
+    assert res["doubling_time"][1:] == pytest.approx(expected[1:].tolist())
+    # the inf of the first day is no JSON number
+    assert res["doubling_time"][0] is None
+
+
+def test_rank(service):
+    res = query(service, "/rank", metric="doubling_time", k="2", date="2020-03-10")
+    expected = service.data.collection().rank("doubling_time", date="2020-03-10", k=2)
+    assert [r["country"] for r in res["ranking"]] == list(expected)
+    assert [r["value"] for r in res["ranking"]] == pytest.approx(list(expected.values()))
+
+
+def test_errors(service):
+    with pytest.raises(CRequestError) as err:
+        service.handle_query("/series", {"country": "Atlantis"})
+    assert err.value.status == 404
+    with pytest.raises(CRequestError) as err:
+        service.handle_query("/series", {})
+    assert err.value.status == 400
+    with pytest.raises(CRequestError) as err:
+        service.handle_query("/rank", {"metric": "incidence"})
+    assert err.value.status == 400
+    with pytest.raises(CRequestError) as err:
+        service.handle_query("/unknown", {})
+    assert err.value.status == 404
+
+
+def test_responses_are_cached_per_data_version(service, global_files, tmp_path):
+    first = service.handle_query("/series", {"country": "Germany"})
+    assert service.handle_query("/series", {"country": "Germany"}) is first
+    assert not service.reload()
+    write_global_files(str(tmp_path), 22)
+    assert service.reload()
+    res = query(service, "/series", country="Germany")
+    assert len(res["dates"]) == 22
+    assert query(service, "/stats")["version"] == 1
+
+
+def test_plot_renders_the_snapshot_of_the_us_files(us_store):
+    service = CQueryService(us_store, render_workers=1, poll_interval=None)
+    try:
+        content_type, png = service.handle_query(
+            "/plot", {"kind": "time_series", "country": "New York"}
+        )
+    finally:
+        service.close()
+    assert content_type == "image/png"
+    assert png.startswith(b"\x89PNG")
+
+
+def test_plot_after_the_files_changed(service, global_files, tmp_path):
+    query = {"kind": "collection_doubling_time", "countries": "Germany,Italy"}
+    assert service.handle_query("/plot", query)[1].startswith(b"\x89PNG")
+    # the render process keeps the data of the version the response is cached for
+    write_global_files(str(tmp_path), 22)
+    assert service.handle_query("/plot", dict(query, date="2020-03-10"))[1].startswith(
+        b"\x89PNG"
+    )
+    assert service.reload()
+    assert service.handle_query("/plot", query)[1].startswith(b"\x89PNG")
+
+
+def test_render_processes_keep_the_store_of_a_version(store, global_files, monkeypatch):
+    monkeypatch.setattr(covid_server, "_worker_store", (None, None))
+    snapshot = store.snapshot()
+    key = _store_key(snapshot)
+    assert pickle.loads(pickle.dumps(key)) == key
+    job = CRenderJob("time_series", ("Germany",), None, None, None)
+    assert _render_png_in_worker(job, key).startswith(b"\x89PNG")
+    worker_key, worker_store = covid_server._worker_store
+    assert worker_key == key and worker_store is not snapshot
+    _render_png_in_worker(job, key)
+    assert covid_server._worker_store[1] is worker_store
+    # files changed before the service reloaded them: the process keeps rendering
+    # the version of the key, a new process has to be sent the snapshot
+    write_csse_file(global_files.deaths, 21, scale=0.1)
+    assert _render_png_in_worker(job, key).startswith(b"\x89PNG")
+    monkeypatch.setattr(covid_server, "_worker_store", (None, None))
+    assert _render_png_in_worker(job, key) is None
+    assert _render_png_in_worker(job, key, snapshot).startswith(b"\x89PNG")
+    store.update()
+    assert _store_key(store.snapshot()) == covid_server._worker_store[0]
+
+
+def test_http(service):
+    async def get(target):
+        server = await asyncio.start_server(service._handle_connection, "127.0.0.1", 0)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    head, _, body = asyncio.run(get("/series?country=Germany")).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert json.loads(body)["country"] == "Germany"
+    head, _, body = asyncio.run(get("/series?country=Atlantis")).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 404")
+    assert "Atlantis" in json.loads(body)["error"]
+
+
+def test_store_update_keeps_snapshots(global_files, store):
+    store.get_table("confirmed")
+    snapshot = store.snapshot()
+    write_csse_file(global_files.confirmed, 22)
+    assert store.update() == ["confirmed"]
+    assert len(store.calendar) == 22
+    assert len(snapshot.calendar) == 20
+
+
+def test_pickled_store_keeps_its_files_and_tables(us_store):
+    snapshot = us_store.snapshot()
+    store = pickle.loads(pickle.dumps(snapshot))
+    assert type(store) is CUSDataStore
+    assert store.fname == us_store.fname
+    assert store.fname.deaths.endswith("deaths_US.csv")
+    assert np.array_equal(
+        store.get_country_data("US", "deaths"), us_store.get_country_data("US", "deaths")
+    )
+    assert type(pickle.loads(pickle.dumps(CDataStore(us_store.fname)))) is CDataStore
@@ -0,0 +1,88 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from covid_calendar import CCalendar
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_sim import resolve_doubling_times, simulate_time_series
+
+
+def baseline_simulation(days, doubling_time_dict, mortality, days_to_recovery):
+    def doubling_time_of(day):
+        for d_str, value in doubling_time_dict.items():
+            if day <= datetime.strptime(d_str, "%Y-%m-%d"):
+                return value
+        return list(doubling_time_dict.values())[-1]
+
+    n_confirmed = np.zeros(len(days))
+    n_deaths = np.zeros(len(days))
+    n_recovered = np.zeros(len(days))
+    n_confirmed[0] = 1
+    for day in range(1, len(days)):
+        n_confirmed[day] = n_confirmed[day - 1] * np.exp(
+            np.log(2) / doubling_time_of(days[day])
+        )
+        if day >= days_to_recovery:
+            d_to_recv = int(np.round(days_to_recovery))
+            n_deaths[day] = n_confirmed[day - d_to_recv] * mortality
+            n_recovered[day] = n_confirmed[day - d_to_recv] * (1 - mortality)
+    return n_confirmed, n_deaths, n_recovered
+
+
+def test_doubling_times_are_resolved_in_insertion_order():
+    cal = CCalendar(["2020-03-01", "2020-03-04", "2020-03-08", "2020-03-12"])
+    d_dict = {"2020-03-10": 2, "2020-03-03": 5}
+    # days after all keys take the value of the last key
+    assert resolve_doubling_times(cal.day_numbers, d_dict).tolist() == [2, 2, 2, 5]
+    d_dict = {"2020-03-03": 5, "2020-03-10": 2}
+    assert resolve_doubling_times(cal.day_numbers, d_dict).tolist() == [5, 2, 2, 2]
+
+
+def test_parameters_need_one_value_per_schedule():
+    day_numbers = CCalendar(["2020-03-01", "2020-03-02"]).day_numbers
+    with pytest.raises(ValueError, match="mortality"):
+        simulate_time_series(day_numbers, [{"2020-03-01": 2}] * 3, mortality=[0.1, 0.2])
+
+
+@pytest.mark.parametrize(
+    "doubling_time_dict, mortality, days_to_recovery",
+    [
+        ({"2020-03-05": 3, "2020-03-12": 1.5, "2020-03-15": 4}, 0.045, 12.65),
+        ({"2020-03-10": 2, "2020-03-03": 5}, 0.1, 4),
+    ],
+)
+def test_simulation_matches_the_baseline(
+    store, doubling_time_dict, mortality, days_to_recovery
+):
+    ds = CDataTimeSeries(
+        "Sim",
+        sim_data=True,
+        doubling_time_dict=doubling_time_dict,
+        mortality=mortality,
+        days_to_recovery=days_to_recovery,
+        extrapolate_to_date=datetime(2020, 4, 10),
+        data_store=store,
+    )
+    assert ds.days[-1] == datetime(2020, 4, 10)
+    expected = baseline_simulation(
+        ds.days, doubling_time_dict, mortality, days_to_recovery
+    )
+    for values, reference in zip((ds.n_confirmed, ds.n_deaths, ds.n_recovered), expected):
+        assert np.allclose(values, reference)
+
+
+def test_batch_simulation_matches_single_runs(store):
+    dicts = [{"2020-03-05": 3, "2020-03-20": 2}, {"2020-03-10": 1.5}]
+    collection = CDataTimeSeriesCollection.from_simulations(
+        ["a", "b"], dicts, mortality=[0.01, 0.05], days_to_recovery=10, data_store=store
+    )
+    for ds, d_dict, mortality in zip(collection.data_collection, dicts, (0.01, 0.05)):
+        single = CDataTimeSeries(
+            ds.country,
+            sim_data=True,
+            doubling_time_dict=d_dict,
+            mortality=mortality,
+            days_to_recovery=10,
+            data_store=store,
+        )
+        assert np.allclose(ds.n_confirmed, single.n_confirmed)
+        assert np.allclose(ds.n_recovered, single.n_recovered)
@@ -0,0 +1,162 @@
+import numpy as np
+from covid_doc import CDataTimeSeriesCollection
+from covid_store import CDataTable, CDataStore, get_data_store, reset_data_stores
+from conftest import GLOBAL_ROWS, expected_row, write_csse_file, write_us_file
+
+
+def test_every_file_is_parsed_once(store):
+    table = store.get_table("confirmed")
+    assert store.get_table("confirmed") is table
+    assert sorted(store.tables) == ["confirmed"]
+    for field, scale in (("confirmed", 1.0), ("recovered", 0.5), ("deaths", 0.1)):
+        assert np.array_equal(
+            store.get_country_data("Italy", field), expected_row(1, 20, scale)
+        )
+    assert sorted(store.tables) == ["confirmed", "deaths", "recovered"]
+
+
+def test_rows_are_read_only_views(store):
+    row = store.get_country_data("Germany", "confirmed")
+    assert not row.flags.writeable
+    assert np.shares_memory(row, store.get_table("confirmed").data)
+    assert len(store.get_country_data("Atlantis", "confirmed")) == 0
+
+
+def test_store_registry(global_files):
+    reset_data_stores()
+    store = get_data_store(global_files, use_cache=False)
+    assert get_data_store(global_files) is store
+    assert isinstance(store, CDataStore)
+    assert store.get_country_location("Germany") == (51.0, 9.0)
+    assert len(store.country_list) == len({meta[1] for meta in GLOBAL_ROWS})
+    reset_data_stores()
+
+
+def test_incremental_append_equals_full_parse(global_files):
+    table = CDataTable(global_files.confirmed, use_cache=False)
+    write_csse_file(global_files.confirmed, 25)
+    assert table.update()
+    full = CDataTable(global_files.confirmed, use_cache=False)
+    assert table.calendar == full.calendar
+    assert np.array_equal(table.data, full.data)
+    assert np.array_equal(table.row_crc, full.row_crc)
+    assert table.countries == full.countries
+    assert not table.update()
+
+
+def test_revised_history_is_parsed_again(global_files):
+    table = CDataTable(global_files.confirmed, use_cache=False)
+    write_csse_file(global_files.confirmed, 25, scale=2.0)
+    assert table.update()
+    assert np.array_equal(table.get_row("Germany"), expected_row(0, 25, scale=2.0))
+    full = CDataTable(global_files.confirmed, use_cache=False)
+    assert np.array_equal(table.data, full.data)
+
+
+def test_updated_leaves_the_table_unchanged(global_files):
+    table = CDataTable(global_files.confirmed, use_cache=False)
+    data = table.data
+    write_csse_file(global_files.confirmed, 22)
+    new_table = table.updated()
+    assert table.data is data and len(table.calendar) == 20
+    assert len(new_table.calendar) == 22
+    assert new_table.updated() is None
+
+
+def test_removed_rows_are_parsed_again(global_files):
+    table = CDataTable(global_files.confirmed, use_cache=False)
+    write_csse_file(global_files.confirmed, 22, rows=GLOBAL_ROWS[:3])
+    assert table.update()
+    assert len(table.countries) == 3
+    assert "Korea, South" not in table.row_index
+
+
+def test_provinces_are_summed_up(store):
+    canada = store.get_country_data("Canada", "confirmed")
+    assert np.array_equal(canada, expected_row(2, 20) + expected_row(3, 20))
+    assert np.array_equal(
+        store.get_country_data("Canada", "confirmed", province="Quebec"),
+        expected_row(3, 20),
+    )
+    assert len(store.get_country_data("Canada", "confirmed", aggregate=False)) == 0
+    assert sorted(store.get_province_list("Canada")) == ["Ontario", "Quebec"]
+    assert "Canada" in store.country_list
+    lat, lon = store.get_country_location("Canada")
+    assert np.isclose(lat, (51.2 + 52.9) / 2) and np.isclose(lon, (-85.3 - 73.5) / 2)
+
+
+def test_aggregated_matrix_matches_row_sums(store):
+    table = store.get_table("confirmed")
+    aggregated = table.get_aggregated()
+    for name in table.group_names:
+        rows = [ix for ix, country in enumerate(table.countries) if country == name]
+        assert np.array_equal(
+            aggregated[table.group_index[name]], table.data[rows].sum(axis=0)
+        )
+    assert np.array_equal(
+        store.get_country_data("Germany", "confirmed", aggregate=True),
+        expected_row(0, 20),
+    )
+
+
+def test_parse_quoted_names(global_files):
+    table = CDataTable(global_files.confirmed, use_cache=False)
+    assert table.countries == [meta[1] for meta in GLOBAL_ROWS]
+    assert "Korea, South" in table.row_index
+    assert np.array_equal(table.get_row("Korea, South"), expected_row(4, 20))
+    assert table.days[0].strftime("%Y-%m-%d") == "2020-03-01"
+    assert len(table.calendar) == 20
+
+
+def test_country_filter_stops_at_the_rows_of_the_countries(global_files):
+    table = CDataTable(
+        global_files.confirmed, use_cache=False, country_filter=["Italy"]
+    )
+    assert table.countries == ["Italy"]
+    assert np.array_equal(table.get_row("Italy"), expected_row(1, 20))
+
+
+def test_us_roll_ups(us_store):
+    assert us_store.country_list == ["Alabama", "Guam", "New York"]
+    alabama = us_store.get_country_data("Alabama", "confirmed")
+    assert np.array_equal(alabama, expected_row(0, 20) + expected_row(1, 20))
+    nation = us_store.get_country_data("US", "confirmed")
+    assert np.array_equal(nation, sum(expected_row(ix, 20) for ix in range(5)))
+    assert np.array_equal(
+        us_store.get_country_data("Kings, New York", "confirmed"), expected_row(2, 20)
+    )
+    assert np.array_equal(
+        us_store.get_country_data("New York", "confirmed", province="Kings"),
+        expected_row(2, 20),
+    )
+    assert not us_store.get_country_data("US", "recovered").any()
+    assert us_store.get_fips_name(36047) == "Kings, New York"
+    assert us_store.get_population(["Alabama"]) == {"Alabama": 55869.0 + 223234.0}
+    assert us_store.get_location_list("county") == [
+        "Autauga, Alabama",
+        "Baldwin, Alabama",
+        "Kings, New York",
+        "Unassigned, New York",
+    ]
+
+
+def test_us_file_update(us_store):
+    us_store.get_table("confirmed")
+    write_us_file(us_store.fname.confirmed, 23)
+    assert us_store.update() == ["confirmed"]
+    assert len(us_store.get_country_data("Guam", "confirmed")) == 23
+
+
+def test_us_collections_of_every_level(us_store):
+    assert us_store.get_location_list("nation") == ["US"]
+    assert us_store.get_location_list("state") == us_store.country_list
+    counties = CDataTimeSeriesCollection(
+        us_store.get_location_list("county"), data_store=us_store
+    )
+    assert counties.failed_countries == {}
+    states = CDataTimeSeriesCollection(["Alabama", "New York"], data_store=us_store)
+    # Autauga and Baldwin are the counties of Alabama
+    assert np.array_equal(
+        states.metrics.matrix("deaths")[0],
+        counties.metrics.matrix("deaths")[:2].sum(axis=0),
+    )
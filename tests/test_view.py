@@ -0,0 +1,56 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from covid_doc import CDataTimeSeries, CDataTimeSeriesCollection
+from covid_view import CDataTimeSeriesView, CDataTimeSeriesCollectionView
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close("all")
+
+
+def test_time_series_is_updated_only_if_its_state_changed(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    view = CDataTimeSeriesView(ds)
+    assert not view.update_time_series()
+    view.plot_time_series(show_plot=False)
+    assert not view.update_time_series()
+    line = view._artists["time_series"]["lines"][0]
+    ds.n_confirmed = ds.n_confirmed * 2
+    assert view.update_time_series()
+    assert np.array_equal(line.get_ydata(), ds.n_confirmed)
+    assert not view.update_time_series()
+    assert view.update_time_series(from_date=ds.days[5])
+    assert len(line.get_xdata()) == 15
+    assert view.update_time_series(cv_data=CDataTimeSeries("Italy", data_store=store))
+    assert view._artists["time_series"]["title"].get_text() == "Italy"
+
+
+def test_doubling_time_bars_follow_the_date_window(store):
+    ds = CDataTimeSeries("Germany", data_store=store)
+    view = CDataTimeSeriesView(ds)
+    view.plot_doubling_time_over_days(show_plot=False)
+    assert not view.update_doubling_time_over_days()
+    assert view.update_doubling_time_over_days(from_date=ds.days[10])
+    heights = [bar.get_height() for bar in view._artists["doubling_time"]["bars"]]
+    assert np.allclose(
+        heights, ds._calc_doubling_time_over_interval(start_date=ds.days[10])
+    )
+    assert not view.update_doubling_time_over_days(from_date=ds.days[10])
+
+
+def test_collection_views_update_in_place(store):
+    collection = CDataTimeSeriesCollection(
+        ["Germany", "Italy", "Canada"], data_store=store
+    )
+    view = CDataTimeSeriesCollectionView(collection)
+    view.plot_country_comparison("Germany", "Italy", show_plot=False)
+    assert not view.update_country_comparison()
+    assert view.update_country_comparison(country_name_2="Canada")
+    assert not view.update_country_comparison()
+    assert not view.update_country_comparison(country_name_1="Atlantis")
+    view.plot_collection_subplots(show_plot=False)
+    assert not view.update_collection_subplots()
+    assert view.update_collection_subplots(to_date=collection["Italy"].days[10])